@@ -1,147 +1,421 @@
-import google.generativeai as genai
+import math
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import json
-from tavily import TavilyClient
+import re
+
+import circuit_breaker
+import logs
+import metrics
+import planner_context
+from circuit_breaker import CircuitOpen
+from memory_cache import TTLCache
+from singleflight import SingleFlight
 
 # --- Load API Key ---
 load_dotenv(dotenv_path='../.env')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 TAVILY_API_KEY = os.getenv('TAVILY_API_KEY')
 
+# --- Planner caches ---
+# Tier 1: Tavily results per search query. Tier 2: finished plans per prompt.
+SEARCH_CACHE_TTL = int(os.getenv('PLANNER_SEARCH_CACHE_TTL', str(6 * 3600)))
+PLAN_CACHE_TTL = int(os.getenv('PLANNER_PLAN_CACHE_TTL', '3600'))
+search_cache = TTLCache(max_entries=int(os.getenv('PLANNER_SEARCH_CACHE_SIZE', '512')), ttl=SEARCH_CACHE_TTL)
+plan_cache = TTLCache(max_entries=int(os.getenv('PLANNER_PLAN_CACHE_SIZE', '256')), ttl=PLAN_CACHE_TTL)
+
+def _normalize(text):
+    """'3 Days in  Ipoh!' and '3 days in ipoh' share a cache entry."""
+    return re.sub(r'\s+', ' ', text).strip().rstrip('.!?').casefold()
+
+# Identical prompts arriving together share one Tavily + Gemini run
+plan_flight = SingleFlight()
+
+def cache_stats():
+    return {"plans": plan_cache.stats(), "searches": search_cache.stats()}
+
+def flight_stats():
+    return plan_flight.stats()
+# ----------------------
+
+# --- Circuit breakers ---
+# While Tavily is failing we plan without web context; while Gemini is failing
+# users get a friendly "try again" at once instead of waiting for a timeout.
+# Neither kind of answer is cached.
+tavily_breaker = circuit_breaker.get('tavily', min_calls=5)
+gemini_breaker = circuit_breaker.get('gemini', min_calls=5)
+UNAVAILABLE_PLAN = {
+    "friendly_response": "Aiyo, the AI planner is taking a short break lah. Try again in a minute, or check out the trending spots while you wait!",
+    "itinerary_days": [],
+}
+# ----------------------
+
 if not GEMINI_API_KEY or not TAVILY_API_KEY:
     print("Warning: GEMINI_API_KEY or TAVILY_API_KEY not found in .env file.")
-    model = None
-    tavily_client = None
-else:
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    # --- Model Configuration ---
-    generation_config = {
-      "temperature": 1,
-      "top_p": 0.95,
-      "top_k": 64,
-      "max_output_tokens": 8192,
-      # --- CRITICAL: Force JSON output ---
-      "response_mime_type": "application/json", 
-    }
-    
-    safety_settings = [
-      {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-      {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-      {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-      {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-    ]
-    
-    # --- This is the "System Instruction" for your "Agents" ---
-    SYSTEM_INSTRUCTION = """
-    You are 'JomJalan', an expert Malaysian travel guide.
-    Your goal is to act in two steps:
-    1.  **Survey Agent:** First, you MUST use the Google Search tool to find the BEST 5-10 trending, highly-rated, or 'hidden gem' spots (cafes, attractions, etc.) for the user's request.
-    2.  **Planner Agent:** Second, you MUST create a simple, day-by-day itinerary using those search results.
-    
-    **CRITICAL RULES:**
-    * You MUST respond in a fun, friendly, with a perfect flow day-by-day itinerary.
-    * You MUST bold key place names using **markdown**.
-    * You MUST return your final plan in the provided JSON schema.
-    
-    **JSON Schema:**
-    {
-      "type": "object",
-      "properties": {
-        "friendly_response": {
-          "type": "string",
-          "description": "Your friendly, Manglish chat response. This is what the user will read first."
-        },
-        "itinerary_days": {
-          "type": "array",
-          "items": {
-            "type": "object",
-            "properties": {
-              "day": { "type": "string", "description": "e.g., 'Day 1'" },
-              "title": { "type": "string", "description": "A short title for the day, e.g., 'Heritage & Food'" },
-              "activities": {
-                "type": "array",
-                "items": {
-                  "type": "object",
-                  "properties": {
-                    "name": { "type": "string", "description": "The name of the place, e.g., 'Ipoh Old Town'" },
-                    "description": { "type": "string", "description": "A short, 1-2 sentence description." }
-                  },
-                  "required": ["name", "description"]
-                }
-              }
-            },
-            "required": ["day", "title", "activities"]
+
+# --- Model Configuration ---
+# Same default as before it was configurable. gemini-2.5 models count their
+# thinking tokens against this cap too, so lowering it can cut a plan short.
+PLANNER_MAX_OUTPUT_TOKENS = int(os.getenv('PLANNER_MAX_OUTPUT_TOKENS', '8192'))
+
+generation_config = {
+  "temperature": 1,
+  "top_p": 0.95,
+  "top_k": 64,
+  "max_output_tokens": PLANNER_MAX_OUTPUT_TOKENS,
+  # --- CRITICAL: Force JSON output ---
+  "response_mime_type": "application/json", 
+}
+
+safety_settings = [
+  {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+  {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+  {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+  {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+
+# --- This is the "System Instruction" for your "Agents" ---
+SYSTEM_INSTRUCTION = """
+You are 'JomJalan', an expert Malaysian travel guide.
+Your goal is to act in two steps:
+1.  **Survey Agent:** First, you MUST use the Google Search tool to find the BEST 5-10 trending, highly-rated, or 'hidden gem' spots (cafes, attractions, etc.) for the user's request.
+2.  **Planner Agent:** Second, you MUST create a simple, day-by-day itinerary using those search results.
+
+**CRITICAL RULES:**
+* You MUST respond in a fun, friendly, with a perfect flow day-by-day itinerary.
+* You MUST bold key place names using **markdown**.
+* You MUST return your final plan in the provided JSON schema.
+
+**JSON Schema:**
+{
+  "type": "object",
+  "properties": {
+    "friendly_response": {
+      "type": "string",
+      "description": "Your friendly, Manglish chat response. This is what the user will read first."
+    },
+    "itinerary_days": {
+      "type": "array",
+      "items": {
+        "type": "object",
+        "properties": {
+          "day": { "type": "string", "description": "e.g., 'Day 1'" },
+          "title": { "type": "string", "description": "A short title for the day, e.g., 'Heritage & Food'" },
+          "activities": {
+            "type": "array",
+            "items": {
+              "type": "object",
+              "properties": {
+                "name": { "type": "string", "description": "The name of the place, e.g., 'Ipoh Old Town'" },
+                "description": { "type": "string", "description": "A short, 1-2 sentence description." }
+              },
+              "required": ["name", "description"]
+            }
           }
-        }
-      },
-      "required": ["friendly_response", "itinerary_days"]
+        },
+        "required": ["day", "title", "activities"]
+      }
     }
-    """
+  },
+  "required": ["friendly_response", "itinerary_days"]
+}
+"""
+
+# --- SDK clients ---
+# google.generativeai and tavily are slow to import and configure, and most
+# workers never plan anything, so the clients are built on first use (or by
+# warm_up()). `model` and `tavily_client` stay None until then, and also if
+# the keys are missing.
+PLANNER_WARMUP_ON_BOOT = os.getenv('PLANNER_WARMUP_ON_BOOT', '0') == '1'
 
+model = None
+tavily_client = None
+_clients_ready = False
+_clients_lock = threading.Lock()
+_client_stats = {'initialized': False, 'init_seconds': None}
+
+def _create_clients():
+    """Imports the SDKs and returns (model, tavily_client), or (None, None) on failure."""
+    if not GEMINI_API_KEY or not TAVILY_API_KEY:
+        return None, None
     try:
-        model = genai.GenerativeModel(
+        import google.generativeai as genai
+        from tavily import TavilyClient
+
+        genai.configure(api_key=GEMINI_API_KEY)
+        gemini_model = genai.GenerativeModel(
             model_name="gemini-2.5-flash", # Use a model that supports Google Search
             generation_config=generation_config,
             safety_settings=safety_settings,
             system_instruction=SYSTEM_INSTRUCTION,           
         )
-        tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
+        tavily = TavilyClient(api_key=TAVILY_API_KEY)
         print("Gemini AI Model (with Search & JSON) initialized successfully.")
+        return gemini_model, tavily
     except Exception as e:
         print(f"Error initializing services: {e}")
-        model = None
-        tavily_client = None
+        return None, None
+
+def _ensure_clients():
+    """Builds the clients once, whichever thread gets here first. True if both are usable."""
+    global model, tavily_client, _clients_ready
+    if not _clients_ready:
+        with _clients_lock:
+            if not _clients_ready:
+                started = time.perf_counter()
+                model, tavily_client = _create_clients()
+                _clients_ready = True
+                _client_stats.update(initialized=True, init_seconds=round(time.perf_counter() - started, 3))
+    return model is not None and tavily_client is not None
+
+def set_clients(gemini_model, tavily):
+    """Uses the given clients instead of building the real ones (benchmarks, tests)."""
+    global model, tavily_client, _clients_ready
+    with _clients_lock:
+        model, tavily_client, _clients_ready = gemini_model, tavily, True
+
+def warm_up():
+    """Builds the clients now instead of on the first planner request."""
+    return _ensure_clients()
+
+def start_warm_up():
+    """Runs warm_up() in the background when PLANNER_WARMUP_ON_BOOT=1."""
+    if PLANNER_WARMUP_ON_BOOT and not _clients_ready:
+        threading.Thread(target=warm_up, name='planner-warm-up', daemon=True).start()
+
+def client_stats():
+    with _clients_lock:
+        return dict(_client_stats)
+# ----------------------
+
+def _seconds_left(deadline):
+    """
+    Seconds until `deadline` (a time.time() value), to bound an upstream
+    call with; None when there is no deadline. Raises TimeoutError once it
+    has passed, before the call is made.
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.time()
+    if left <= 0:
+        raise TimeoutError("planner deadline passed")
+    return max(1, math.ceil(left))
+
+def _survey(search_query, use_cache=True, deadline=None):
+    """Runs the Tavily search, reusing a cached answer for the same query."""
+    key = _normalize(search_query)
+    if use_cache:
+        cached = search_cache.get(key)
+        if cached is not None:
+            print("AI Planner: Survey served from cache.")
+            return cached
+
+    timeout = _seconds_left(deadline)
+    with tavily_breaker.guard(), metrics.span('tavily_survey', upstream='tavily'):
+        search_results = tavily_client.search(
+            query=search_query,
+            search_depth="basic",
+            max_results=5, # Get the top 5 results
+            **({'timeout': timeout} if timeout else {})
+        )
+    if search_results.get('results'):
+        search_cache.set(key, search_results)
+    return search_results
+
+def _survey_or_nothing(search_query, use_cache=True, deadline=None):
+    """(search_results, ok). A failed or refused survey gives no results instead of an error."""
+    try:
+        return _survey(search_query, use_cache, deadline), True
+    except CircuitOpen:
+        print("AI Planner: Tavily circuit open, planning without web context.")
+    except Exception as e:
+        print(f"AI Planner: Survey failed ({e}), planning without web context.")
+    return {'results': []}, False
+
+def _is_valid_plan(plan_text):
+    try:
+        return 'itinerary_days' in json.loads(plan_text)
+    except (TypeError, ValueError):
+        return False
+
+def _build_context(search_results):
+    """The deduplicated, ranked and trimmed search results for Gemini, and what was done to them."""
+    return planner_context.build_context(search_results)
+
+# --- Token accounting ---
+_token_lock = threading.Lock()
+_token_totals = {'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'context_tokens': 0, 'estimated': 0}
+metrics.describe('jomjalan_planner_tokens_total', 'counter', 'Gemini tokens used by the planner, by direction.')
+
+def _record_tokens(prompt, plan_text, usage, context_info, mode):
+    """Counts one Gemini call's tokens: Gemini's usage_metadata when it sends it, our estimate otherwise."""
+    input_tokens = getattr(usage, 'prompt_token_count', None)
+    output_tokens = getattr(usage, 'candidates_token_count', None)
+    estimated = input_tokens is None or output_tokens is None
+    if input_tokens is None:
+        input_tokens = planner_context.estimate_tokens(prompt)
+    if output_tokens is None:
+        output_tokens = planner_context.estimate_tokens(plan_text)
+    with _token_lock:
+        _token_totals['requests'] += 1
+        _token_totals['input_tokens'] += input_tokens
+        _token_totals['output_tokens'] += output_tokens
+        _token_totals['context_tokens'] += context_info['context_tokens']
+        _token_totals['estimated'] += estimated
+    metrics.inc('jomjalan_planner_tokens_total', input_tokens, direction='input')
+    metrics.inc('jomjalan_planner_tokens_total', output_tokens, direction='output')
+    logs.info('planner_tokens', mode=mode, input_tokens=input_tokens, output_tokens=output_tokens,
+              estimated=estimated, **context_info)
+
+def token_stats():
+    with _token_lock:
+        totals = dict(_token_totals)
+    requests = totals['requests']
+    for name in ('input_tokens', 'output_tokens', 'context_tokens'):
+        totals[f"avg_{name}"] = round(totals[name] / requests, 1) if requests else 0.0
+    totals['context_budget'] = planner_context.PLANNER_CONTEXT_TOKENS
+    totals['max_output_tokens'] = PLANNER_MAX_OUTPUT_TOKENS
+    return totals
+# ----------------------
+
+def _build_prompt(user_prompt, context_string):
+    # We "stuff" the search results into the prompt for the Planner Agent
+    return f"""
+        User Request: "{user_prompt}"
         
-def get_ai_plan(user_prompt):
+        Survey Agent's Research (Context):
+        {context_string}
+        
+        Please act as the 'JomJalan' Planner Agent. Use the context above to create a fun, friendly itinerary. Respond ONLY with the JSON schema.
+        """
+
+def get_ai_plan(user_prompt, use_cache=True, deadline=None):
     """
     Calls Tavily (Survey Agent) and then Gemini (Planner Agent)
+
+    Repeat prompts are answered from the plan cache. With use_cache=False both
+    caches are skipped for reading (the fresh results still replace them).
+    With a `deadline` (a time.time() value), the Tavily and Gemini requests
+    time out by then, so a background job can't hang on them.
     """
-    if not model or not tavily_client:
+    if not _ensure_clients():
         return json.dumps({"friendly_response": "Aiyo, my AI brain is offline! The API Keys are missing or invalid."})
 
+    plan_key = _normalize(user_prompt)
+    if use_cache:
+        cached_plan = plan_cache.get(plan_key)
+        if cached_plan is not None:
+            logs.debug('plan_cache_hit', sample=True, prompt=user_prompt)
+            return cached_plan
+
+    return plan_flight.do(plan_key, _generate_plan, user_prompt, plan_key, use_cache, deadline)
+
+def _generate_plan(user_prompt, plan_key, use_cache, deadline=None):
+    if gemini_breaker.blocked():
+        print("AI Planner: Gemini circuit open, sending the short-break reply.")
+        return json.dumps(UNAVAILABLE_PLAN) # Don't spend a Tavily call on a plan we can't write
     try:
         # --- AGENT 1: SURVEY (Tavily) ---
         print(f"AI Planner: Activating Survey Agent (Tavily) for: {user_prompt}")
         # Create a good search query for Tavily
         search_query = f"best trending travel spots, attractions, and food for: {user_prompt}"
         
-        search_results = tavily_client.search(
-            query=search_query,
-            search_depth="basic",
-            max_results=5 # Get the top 5 results
-        )
-        
-        # Format the search results as a simple string for Gemini
-        context_string = ""
-        for result in search_results.get('results', []):
-            context_string += f"- {result['content']} (Source: {result['url']})\n"
-        
-        if not context_string:
-            context_string = "No search results found."
+        search_results, surveyed = _survey_or_nothing(search_query, use_cache, deadline)
+        context_string, context_info = _build_context(search_results)
             
-        print("AI Planner: Survey complete. Context found.")
+        print(f"AI Planner: Survey complete. Context: {context_info['snippets']} snippets, ~{context_info['context_tokens']} tokens.")
         # ----------------------------------
 
         # --- AGENT 2: PLANNER (Gemini) ---
         print("AI Planner: Activating Planner Agent (Gemini)...")
         
-        # We "stuff" the search results into the prompt for the Planner Agent
-        prompt = f"""
-        User Request: "{user_prompt}"
-        
-        Survey Agent's Research (Context):
-        {context_string}
-        
-        Please act as the 'JomJalan' Planner Agent. Use the context above to create a fun, friendly itinerary. Respond ONLY with the JSON schema.
-        """
-        
-        response = model.generate_content(prompt)
+        timeout = _seconds_left(deadline)
+        with gemini_breaker.guard(), metrics.span('gemini_generate', upstream='gemini', mode='full'):
+            prompt = _build_prompt(user_prompt, context_string)
+            response = model.generate_content(prompt, **({'request_options': {'timeout': timeout}} if timeout else {}))
+            plan_text = response.text
         print("Gemini response received!")
-        return response.text
+        _record_tokens(prompt, plan_text, getattr(response, 'usage_metadata', None), context_info, 'full')
+        if surveyed and _is_valid_plan(plan_text):
+            plan_cache.set(plan_key, plan_text) # Never cache a broken or context-less plan
+        return plan_text
         # ---------------------------------
         
+    except CircuitOpen:
+        print("AI Planner: Gemini circuit open, sending the short-break reply.")
+        return json.dumps(UNAVAILABLE_PLAN)
     except Exception as e:
         print(f"Error during AI plan generation: {e}")
-        return json.dumps({"friendly_response": f"Aiyo, something went wrong with the AI! Error: {str(e)}"})
\ No newline at end of file
+        return json.dumps({"friendly_response": f"Aiyo, something went wrong with the AI! Error: {str(e)}"})
+
+def _as_plan(plan_text):
+    """The final plan as a dict; unparseable text is wrapped like /api/ai_planner does."""
+    try:
+        return json.loads(plan_text)
+    except (TypeError, ValueError) as e:
+        print(f"Error parsing AI JSON response: {e}")
+        return {"friendly_response": plan_text}
+
+def stream_ai_plan(user_prompt, use_cache=True):
+    """
+    Same as get_ai_plan, but yields (event, data) pairs as the work happens:
+      ('progress', {...})  - stage updates (survey started / finished, planning)
+      ('chunk', {'text'})  - raw Gemini output as it is generated
+      ('plan', {...})      - the final, parsed plan (always the last event)
+    """
+    if not _ensure_clients():
+        yield 'plan', {"friendly_response": "Aiyo, my AI brain is offline! The API Keys are missing or invalid."}
+        return
+
+    plan_key = _normalize(user_prompt)
+    if use_cache:
+        cached_plan = plan_cache.get(plan_key)
+        if cached_plan is not None:
+            yield 'progress', {"stage": "cached"}
+            yield 'plan', _as_plan(cached_plan)
+            return
+
+    if gemini_breaker.blocked():
+        yield 'plan', dict(UNAVAILABLE_PLAN)
+        return
+
+    try:
+        yield 'progress', {"stage": "survey"}
+        search_query = f"best trending travel spots, attractions, and food for: {user_prompt}"
+        search_results, surveyed = _survey_or_nothing(search_query, use_cache)
+        context_string, context_info = _build_context(search_results)
+        yield 'progress', {
+            "stage": "survey_complete" if surveyed else "survey_skipped",
+            "sources": [result.get('url') for result in search_results.get('results', [])],
+        }
+
+        yield 'progress', {"stage": "planning"}
+        parts = []
+        usage = None
+        prompt = _build_prompt(user_prompt, context_string)
+        # Includes the time the client takes to read each chunk, like the user sees it
+        with gemini_breaker.guard(), metrics.span('gemini_generate', upstream='gemini', mode='stream'):
+            for chunk in model.generate_content(prompt, stream=True):
+                usage = getattr(chunk, 'usage_metadata', None) or usage # Complete on the last chunk
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue # A chunk without text (e.g. only safety ratings)
+                if text:
+                    parts.append(text)
+                    yield 'chunk', {"text": text}
+
+        plan_text = ''.join(parts)
+        print("Gemini stream complete!")
+        _record_tokens(prompt, plan_text, usage, context_info, 'stream')
+        if surveyed and _is_valid_plan(plan_text):
+            plan_cache.set(plan_key, plan_text)
+        yield 'plan', _as_plan(plan_text)
+
+    except CircuitOpen:
+        yield 'plan', dict(UNAVAILABLE_PLAN)
+    except Exception as e:
+        print(f"Error during streamed AI plan generation: {e}")
+        yield 'plan', {"friendly_response": f"Aiyo, something went wrong with the AI! Error: {str(e)}"}
@@ -0,0 +1,234 @@
+"""
+JSON list responses for the app's list endpoints (trending_spots, nearby_places).
+
+On top of what jsonify does, `list_response`:
+  - encodes with orjson when it is installed (plain json otherwise);
+  - compresses with brotli or gzip, whichever the client accepts and we
+    have (brotli needs the `brotli` package), for bodies over
+    COMPRESS_MIN_BYTES;
+  - sets a strong ETag (a hash of the JSON) and answers a matching
+    If-None-Match with a 304. When the caller passes the cache version the
+    list was built from, the finished body and its ETag are kept per
+    version, so until that version changes a 304, or a repeat of an already
+    compressed body, is answered without encoding anything. The tag itself
+    stays a content hash: enriched lists are built per worker, and two
+    workers could fill the same scrape version with different ratings;
+  - keeps only the fields listed in ?fields=name,imageUrl,...;
+  - pages with ?limit= and ?cursor=. The body stays a plain list, as the
+    app expects; the next page's cursor is in X-Next-Cursor and a Link
+    header. Without limit or cursor the whole list is returned.
+
+A cursor remembers the last item served, so a list refreshed between two
+pages picks up after that item rather than at a shifted offset.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlencode
+
+from flask import Response, jsonify, request
+
+import metrics
+from memory_cache import TTLCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024')) # Smaller bodies fit one packet anyway
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Much faster than the maximum (11) and still smaller than gzip
+PAGE_DEFAULT_LIMIT = 20
+PAGE_MAX_LIMIT = 100
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',) # Preferred first
+
+# Finished bodies of versioned lists: (version key, accepted encoding) -> (body, etag, encoding, json bytes)
+encoded_cache = TTLCache(max_entries=int(os.getenv('ENCODED_CACHE_MAX_ENTRIES', '256')),
+                         ttl=int(os.getenv('ENCODED_CACHE_TTL', '600')))
+
+_lock = threading.Lock()
+_counters = {'responses': 0, 'not_modified': 0, 'encoded_hits': 0, 'json_bytes': 0, 'sent_bytes': 0}
+metrics.describe('jomjalan_response_bytes_total', 'counter', 'List response bytes, before and after compression.')
+metrics.describe('jomjalan_not_modified_total', 'counter', 'List requests answered with a 304.')
+
+
+def dumps(value):
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0) # mtime=0: same input, same bytes
+    return body
+
+
+def negotiate():
+    """The Content-Encoding to use for this request, or None for identity."""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+# --- Fields and pages ---
+def parse_fields(value):
+    """'name, imageUrl' -> ('name', 'imageUrl'); None for every field."""
+    fields = tuple(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+    return fields or None
+
+
+def project(items, fields):
+    if fields is None:
+        return items
+    return [{name: item[name] for name in fields if name in item} for item in items]
+
+
+def _item_key(item):
+    """Short fingerprint of an item, for cursors."""
+    identity = f"{item.get('name')}|{item.get('lat')}|{item.get('lng')}|{item.get('location')}"
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:12]
+
+
+def encode_cursor(offset, last_item):
+    raw = json.dumps([offset, _item_key(last_item)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(offset, last item key). Raises ValueError for anything we didn't hand out."""
+    try:
+        offset, key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if not isinstance(offset, int) or offset < 0 or not isinstance(key, str):
+        raise ValueError("Invalid cursor")
+    return offset, key
+
+
+def paginate(items, cursor, limit):
+    """(page, next cursor or None). `cursor` None starts at the top."""
+    start = 0
+    if cursor:
+        offset, key = decode_cursor(cursor)
+        if 0 < offset <= len(items) and _item_key(items[offset - 1]) == key:
+            start = offset
+        else:
+            # The list changed since: carry on after the same item if it's still there
+            start = next((i + 1 for i, item in enumerate(items) if _item_key(item) == key), min(offset, len(items)))
+    page = items[start:start + limit]
+    end = start + len(page)
+    return page, (encode_cursor(end, items[end - 1]) if page and end < len(items) else None)
+# ------------------------
+
+
+def _count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def _version_key(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag, headers):
+    """304 if the client already has this list in any encoding, else None."""
+    if not request.if_none_match:
+        return None
+    tags = [etag] + [f"{etag}-{name}" for name in ENCODINGS]
+    matched = next((tag for tag in tags if request.if_none_match.contains(tag)), None)
+    if matched is None:
+        return None
+    _count('not_modified')
+    metrics.inc('jomjalan_not_modified_total', endpoint=request.endpoint or 'unknown')
+    response = Response(status=304)
+    _set_headers(response, matched, headers) # The tag of the copy the client has
+    return response
+
+
+def _set_headers(response, etag, headers):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate; a 304 is cheap
+    response.vary.add('Accept-Encoding')
+    response.headers.update(headers)
+
+
+def _send(body, etag, encoding, json_bytes, headers):
+    response = Response(body, mimetype='application/json')
+    # Each encoding is its own representation, so it gets its own strong tag
+    _set_headers(response, f"{etag}-{encoding}" if encoding else etag, headers)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    with _lock:
+        _counters['json_bytes'] += json_bytes
+        _counters['sent_bytes'] += len(body)
+    metrics.inc('jomjalan_response_bytes_total', json_bytes, stage='json')
+    metrics.inc('jomjalan_response_bytes_total', len(body), stage='sent')
+    return response
+
+
+def list_response(items, version=None, transform=None, headers=None):
+    """
+    The response for a JSON list, honouring ?fields=, ?limit=, ?cursor=,
+    Accept-Encoding and If-None-Match. `version` identifies the data `items`
+    came from (e.g. the scrape version); pass None when it isn't known.
+    `transform` is applied to the page's items before projection.
+    """
+    fields = parse_fields(request.args.get('fields'))
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', type=int)
+    headers = dict(headers or {})
+    if limit is not None and limit < 1:
+        return jsonify({"error": "'limit' must be a positive number"}), 400
+
+    if cursor or limit:
+        limit = min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+        try:
+            items, next_cursor = paginate(items, cursor, limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if next_cursor:
+            args = request.args.to_dict()
+            args['cursor'] = next_cursor
+            headers['X-Next-Cursor'] = next_cursor
+            headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+
+    _count('responses')
+    accepted = negotiate()
+    cache_key = None
+    if version is not None:
+        # The host is part of it because image URLs are made absolute with it
+        cache_key = (_version_key(request.endpoint, version, request.host_url, fields, cursor, limit), accepted)
+        cached = encoded_cache.get(cache_key)
+        if cached is not None:
+            _count('encoded_hits')
+            return _not_modified(cached[1], headers) or _send(*cached, headers)
+
+    body = dumps(project(transform(items) if transform else items, fields))
+    etag = hashlib.sha1(body).hexdigest()[:32]
+    json_bytes = len(body)
+    encoding = accepted if accepted and json_bytes >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+    if cache_key is not None:
+        encoded_cache.set(cache_key, (body, etag, encoding, json_bytes))
+    return _not_modified(etag, headers) or _send(body, etag, encoding, json_bytes, headers)
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+    counters['encoder'] = 'orjson' if orjson is not None else 'json'
+    counters['encodings'] = list(ENCODINGS)
+    counters['encoded_cache'] = encoded_cache.stats()
+    return counters
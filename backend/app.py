@@ -1,13 +1,28 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 import requests # Make sure 'requests' is in your requirements.txt
 import json
+import re
+import time
 
 # Import our other files
-from scraper import scrape_trending_spots
-from ai_planner import get_ai_plan
+from scraper import get_trending_spots, cache_status
+from ai_planner import get_ai_plan, stream_ai_plan, cache_stats as planner_cache_stats, flight_stats as planner_flight_stats
+from ai_planner import client_stats as planner_client_stats, start_warm_up as start_planner_warm_up, token_stats as planner_token_stats
+import places
+import nearby_tiles
+import photo_cache
+import snapshot
+import trending
+import planner_jobs
+import spot_index
+import circuit_breaker
+import api_response
+import logs
+import metrics
+from circuit_breaker import CircuitOpen
 
 # --- FIX: Tell load_dotenv to look one folder up for the .env file ---
 load_dotenv(dotenv_path='../.env')
@@ -19,6 +34,40 @@ CORS(app) # Allow requests from our Flutter app
 GOOGLE_MAPS_API_KEY = os.getenv('SERVER_MAPS_KEY')
 if not GOOGLE_MAPS_API_KEY:
     print("Warning: SERVER_MAPS_KEY not found in .env file. API calls will fail.")
+
+# Public address of this server, used to turn /api/photo/... into full URLs.
+# Defaults to whatever host the request came in on.
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL')
+
+def _circuit_open(e, breaker):
+    """503 for a call refused by an open circuit breaker, with a hint when to retry."""
+    print(f"Upstream unavailable: {e}")
+    response = jsonify({"error": str(e)})
+    response.headers['Retry-After'] = str(max(1, int(breaker.stats()['retry_in_seconds'])))
+    return response, 503
+
+# --- Request timing for /metrics ---
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def _record_timing(response):
+    started = g.pop('started', None)
+    if started is not None:
+        metrics.observe('jomjalan_http_request_seconds', time.perf_counter() - started,
+                        endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+# -----------------------------------
+
+def _absolute(url):
+    if url and url.startswith('/'):
+        return (PUBLIC_BASE_URL or request.host_url).rstrip('/') + url
+    return url
+
+def _with_absolute_images(items):
+    """Copies of `items` with proxy photo paths turned into full URLs for the app."""
+    return [dict(item, imageUrl=_absolute(item.get('imageUrl'))) for item in items]
 # -----------------------------------------------------------------
 
 # --- NEW HELPER FUNCTION ---
@@ -29,19 +78,9 @@ def get_place_details(place_name):
     if not GOOGLE_MAPS_API_KEY:
         return {} # Return empty if no key
 
-    FIND_PLACE_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    
-    # We ask for name, rating, user_ratings_total, and price_level
-    params = {
-        "input": place_name,
-        "inputtype": "textquery",
-        "fields": "name,rating,user_ratings_total,price_level",
-        "key": GOOGLE_MAPS_API_KEY
-    }
-    
     try:
-        response = requests.get(FIND_PLACE_URL, params=params)
-        data = response.json()
+        # We ask for name, rating, user_ratings_total, and price_level
+        data = places.find_place(place_name, "name,rating,user_ratings_total,price_level")
         
         if data.get('status') == 'OK' and data.get('candidates'):
             # Return the first and best match
@@ -55,67 +94,65 @@ def get_place_details(place_name):
 
 @app.route('/api/trending_spots', methods=['GET'])
 def trending_spots():
-# ... (existing code) ...
     state = request.args.get('state', 'Kuala Lumpur')
     
     print(f"Flask: Received request for trending spots in {state}")
     
-# ... (existing code) ...
-    spots = scrape_trending_spots(state) 
-    
-    # 3. Enrich the spots with Google data
-# ... (existing code) ...
+    # Enrich the spots with Google data
     if not GOOGLE_MAPS_API_KEY:
-# ... (existing code) ...
-        return jsonify(spots) # Return non-enriched spots if key is missing
-    enriched_spots = []
-    for spot in spots:
-        try:
-            find_place_url = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-            params = {
-                # Use a more specific query for better matches
-                "input": f"{spot['name']} {state}",
-                "inputtype": "textquery",
-                # --- THIS IS THE FIX ---
-                # 'vicinity' is not a valid field. Use 'formatted_address' instead.
-                "fields": "place_id,rating,user_ratings_total,price_level,photos,formatted_address",
-                # -----------------------
-                "key": GOOGLE_MAPS_API_KEY
-            }
-            response = requests.get(find_place_url, params=params)
-            data = response.json()
-            
-            # This debug line is still helpful
-            print(f"[Google Places Response for {spot['name']}]: {data}")
-
-            if data.get('status') == 'OK' and data.get('candidates'):
-                candidate = data['candidates'][0]
-                spot['rating'] = candidate.get('rating', 0.0)
-                spot['user_ratings_total'] = candidate.get('user_ratings_total', 0)
-                spot['priceLevel'] = candidate.get('price_level') # Can be null
-                
-                # --- THIS IS THE FIX ---
-                # Get 'formatted_address' instead of 'vicinity'
-                spot['location'] = candidate.get('formatted_address', spot['location']) 
-                # -----------------------
-                
-                # Get a photo URL
-                if candidate.get('photos'):
-# ... (existing code) ...
-                    photo_ref = candidate['photos'][0]['photo_reference']
-                    spot['imageUrl'] = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photo_reference={photo_ref}&key={GOOGLE_MAPS_API_KEY}"
-                    # --- ADD THIS DEBUG PRINT ---
-                    print(f"DEBUG IMAGE URL: {spot['imageUrl']}")
-            enriched_spots.append(spot)
-            
-# ... (rest of file is unchanged) ...
-        except Exception as e:
-            print(f"Error enriching spot {spot['name']}: {e}")
-            enriched_spots.append(spot) # Add the original spot if enrichment fails
+        spots, version = get_trending_spots(state) # Return non-enriched spots if key is missing
+        return api_response.list_response(spots, version=('scraped', state, version) if version else None)
+
+    # Right after a restart, answer from the prebuilt snapshot while the live list builds
+    served = snapshot.serve(state)
+    complete = True
+    if served is not None:
+        spots, version = served
+        version = ('snapshot', state, version)
+    else:
+        # Everyone asking for the same state shares one scrape + enrichment, and each
+        # request waits for the scrape, then at most ?budget_ms= for the enrichment
+        # (spots not enriched by then are returned as scraped, with "incomplete": true)
+        budget_ms = request.args.get('budget_ms', type=int)
+        spots, complete, version = trending.get_spots_within(state, budget_ms)
+        version = ('enriched', state, version) if version else None
 
-    return jsonify(enriched_spots)
+    # ?fields=, ?limit= / ?cursor=, compression and ETags: see api_response.py
+    return api_response.list_response(spots, version=version, transform=_with_absolute_images, headers={
+        'X-Trending-Complete': 'true' if complete else 'false',
+        'X-Incomplete-Spots': str(sum(1 for spot in spots if spot.get('incomplete'))),
+    })
 
 # --- Endpoint 2: AI Planner ---
+def _plan_options(data):
+    """(use_cache, resolve) from the JSON body or query string of a planner request."""
+    # Send {"no_cache": true} (or ?no_cache=1) to force a fresh survey and plan
+    use_cache = not (data.get('no_cache') or request.args.get('no_cache') == '1')
+    # Send {"resolve_places": true} to get every activity's image and address in the same response
+    resolve = bool(data.get('resolve_places') or request.args.get('resolve_places') == '1')
+    return use_cache, resolve
+
+def _build_plan(user_prompt, use_cache, resolve, deadline=None):
+    """
+    The /api/ai_planner response body. Photo paths under 'places' stay
+    relative (see _with_absolute_places), so this also works off-request.
+    `deadline` bounds the Tavily and Gemini calls (planner jobs pass theirs).
+    """
+    # 1. Get the JSON *string* from the AI planner
+    json_string_plan = get_ai_plan(user_prompt, use_cache=use_cache, deadline=deadline)
+    
+    try:
+        # 2. Convert the JSON string into a real Python dictionary
+        dict_plan = json.loads(json_string_plan)
+    except Exception as e:
+        print(f"Error parsing AI JSON response: {e}")
+        # If parsing fails, send the raw text back as a fallback
+        return {"friendly_response": json_string_plan}
+
+    if resolve and GOOGLE_MAPS_API_KEY and isinstance(dict_plan, dict):
+        dict_plan['places'] = places.resolve_places(_activity_names(dict_plan))
+    return dict_plan
+
 @app.route('/api/ai_planner', methods=['POST'])
 def ai_planner():
     data = request.json
@@ -124,20 +161,100 @@ def ai_planner():
         return jsonify({"error": "No prompt provided"}), 400
 
     print(f"Flask: Received AI plan request: {user_prompt}")
+    use_cache, resolve = _plan_options(data)
+
+    # Send {"async": true} to get a job id back at once instead of waiting (see Endpoint 2c)
+    if data.get('async'):
+        return _submit_plan_job(user_prompt, use_cache, resolve)
     
-    # 1. Get the JSON *string* from the AI planner
-    json_string_plan = get_ai_plan(user_prompt)
-    
+    # 3. Return the dictionary, which Flask will correctly jsonify
+    return jsonify(_with_absolute_places(_build_plan(user_prompt, use_cache, resolve)))
+
+def _activity_names(plan):
+    """Every activity name in an AI plan, in itinerary order."""
+    names = []
+    for day in plan.get('itinerary_days') or []:
+        for activity in day.get('activities') or []:
+            if activity.get('name'):
+                names.append(activity['name'])
+    return names
+
+def _absolute_place_results(results):
+    """Resolved places with proxy photo paths turned into full URLs."""
+    return {name: dict(result, imageUrl=_absolute(result['imageUrl'])) if 'imageUrl' in result else result
+            for name, result in results.items()}
+
+def _with_absolute_places(plan):
+    if isinstance(plan, dict) and 'places' in plan:
+        return dict(plan, places=_absolute_place_results(plan['places']))
+    return plan
+
+def _resolved(names):
+    """places.resolve_places with proxy photo paths turned into full URLs."""
+    return _absolute_place_results(places.resolve_places(names))
+
+# --- Endpoint 2b: AI Planner, streamed as Server-Sent Events ---
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/ai_planner/stream', methods=['GET', 'POST'])
+def ai_planner_stream():
+    """
+    Streams 'progress', 'chunk' and a final 'plan' event. Accepts the same JSON
+    body as /api/ai_planner, or ?prompt= for GET (browser EventSource).
+    """
+    data = request.get_json(silent=True) or {}
+    user_prompt = data.get('prompt') or request.args.get('prompt')
+    if not user_prompt:
+        return jsonify({"error": "No prompt provided"}), 400
+    use_cache = not (data.get('no_cache') or request.args.get('no_cache') == '1')
+
+    print(f"Flask: Received streamed AI plan request: {user_prompt}")
+
+    def events():
+        for event, payload in stream_ai_plan(user_prompt, use_cache=use_cache):
+            yield _sse(event, payload)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Stop nginx from holding the stream back
+    })
+
+# --- Endpoint 2c: AI Planner as a background job ---
+# POST returns a job id straight away; poll GET /api/ai_planner/jobs/<id>?wait=2 for it (waits are capped at 2s)
+def _submit_plan_job(user_prompt, use_cache, resolve):
     try:
-        # 2. Convert the JSON string into a real Python dictionary
-        dict_plan = json.loads(json_string_plan)
-        
-        # 3. Return the dictionary, which Flask will correctly jsonify
-        return jsonify(dict_plan)
-    except Exception as e:
-        print(f"Error parsing AI JSON response: {e}")
-        # If parsing fails, send the raw text back as a fallback
-        return jsonify({"friendly_response": json_string_plan})
+        job_id = planner_jobs.submit(_build_plan, user_prompt, use_cache, resolve, prompt=user_prompt)
+    except planner_jobs.QueueFull as e:
+        print(f"AI planner queue full: {e}")
+        response = jsonify({"error": "The AI planner is busy, please try again shortly."})
+        response.headers['Retry-After'] = '10'
+        return response, 429
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "poll_url": f"/api/ai_planner/jobs/{job_id}",
+    }), 202
+
+@app.route('/api/ai_planner/jobs', methods=['POST'])
+def ai_planner_job_submit():
+    data = request.get_json(silent=True) or {}
+    user_prompt = data.get('prompt')
+    if not user_prompt:
+        return jsonify({"error": "No prompt provided"}), 400
+    print(f"Flask: Queued AI plan request: {user_prompt}")
+    return _submit_plan_job(user_prompt, *_plan_options(data))
+
+@app.route('/api/ai_planner/jobs/<job_id>', methods=['GET'])
+def ai_planner_job(job_id):
+    """The job's status; 'result' holds the same body /api/ai_planner returns once it is done."""
+    wait = request.args.get('wait', 0, type=float)
+    job = planner_jobs.get(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if 'result' in job:
+        job['result'] = _with_absolute_places(job['result'])
+    return jsonify(job)
 
 # --- Endpoint 3: Find Place (For the search bar) ---
 @app.route('/api/find_place', methods=['GET'])
@@ -147,19 +264,9 @@ def find_place():
     if not query or not GOOGLE_MAPS_API_KEY:
         return jsonify({"error": "Missing query or server API key"}), 400
     
-    FIND_PLACE_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    
-    params = {
-        "input": query,
-        "inputtype": "textquery",
-        "fields": "place_id,name,formatted_address,photos", # We only need the lat/lng
-        "key": GOOGLE_MAPS_API_KEY
-    }
-    
     try:
-        response = requests.get(FIND_PLACE_URL, params=params)
-        data = response.json()
-        print("[Google Find Place Response]:", data)
+        data = places.find_place(query, "place_id,name,formatted_address,photos")
+        logs.debug('find_place', sample=True, query=query, status=data.get('status'))
         
         if data.get('status') == 'OK' and data.get('candidates'):
             candidate = data['candidates'][0]
@@ -169,7 +276,7 @@ def find_place():
             imageUrl = "https://placehold.co/400x400/0f2027/b2dfdb?text=No+Image"
             if candidate.get('photos'):
                 photo_ref = candidate['photos'][0]['photo_reference']
-                imageUrl = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photo_reference={photo_ref}&key={GOOGLE_MAPS_API_KEY}"
+                imageUrl = _absolute(places.photo_url(photo_ref))
             
             location = candidate.get('formatted_address', 'No address found')
             
@@ -183,66 +290,52 @@ def find_place():
         else:
             return jsonify({"status": data.get('status'), "error_message": data.get('error_message')})
             
+    except CircuitOpen as e:
+        return _circuit_open(e, places.breaker)
     except requests.exceptions.RequestException as e:
         print(f"Error calling Find Place API: {e}")
         return jsonify({"error": str(e)}), 500
     
+# --- Endpoint 3b: Resolve many places at once (AI itinerary activities) ---
+RESOLVE_MAX_NAMES = 50
+
+@app.route('/api/resolve_places', methods=['POST'])
+def resolve_places():
+    """
+    Takes {"names": [...]} and returns {"places": {name: {status, imageUrl, location}}},
+    one entry per name in the same shape as /api/find_place.
+    """
+    data = request.get_json(silent=True) or {}
+    names = data.get('names')
+    if not isinstance(names, list) or not all(isinstance(name, str) and name.strip() for name in names):
+        return jsonify({"error": "'names' must be a list of place names"}), 400
+    if len(names) > RESOLVE_MAX_NAMES:
+        return jsonify({"error": f"At most {RESOLVE_MAX_NAMES} names per request"}), 400
+    if not GOOGLE_MAPS_API_KEY:
+        return jsonify({"error": "Missing server API key"}), 400
+
+    print(f"Flask: Resolving {len(names)} places")
+    return jsonify({"places": _resolved(names)})
+    
 # --- Endpoint 4: Nearby Places (For categories) ---
 @app.route('/api/nearby_places', methods=['GET'])
 def nearby_places():
-# ... (rest of this function is unchanged) ...
-    lat = request.args.get('lat')
-    lng = request.args.get('lng')
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
     category = request.args.get('category') 
 
-    if not all([lat, lng, category, GOOGLE_MAPS_API_KEY]):
+    if lat is None or lng is None or not all([category, GOOGLE_MAPS_API_KEY]):
         return jsonify({"error": "Missing parameters or server API key"}), 400
 
-    PLACES_API_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    
-    params = {
-        "location": f"{lat},{lng}",
-        "radius": 5000, # 5km radius
-        "type": category.lower(),
-        "key": GOOGLE_MAPS_API_KEY
-        # By removing 'fields', we get all data (photos, rating, etc.)
-    }
-
     try:
-        response = requests.get(PLACES_API_URL, params=params)
-        data = response.json()
-        
-        print(f"[Google Nearby Response]: {data}")
-        
-        places = []
-        if data.get('status') == 'OK':
-            for result in data.get('results', []):
-                
-                # --- THIS IS THE FIX ---
-                # 1. Get the photo reference, if it exists
-                photo_ref = None
-                if result.get('photos'):
-                    photo_ref = result.get('photos')[0].get('photo_reference')
-                
-                # 2. Build the full photo URL
-                image_url = "https://placehold.co/400x400/0f2027/b2dfdb?text=No+Image" # Placeholder
-                if photo_ref:
-                    image_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photo_reference={photo_ref}&key={GOOGLE_MAPS_API_KEY}"
-                
-                # 3. Add the new data to our response
-                places.append({
-                    "name": result.get('name'),
-                    "lat": result.get('geometry', {}).get('location', {}).get('lat'),
-                    "lng": result.get('geometry', {}).get('location', {}).get('lng'),
-                    "vicinity": result.get('vicinity'), # The address
-                    "rating": result.get('rating', 0),  # The star rating
-                    "user_ratings_total": result.get('user_ratings_total', 0), # Total reviews
-                    "imageUrl": image_url # The new, full image URL
-                })
-                # -----------------------------------------------------
-        
-        return jsonify(places) # Return the list (even if empty)
+        # Served from cached geohash tiles; see nearby_tiles.py
+        nearby, version = nearby_tiles.get_nearby(lat, lng, category)
+        # Return the list (even if empty); the version covers the exact position asked about
+        return api_response.list_response(nearby, version=(lat, lng, version) if version else None,
+                                          transform=_with_absolute_images)
 
+    except CircuitOpen as e:
+        return _circuit_open(e, places.breaker)
     except requests.exceptions.RequestException as e:
         print(f"Error calling Places API: {e}")
         return jsonify({"error": str(e)}), 500
@@ -253,21 +346,10 @@ def search_place():
     if not query or not GOOGLE_MAPS_API_KEY:
         return jsonify({"error": "Missing query or server API key"}), 400
     
-    FIND_PLACE_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    
-    params = {
-        "input": query,
-        "inputtype": "textquery",
-        # --- CRITICAL FIX: Added 'geometry' here ---
-        # We need 'geometry' to get lat/lng. We also get photos and address.
-        "fields": "place_id,name,formatted_address,photos,geometry", 
-        "key": GOOGLE_MAPS_API_KEY
-    }
-    
     try:
-        response = requests.get(FIND_PLACE_URL, params=params)
-        data = response.json()
-        print(f"[Google Search Place Response]: {data}")
+        # We need 'geometry' to get lat/lng. We also get photos and address.
+        data = places.find_place(query, "place_id,name,formatted_address,photos,geometry")
+        logs.debug('search_place', sample=True, query=query, status=data.get('status'))
         
         if data.get('status') == 'OK' and data.get('candidates'):
             candidate = data['candidates'][0]
@@ -281,7 +363,7 @@ def search_place():
             imageUrl = "https://placehold.co/400x400/0f2027/b2dfdb?text=No+Image"
             if candidate.get('photos'):
                 photo_ref = candidate['photos'][0]['photo_reference']
-                imageUrl = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photo_reference={photo_ref}&key={GOOGLE_MAPS_API_KEY}"
+                imageUrl = _absolute(places.photo_url(photo_ref))
             
             # 3. Get formatted address
             formatted_address = candidate.get('formatted_address', 'No address found')
@@ -297,9 +379,169 @@ def search_place():
         else:
             return jsonify({"status": data.get('status'), "error_message": data.get('error_message')})
             
+    except CircuitOpen as e:
+        return _circuit_open(e, places.breaker)
     except requests.exceptions.RequestException as e:
         print(f"Error calling Find Place API: {e}")
         return jsonify({"error": str(e)}), 500
 
+# --- Endpoint 5b: Spot search (local index first) ---
+SEARCH_SPOTS_MAX_LIMIT = 50
+
+def _google_spot(query):
+    """Google's best match for `query` shaped like a scraped spot, or None."""
+    data = places.find_place(query, "place_id,name,formatted_address,photos,geometry,rating")
+    if data.get('status') != 'OK' or not data.get('candidates'):
+        return None
+    candidate = data['candidates'][0]
+    image_url = places.NO_IMAGE
+    if candidate.get('photos'):
+        image_url = places.photo_url(candidate['photos'][0]['photo_reference'])
+    return {
+        'id': f"google_{candidate.get('place_id')}",
+        'name': candidate.get('name'),
+        'location': candidate.get('formatted_address', 'No address found'),
+        'description': '',
+        'imageUrl': image_url,
+        'rating': candidate.get('rating'),
+        'coordinates': candidate.get('geometry', {}).get('location'),
+    }
+
+@app.route('/api/search_spots', methods=['GET'])
+def search_spots():
+    """
+    ?q=...&state=...&limit=... searches every scraped spot in memory, typo
+    tolerant and prefix matching. Google is only asked when nothing local
+    matches well (skip that with ?google=0). Returns {"results", "source"}.
+    """
+    query = (request.args.get('q') or request.args.get('query') or '').strip()
+    if not query:
+        return jsonify({"error": "Missing query"}), 400
+    state = request.args.get('state') or None
+    limit = max(1, min(request.args.get('limit', 10, type=int), SEARCH_SPOTS_MAX_LIMIT))
+
+    results, good = spot_index.search(query, state, limit)
+    source = 'local'
+    if not good and GOOGLE_MAPS_API_KEY and request.args.get('google') != '0':
+        try:
+            spot = _google_spot(f"{query} {state}" if state else f"{query} Malaysia")
+            if spot is not None:
+                results, source = [spot], 'google'
+        except requests.exceptions.RequestException as e:
+            print(f"Spot search: Google fallback failed, keeping local results: {e}") # Includes CircuitOpen
+    return jsonify({"results": _with_absolute_images(results), "source": source})
+
+# --- Endpoint 6: Photo proxy ---
+# Serves Places photos from our disk cache so the app never sees the API key
+PHOTO_MAX_AGE = 30 * 24 * 3600 # A photo_reference always points to the same image
+_PHOTO_REF = re.compile(r'[A-Za-z0-9_-]{1,1024}')
+
+@app.route('/api/photo/<photo_reference>', methods=['GET'])
+def photo(photo_reference):
+    if not GOOGLE_MAPS_API_KEY:
+        return jsonify({"error": "Missing server API key"}), 400
+    if not _PHOTO_REF.fullmatch(photo_reference):
+        return jsonify({"error": "Invalid photo reference"}), 400
+    width = request.args.get('maxwidth', photo_cache.DEFAULT_WIDTH, type=int)
+
+    try:
+        path, meta = photo_cache.get_photo(photo_reference, width)
+    except photo_cache.PhotoError as e:
+        print(f"Photo not available: {e}")
+        return jsonify({"error": "Photo not found"}), 404
+    except CircuitOpen as e:
+        return _circuit_open(e, places.breaker)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching photo from Google: {e}")
+        return jsonify({"error": str(e)}), 502
+
+    # send_file streams from disk and answers If-None-Match with a 304
+    response = send_file(path, mimetype=meta['content_type'], etag=meta['etag'],
+                         conditional=True, max_age=PHOTO_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+# --- Cache inspection ---
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "place_cache": places.place_cache.stats(),
+        "places_limiter": places.limiter.stats(),
+        "scraper": cache_status(),
+        "enriched_cache": trending.enriched_cache.stats(),
+        "snapshot": snapshot.stats(),
+        "planner": planner_cache_stats(),
+        "planner_clients": planner_client_stats(),
+        "planner_tokens": planner_token_stats(),
+        "responses": api_response.stats(),
+        "photo_cache": photo_cache.stats(),
+        "planner_jobs": planner_jobs.stats(),
+        "nearby_tiles": nearby_tiles.stats(),
+        "spot_index": spot_index.stats(),
+        "circuit_breakers": circuit_breaker.all_stats(),
+        "single_flight": {
+            "trending_spots": trending.build_stats(),
+            "ai_planner": planner_flight_stats(),
+        },
+    })
+
+# Rebuild the startup snapshot in the background if it is missing or old
+snapshot.start_warm_up()
+# Build the Gemini/Tavily clients in the background too, if PLANNER_WARMUP_ON_BOOT=1
+start_planner_warm_up()
+
+# --- Prometheus metrics ---
+def _cache_metrics():
+    """Hit/miss counters and sizes of every cache, read from their stats() at scrape time."""
+    caches = {
+        'place': places.place_cache.stats(),
+        'scrape': _scrape_cache_totals(),
+        'enriched': trending.enriched_cache.stats(),
+        'planner_plans': planner_cache_stats()['plans'],
+        'planner_searches': planner_cache_stats()['searches'],
+        'photo': photo_cache.stats(),
+        'nearby_tiles': nearby_tiles.tile_cache.stats(),
+    }
+    for cache, info in caches.items():
+        labels = {'cache': cache}
+        yield 'jomjalan_cache_hits_total', 'counter', 'Cache lookups answered from the cache.', labels, info.get('hits')
+        yield 'jomjalan_cache_misses_total', 'counter', 'Cache lookups that had to go upstream.', labels, info.get('misses')
+        yield 'jomjalan_cache_hit_ratio', 'gauge', 'hits / (hits + misses) since start.', labels, info.get('hit_ratio')
+        yield 'jomjalan_cache_entries', 'gauge', 'Entries currently cached.', labels, info.get('entries')
+
+def _scrape_cache_totals():
+    """The scraper's per-state counters summed into one hit/miss view."""
+    hits = misses = 0
+    for info in cache_status().values():
+        hits += info['fresh_served'] + info['stale_served']
+        misses += info['misses']
+    return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else 0.0}
+
+def _limiter_metrics():
+    limiter = places.limiter.stats()
+    for priority, info in limiter['priorities'].items():
+        labels = {'priority': priority}
+        yield 'jomjalan_places_queue_depth', 'gauge', 'Places calls waiting for the rate limiter.', labels, info['queue_depth']
+        yield 'jomjalan_places_wait_seconds_total', 'counter', 'Time spent waiting for the rate limiter.', labels, info['wait_seconds']
+        yield 'jomjalan_places_acquired_total', 'counter', 'Places calls let through by the rate limiter.', labels, info['acquired']
+        yield 'jomjalan_places_limiter_timeouts_total', 'counter', 'Places calls refused after waiting too long.', labels, info['timeouts']
+    yield 'jomjalan_places_rate_factor', 'gauge', 'Share of PLACES_QPS currently allowed after quota backoff.', {}, limiter.get('rate_factor')
+
+def _breaker_metrics():
+    for name, info in circuit_breaker.all_stats().items():
+        labels = {'breaker': name}
+        yield 'jomjalan_circuit_state', 'gauge', 'Circuit breaker state: 0 closed, 1 half-open, 2 open.', labels, circuit_breaker.STATE_VALUES[info['state']]
+        yield 'jomjalan_circuit_opened_total', 'counter', 'Times the breaker opened.', labels, info['opened']
+        yield 'jomjalan_circuit_rejected_total', 'counter', 'Calls refused while the breaker was open.', labels, info['rejected']
+
+metrics.register_collector(_cache_metrics)
+metrics.register_collector(_limiter_metrics)
+metrics.register_collector(_breaker_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+# --------------------------
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Benchmark: serial vs. concurrent Places enrichment for /api/trending_spots.
+
+Runs against a local fake Places server, so no API key or network is needed.
+
+    cd backend
+    python benchmarks/bench_enrichment.py --spots 25 --latency 0.15
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_upstreams import FakeUpstreams
+
+
+def _fake_spots(count, state):
+    return [
+        {'id': f'bench_{state}_{i}', 'name': f'Spot {i}', 'location': state,
+         'description': 'Benchmark spot.', 'imageUrl': ''}
+        for i in range(count)
+    ]
+
+
+def _time_run(trending, spots, state, workers, rounds):
+    timings = []
+    for _ in range(rounds):
+        batch = [dict(spot) for spot in spots]
+        start = time.perf_counter()
+        result = trending.enrich_spots(batch, state, max_workers=workers)
+        timings.append(time.perf_counter() - start)
+        assert [s['id'] for s in result] == [s['id'] for s in spots], "Order changed!"
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spots', type=int, default=25, help='Spots per state (default: 25)')
+    parser.add_argument('--latency', type=float, default=0.15, help='Fake Google latency in seconds')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(latency={'places': args.latency}).start()
+    os.environ['PLACES_API_BASE'] = upstreams.places_base
+    os.environ.setdefault('PLACES_QPS', '0') # Unthrottled: measure our own overhead, not the rate limit
+    os.environ.setdefault('SERVER_MAPS_KEY', 'bench-key')
+    # Measure the raw fan-out: a throwaway place cache that never hits
+    os.environ['PLACE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_places.sqlite3')
+    os.environ['PLACE_CACHE_TTL'] = '0'
+
+    import trending # Imported late so it picks up the fake server URL
+
+    state = 'Kuala Lumpur'
+    spots = _fake_spots(args.spots, state)
+    print(f"\n{args.spots} spots, {args.latency * 1000:.0f} ms fake Google latency, {args.rounds} rounds")
+    print(f"{'workers':>8} {'median (s)':>11} {'max (s)':>9} {'speedup':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        median, worst = _time_run(trending, spots, state, workers, args.rounds)
+        baseline = baseline or median
+        print(f"{workers:>8} {median:>11.3f} {worst:>9.3f} {baseline / median:>7.1f}x")
+
+    upstreams.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark + equivalence check: full-page parse vs. the fast content-block parse.
+
+Uses the saved HTML snapshots in benchmarks/fixtures. Exits non-zero if the
+two parsers disagree on any fixture, so it doubles as a regression check.
+
+    cd backend
+    python benchmarks/bench_parsing.py --rounds 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# fixture file -> (domain it was saved from, state it belongs to)
+FIXTURES = {
+    'klfoodie_kl.html': ('klfoodie.com', 'Kuala Lumpur'),
+    'ecentral_perak.html': ('ecentral.my', 'Perak'),
+}
+
+
+def _parse(domain, html, state, fast):
+    with contextlib.redirect_stdout(io.StringIO()): # The parsers are chatty
+        return scraper.parse_page(domain, html, state, fast=fast)
+
+
+def _time(domain, html, state, fast, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _parse(domain, html, state, fast)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'fixture':<22} {'spots':>5} {'full (ms)':>10} {'fast (ms)':>10} {'speedup':>8}  same?")
+    for filename, (domain, state) in FIXTURES.items():
+        with open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+            html = f.read()
+
+        full_spots = _parse(domain, html, state, fast=False)
+        fast_spots = _parse(domain, html, state, fast=True)
+        same = full_spots == fast_spots
+        failed = failed or not same or not full_spots
+
+        full = _time(domain, html, state, False, args.rounds)
+        fast = _time(domain, html, state, True, args.rounds)
+        print(f"{filename:<22} {len(full_spots):>5} {full * 1000:>10.2f} {fast * 1000:>10.2f} {full / fast:>7.1f}x  {'yes' if same else 'NO'}")
+
+        if not same:
+            for old, new in zip(full_spots, fast_spots):
+                if old != new:
+                    print(f"  first difference:\n    full: {old}\n    fast: {new}")
+                    break
+            else:
+                print(f"  spot count differs: full={len(full_spots)} fast={len(fast_spots)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
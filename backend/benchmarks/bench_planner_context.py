@@ -0,0 +1,163 @@
+"""
+Offline benchmark for the planner's context budget.
+
+Runs get_ai_plan against a stub Tavily, which returns long, overlapping
+travel-guide results, and a stub Gemini. The stub Gemini sleeps in
+proportion to the prompt's tokens. That makes the model's latency depend
+on prompt size, as the real one does. For each context budget it reports
+what survived deduplication and trimming, the prompt size, and the latency.
+"raw" is the old behaviour: every result's full text, undeduplicated.
+
+    cd backend
+    python benchmarks/bench_planner_context.py
+    python benchmarks/bench_planner_context.py --budgets 300 1000 2000 --results 10 --input-cost 0.0005
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('LOG_LEVEL', 'WARNING') # Keep the per-call token logs out of the table
+
+from fake_upstreams import FAKE_PLAN
+
+import ai_planner
+import planner_context
+
+SENTENCES = [
+    "Ipoh Old Town is best explored on foot in the early morning before the heat sets in.",
+    "Concubine Lane is packed with souvenir stalls, cafes and murals.",
+    "Nam Heong is famous for its white coffee and egg tarts.",
+    "Kek Lok Tong is a cave temple with a quiet garden and lake behind it.",
+    "Try the bean sprout chicken at Lou Wong, one of the most popular dinners in town.",
+    "The Ernest Zacharevic murals are scattered around the heritage quarter.",
+    "Gunung Lang Recreational Park has a short boat ride and a lookout tower.",
+    "Kellie's Castle in Batu Gajah is an unfinished mansion with a ghost story or two.",
+    "Parking in the old town is limited on weekends, so arrive early.",
+    "Dim sum breakfasts at Foh San start as early as 6.30am.",
+    "The Banjaran Hotsprings resort is a splurge, but day passes are available.",
+    "Sam Poh Tong is one of the oldest cave temples in Malaysia.",
+    "Many cafes close on Tuesdays, so check before you go.",
+    "Funny Mountain soya bean is a roadside stop loved by locals.",
+    "The Ipoh Railway Station is nicknamed the Taj Mahal of Ipoh.",
+]
+
+
+class StubUsage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class StubResponse:
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class StubGemini:
+    """Sleeps base + input_cost per prompt token + output_cost per output token, like a real model roughly does."""
+
+    def __init__(self, base, input_cost, output_cost):
+        self.base, self.input_cost, self.output_cost = base, input_cost, output_cost
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        text = json.dumps(FAKE_PLAN)
+        prompt_tokens = planner_context.estimate_tokens(prompt)
+        output_tokens = planner_context.estimate_tokens(text)
+        time.sleep(self.base + prompt_tokens * self.input_cost + output_tokens * self.output_cost)
+        return StubResponse(text, StubUsage(prompt_tokens, output_tokens))
+
+
+class StubTavily:
+    """Long results that overlap: the same facts quoted across sites, plus a near copy of the top page."""
+
+    def __init__(self, results, seed):
+        self.results, self.seed = results, seed
+
+    def search(self, query, search_depth="basic", max_results=5, **kwargs):
+        rng = random.Random(self.seed)
+        results = []
+        for i in range(self.results):
+            # About half quote what every guide says, half are this site's own
+            sentences = [rng.choice(SENTENCES) if rng.random() < 0.5 else f"Guide {i}, tip {j}: {rng.choice(SENTENCES)}"
+                         for j in range(rng.randint(15, 40))]
+            results.append({
+                "url": f"https://example.com/ipoh-guide-{i}",
+                "title": f"Ipoh guide {i}",
+                "content": ' '.join(sentences),
+                "score": round(rng.uniform(0.3, 0.95), 3),
+            })
+        if results:
+            copy = dict(results[0], url="https://mirror.example.com/ipoh-guide-0", score=results[0]['score'] - 0.01)
+            results.append(copy)
+        return {"results": results}
+
+
+def _raw_context(search_results):
+    """What the planner sent before the context stage: every result, whole."""
+    context = ''.join(f"- {r['content']} (Source: {r['url']})\n" for r in search_results.get('results', []))
+    return context or planner_context.NO_CONTEXT, {'results': len(search_results.get('results', [])), 'duplicates': 0,
+                                                   'snippets': len(search_results.get('results', [])), 'trimmed': 0,
+                                                   'context_tokens': planner_context.estimate_tokens(context)}
+
+
+def _run(budget, rounds):
+    """Median plan latency and median context build time, in seconds."""
+    latencies, builds = [], []
+    build_context = ai_planner._build_context
+
+    def timed(search_results):
+        started = time.perf_counter()
+        if budget == 'raw':
+            result = _raw_context(search_results)
+        else:
+            result = planner_context.build_context(search_results, budget=budget)
+        builds.append(time.perf_counter() - started)
+        return result
+
+    ai_planner._build_context = timed
+    try:
+        for i in range(rounds):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()): # The planner is chatty
+                ai_planner.get_ai_plan(f"3 days in Ipoh #{budget}-{i}", use_cache=False)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        ai_planner._build_context = build_context
+    return statistics.median(latencies), statistics.median(builds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', type=int, nargs='+', default=[250, 500, 1000, 1500, 3000])
+    parser.add_argument('--results', type=int, default=8, help='Tavily results per search')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--base', type=float, default=0.05, help='Stub model: fixed seconds per call')
+    parser.add_argument('--input-cost', type=float, default=0.0002, help='Stub model: seconds per prompt token')
+    parser.add_argument('--output-cost', type=float, default=0.002, help='Stub model: seconds per output token')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    ai_planner.set_clients(StubGemini(args.base, args.input_cost, args.output_cost), StubTavily(args.results, args.seed))
+
+    print(f"{'budget':>7} {'kept':>5} {'dups':>5} {'cut':>4} {'context tok':>12} {'prompt tok':>11} {'build (ms)':>11} {'plan (s)':>9}")
+    for budget in ['raw'] + args.budgets:
+        before = ai_planner.token_stats()
+        latency, build = _run(budget, args.rounds)
+        after = ai_planner.token_stats()
+        prompt_tokens = (after['input_tokens'] - before['input_tokens']) / args.rounds
+        search = StubTavily(args.results, args.seed).search('')
+        info = _raw_context(search)[1] if budget == 'raw' else planner_context.build_context(search, budget=budget)[1]
+        print(f"{budget:>7} {info['snippets']:>5} {info['duplicates']:>5} {info['trimmed']:>4} "
+              f"{info['context_tokens']:>12} {prompt_tokens:>11.0f} {build * 1000:>11.2f} {latency:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark for the list responses: payload size and serialization time.
+
+Builds an enriched-looking trending list from the saved HTML snapshots in
+benchmarks/fixtures (scraped spots plus the fields Google enrichment adds),
+then reports:
+  1. encode time with Flask's jsonify encoder, compact json and orjson (if
+     installed), and the body size as JSON, gzip and brotli (if installed),
+     for the whole list, a ?fields= projection and one ?limit= page;
+  2. /api/trending_spots through the test client: a first request (encoded
+     and compressed), a repeat (served from the encoded cache) and a
+     revalidation (304), next to what the route used to do (jsonify).
+
+No network calls; the trending build is replaced by the fixture list.
+
+    cd backend
+    python benchmarks/bench_responses.py --rounds 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault('SERVER_MAPS_KEY', 'bench-key')
+os.environ.setdefault('WARMUP_ON_BOOT', '0')
+
+with contextlib.redirect_stdout(io.StringIO()): # The app prints on import
+    import app
+import api_response
+import scraper
+import trending
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURES = {
+    'klfoodie_kl.html': 'klfoodie.com',
+    'ecentral_perak.html': 'ecentral.my',
+}
+STATE = 'Perak'
+FIELDS = 'name,imageUrl,rating'
+
+
+def _spots(count):
+    """`count` fixture spots, enriched the way trending.py enriches them."""
+    scraped = []
+    for filename, domain in FIXTURES.items():
+        with open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+            html = f.read()
+        with contextlib.redirect_stdout(io.StringIO()): # The parsers are chatty
+            scraped.extend(scraper.parse_page(domain, html, STATE))
+    spots = []
+    for i in range(count):
+        spot = dict(scraped[i % len(scraped)])
+        spot.update({
+            'rating': round(3.5 + (i % 15) / 10, 1),
+            'user_ratings_total': 40 + i * 37,
+            'priceLevel': i % 4 or None,
+            'imageUrl': f"/api/photo/AUc7tXW{'x' * 180}{i:04d}", # Photo references are long
+        })
+        spots.append(spot)
+    return spots
+
+
+def _median_ms(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def _encoders():
+    encoders = {'jsonify': lambda value: app.app.json.dumps(value).encode('utf-8'),
+                'json': lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')}
+    if api_response.orjson is not None:
+        encoders['orjson'] = api_response.orjson.dumps
+    return encoders
+
+
+def _payloads(spots, rounds):
+    variants = {
+        'full list': spots,
+        f'fields={FIELDS}': api_response.project(spots, api_response.parse_fields(FIELDS)),
+        'limit=20': spots[:20],
+    }
+    encodings = ['gzip'] + (['br'] if api_response.brotli is not None else [])
+    encoders = _encoders()
+
+    print(f"{'payload':<30} " + ' '.join(f"{name + ' (ms)':>13}" for name in encoders)
+          + f" {'json (KB)':>10} " + ' '.join(f"{name + ' (KB)':>10} {'ms':>6}" for name in encodings))
+    with app.app.app_context():
+        for name, value in variants.items():
+            times = [_median_ms(lambda: encode(value), rounds) for encode in encoders.values()]
+            body = api_response.dumps(value)
+            sizes = []
+            for encoding in encodings:
+                compressed = api_response.compress(body, encoding)
+                sizes.append((len(compressed), _median_ms(lambda: api_response.compress(body, encoding), rounds)))
+            print(f"{name:<30} " + ' '.join(f"{t:>13.3f}" for t in times) + f" {len(body) / 1024:>10.1f} "
+                  + ' '.join(f"{size / 1024:>10.1f} {ms:>6.2f}" for size, ms in sizes))
+
+
+def _jsonify_response(items, version=None, transform=None, headers=None):
+    """What the routes returned before api_response: the whole list through jsonify."""
+    response = app.jsonify(transform(items) if transform else items)
+    response.headers.update(headers or {})
+    return response
+
+
+def _route(spots, rounds):
+    trending.get_spots_within = lambda state, budget_ms=None: (spots, True, 'bench-version')
+    client = app.app.test_client()
+    url = f'/api/trending_spots?state={STATE}'
+    paged = f'{url}&fields={FIELDS}&limit=20'
+    accept = {'Accept-Encoding': 'br, gzip'}
+    list_response = api_response.list_response
+
+    def first():
+        api_response.encoded_cache.clear()
+        return client.get(url, headers=accept)
+
+    def before():
+        api_response.list_response = _jsonify_response
+        try:
+            return client.get(url, headers=accept)
+        finally:
+            api_response.list_response = list_response
+
+    with contextlib.redirect_stdout(io.StringIO()): # The route prints every request
+        etag = first().headers['ETag']
+        cases = [
+            ('before: jsonify, uncompressed', before),
+            ('first request', first),
+            ('repeat (encoded cache)', lambda: client.get(url, headers=accept)),
+            ('revalidation (304)', lambda: client.get(url, headers=dict(accept, **{'If-None-Match': etag}))),
+            ('fields + limit=20', lambda: client.get(paged, headers=accept)),
+        ]
+        rows = [(name, _median_ms(fn, rounds), len(fn().get_data())) for name, fn in cases]
+
+    print(f"\n{'/api/trending_spots (' + str(len(spots)) + ' spots)':<32} {'ms':>7} {'sent (KB)':>10}")
+    for name, ms, size in rows:
+        print(f"{name:<32} {ms:>7.3f} {size / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spots', type=int, default=60, help='Spots in the list (a busy state has 40-80)')
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    spots = _spots(args.spots)
+    print(f"encoder: {'orjson' if api_response.orjson is not None else 'json'}, "
+          f"compression: {', '.join(api_response.ENCODINGS)}\n")
+    _payloads(spots, args.rounds)
+    _route(spots, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Offline end-to-end benchmark for every Flask route.
+
+Starts the fake upstreams (Places, Tavily, Gemini, scraped blogs) and the real
+Flask app on local ports, then drives each route at several concurrency levels
+and reports throughput and p50/p95/p99 latency.
+
+    cd backend
+    python benchmarks/bench_routes.py                        # compare with the saved baseline
+    python benchmarks/bench_routes.py --save-baseline        # record a new baseline
+    python benchmarks/bench_routes.py --routes trending_spots --concurrency 1 16 \\
+        --latency places=0.1 scrape=0.5 --error-rate places=0.05
+
+Exits non-zero if any route is slower than the baseline by more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_upstreams import FakeUpstreams, point_backend_at
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'routes.json')
+
+STATES = ['Kuala Lumpur', 'Perak', 'Penang', 'Melaka', 'Sabah']
+PLACES = ['Batu Caves', 'Petronas Twin Towers', 'Kek Lok Si', 'Jonker Street', 'Mount Kinabalu', 'Taman Negara']
+PROMPTS = ['3 days in Ipoh', '2 days in Penang for foodies', 'Weekend in Melaka on a budget', '1 day in KL']
+CATEGORIES = ['restaurant', 'cafe', 'tourist_attraction', 'lodging']
+
+# route name -> function(rng) returning (method, path, requests kwargs)
+ROUTES = {
+    'trending_spots': lambda rng: ('GET', '/api/trending_spots', {'params': {'state': rng.choice(STATES)}}),
+    'ai_planner': lambda rng: ('POST', '/api/ai_planner', {'json': {'prompt': rng.choice(PROMPTS)}}),
+    'ai_planner_stream': lambda rng: ('POST', '/api/ai_planner/stream', {'json': {'prompt': rng.choice(PROMPTS), 'no_cache': True}}),
+    'find_place': lambda rng: ('GET', '/api/find_place', {'params': {'query': rng.choice(PLACES)}}),
+    'resolve_places': lambda rng: ('POST', '/api/resolve_places', {'json': {'names': rng.sample(PLACES, 4)}}),
+    'search_place': lambda rng: ('GET', '/api/search_place', {'params': {'query': rng.choice(PLACES)}}),
+    'nearby_places': lambda rng: ('GET', '/api/nearby_places', {'params': {
+        'lat': round(3.139 + rng.uniform(-0.05, 0.05), 5),
+        'lng': round(101.6869 + rng.uniform(-0.05, 0.05), 5),
+        'category': rng.choice(CATEGORIES),
+    }}),
+}
+
+
+def _parse_pairs(pairs):
+    """['places=0.1', 'scrape=0.5'] -> {'places': 0.1, 'scrape': 0.5}"""
+    result = {}
+    for pair in pairs or []:
+        name, value = pair.split('=', 1)
+        result[name] = float(value)
+    return result
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _start_backend(upstreams, cold):
+    """Imports the Flask app against the fake upstreams and serves it on a local port."""
+    cache_dir = tempfile.mkdtemp(prefix='jomjalan-bench-')
+    os.environ['PLACES_API_BASE'] = upstreams.places_base
+    os.environ.setdefault('PLACES_QPS', '0') # Unthrottled: measure our own overhead, not the rate limit
+    os.environ.setdefault('SCRAPE_DOMAIN_INTERVAL', '0') # Same for the per-site politeness spacing
+    os.environ['SERVER_MAPS_KEY'] = 'bench-key'
+    os.environ['PLACE_CACHE_PATH'] = os.path.join(cache_dir, 'places.sqlite3')
+    os.environ['SCRAPE_CACHE_PATH'] = os.path.join(cache_dir, 'scrape.sqlite3')
+    # No startup snapshot: measure the live paths
+    os.environ['SNAPSHOT_PATH'] = os.path.join(cache_dir, 'snapshot.json')
+    os.environ['WARMUP_ON_BOOT'] = '0'
+    if cold:
+        # Every request goes all the way to the (fake) upstreams
+        os.environ['PLACE_CACHE_TTL'] = '0'
+        os.environ['SCRAPE_CACHE_DURATION'] = '0'
+        os.environ['SCRAPE_STALE_DURATION'] = '0'
+
+    from werkzeug.serving import make_server
+    import app
+    import ai_planner
+    import http_client
+    point_backend_at(upstreams, http_client, ai_planner)
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _run(base_url, route, concurrency, total, seed):
+    """Sends `total` requests to `route` from `concurrency` threads. Returns stats."""
+    make_request = ROUTES[route]
+    local = threading.local()
+    rng_lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        with rng_lock:
+            method, path, kwargs = make_request(rng)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, timeout=120, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests': total,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput': round(total / elapsed, 2),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions against `baseline`."""
+    regressions = []
+    for route, levels in results.items():
+        for level, stats in levels.items():
+            base = baseline.get('results', {}).get(route, {}).get(level)
+            if not base:
+                continue
+            if stats['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{route} @ {level}: p95 {stats['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+            if stats['throughput'] < base['throughput'] * (1 - tolerance):
+                regressions.append(f"{route} @ {level}: {stats['throughput']} req/s vs baseline {base['throughput']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', nargs='+', choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=64, help='Requests per route and concurrency level')
+    parser.add_argument('--warmup', type=int, default=4, help='Unmeasured requests before each route')
+    parser.add_argument('--latency', nargs='*', metavar='UPSTREAM=SECONDS', help='e.g. places=0.1 gemini=2')
+    parser.add_argument('--error-rate', nargs='*', metavar='UPSTREAM=RATE', help='e.g. places=0.05')
+    parser.add_argument('--cold', action='store_true', help='Disable the place and scrape caches')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--verbose', action='store_true', help="Show the backend's own log output")
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(latency=_parse_pairs(args.latency), error_rate=_parse_pairs(args.error_rate)).start()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+    results = {}
+    upstream_calls = {}
+    with quiet:
+        server, base_url = _start_backend(upstreams, args.cold)
+        for route in args.routes:
+            _run(base_url, route, 1, args.warmup, args.seed)
+            upstreams.reset_counters()
+            results[route] = {}
+            for concurrency in args.concurrency:
+                results[route][str(concurrency)] = _run(base_url, route, concurrency, args.requests, args.seed)
+            upstream_calls[route] = dict(upstreams.calls)
+        server.shutdown()
+    upstreams.stop()
+
+    print(f"\nUpstream latency (s): {upstreams.latency}   error rate: {upstreams.error_rate}   cold={args.cold}")
+    print(f"{'route':<16} {'conc':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}")
+    for route, levels in results.items():
+        for level, stats in levels.items():
+            print(f"{route:<16} {level:>4} {stats['throughput']:>8.1f} {stats['p50_ms']:>9.1f} "
+                  f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['errors']:>6}")
+        calls = ', '.join(f"{name}={count}" for name, count in upstream_calls[route].items() if count)
+        print(f"{'':<16} upstream calls: {calls or 'none'}")
+
+    report = {
+        'settings': {
+            'latency': upstreams.latency, 'error_rate': upstreams.error_rate,
+            'requests': args.requests, 'cold': args.cold,
+        },
+        'results': results,
+    }
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline yet; run with --save-baseline to record one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('settings') != report['settings']:
+        print("\nWarning: baseline was recorded with different settings; comparison may be meaningless.")
+    regressions = _compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark + sanity check for the local spot search index.
+
+Parses the saved HTML snapshots in benchmarks/fixtures, indexes their spots
+under every state (about as many spots as a fully scraped server holds), then
+times exact, misspelt and half-typed queries. Exits non-zero if a query whose
+answer is known doesn't find it (first, for exact names; in the top five,
+for misspelt ones).
+
+    cd backend
+    python benchmarks/bench_search.py --rounds 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import scraper
+from spot_index import SpotIndex, tokenize
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURES = {
+    'klfoodie_kl.html': 'klfoodie.com',
+    'ecentral_perak.html': 'ecentral.my',
+}
+
+
+def _fixture_spots():
+    spots = []
+    for filename, domain in FIXTURES.items():
+        with open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+            html = f.read()
+        with contextlib.redirect_stdout(io.StringIO()): # The parsers are chatty
+            spots.extend(scraper.parse_page(domain, html, 'Fixture'))
+    return spots
+
+
+def _misspell(word):
+    """Swaps two letters in the middle: 'petronas' -> 'petornas'."""
+    if len(word) < 5:
+        return word
+    middle = len(word) // 2
+    return word[:middle - 1] + word[middle] + word[middle - 1] + word[middle + 1:]
+
+
+def _queries(spots):
+    """(kind, query, expected spot name) for a sample of the indexed spots."""
+    queries = []
+    for spot in spots[::3]:
+        words = tokenize(spot['name'])
+        if not words:
+            continue
+        longest = max(words, key=len)
+        queries.append(('exact', spot['name'], spot['name']))
+        queries.append(('typo', ' '.join(_misspell(word) if word == longest else word for word in words), spot['name']))
+        queries.append(('prefix', ' '.join(words[:-1] + [words[-1][:3]]), None)) # Many spots may share a prefix
+    return queries
+
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    spots = _fixture_spots()
+    index = SpotIndex()
+    started = time.perf_counter()
+    for state in scraper.STATE_URLS:
+        index.update_state(state, spots, version=state)
+    build = time.perf_counter() - started
+    info = index.stats()
+    print(f"Indexed {info['spots']} spots ({info['tokens']} tokens) in {build * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    index.update_state('Perak', spots, version='refreshed')
+    print(f"Re-indexing one state: {(time.perf_counter() - started) * 1000:.2f} ms\n")
+
+    queries = _queries(spots)
+    misses = []
+    for kind, query, expected in queries:
+        results = index.search(query, state='Perak', limit=5)
+        if expected is None:
+            continue
+        # An exact name must come first; a misspelt one within the top five
+        found = [spot['name'] for _score, _state, spot in results]
+        if expected not in (found[:1] if kind == 'exact' else found):
+            misses.append((kind, query, found[0] if found else None))
+
+    # The fixtures reuse a few dozen words, so most spots match most queries: a worst case
+    print(f"{'query':<8} {'scope':<10} {'p50 (us)':>9} {'p99 (us)':>9}")
+    for kind in ('exact', 'typo', 'prefix'):
+        sample = [query for query_kind, query, _expected in queries if query_kind == kind]
+        for scope, state in (('one state', 'Kuala Lumpur'), ('all', None)):
+            timings = []
+            for i in range(args.rounds):
+                start = time.perf_counter()
+                index.search(sample[i % len(sample)], state=state, limit=10)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"{kind:<8} {scope:<10} {_percentile(timings, 50) * 1e6:>9.1f} {_percentile(timings, 99) * 1e6:>9.1f}")
+
+    if misses:
+        print(f"\n{len(misses)} queries didn't find their spot:")
+        for kind, query, found in misses[:10]:
+            print(f"  {kind}: {query!r} -> {found!r}")
+    sys.exit(1 if misses else 0)
+
+
+if __name__ == '__main__':
+    main()
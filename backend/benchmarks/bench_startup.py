@@ -0,0 +1,97 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the app and
+serve its first request.
+
+Each run is a new Python process, so nothing is shared between runs.
+"lazy" is how the server starts now, with the Gemini/Tavily clients built
+on the first planner request. "eager" builds them right after import, the
+way ai_planner used to at import time. The SDKs are imported and
+configured with dummy keys; no network calls are made.
+
+    cd backend
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _child(mode):
+    """Runs inside the fresh process: import, optionally warm up, serve one request."""
+    sys.path.insert(0, BACKEND_DIR)
+    started = time.perf_counter()
+    import app
+    import ai_planner
+    if mode == 'eager':
+        ai_planner.warm_up()
+    imported = time.perf_counter()
+
+    response = app.app.test_client().get('/api/stats')
+    served = time.perf_counter()
+    print(json.dumps({
+        'import_seconds': imported - started,
+        'first_request_seconds': served - imported,
+        'ready_seconds': served - started,
+        'status': response.status_code,
+        'clients_built': ai_planner.client_stats()['initialized'],
+    }))
+
+
+def _run_once(mode):
+    cache_dir = tempfile.mkdtemp(prefix='jomjalan-startup-')
+    env = dict(os.environ)
+    env.update({
+        'SERVER_MAPS_KEY': 'bench-key',
+        'GEMINI_API_KEY': 'bench-key',
+        'TAVILY_API_KEY': 'bench-key',
+        'PLACE_CACHE_PATH': os.path.join(cache_dir, 'places.sqlite3'),
+        'SCRAPE_CACHE_PATH': os.path.join(cache_dir, 'scrape.sqlite3'),
+        'SNAPSHOT_PATH': os.path.join(cache_dir, 'snapshot.json'),
+        'PLANNER_JOBS_PATH': os.path.join(cache_dir, 'planner_jobs.sqlite3'),
+        'WARMUP_ON_BOOT': '0',
+        'PLANNER_WARMUP_ON_BOOT': '0',
+    })
+    spawned = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1]) # The app prints on import
+    result['process_seconds'] = time.perf_counter() - spawned
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', choices=['lazy', 'eager'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child)
+        return
+
+    medians = {}
+    for mode in ('lazy', 'eager'):
+        runs = [_run_once(mode) for _ in range(args.runs)]
+        medians[mode] = {key: statistics.median(run[key] for run in runs)
+                         for key in ('import_seconds', 'first_request_seconds', 'ready_seconds', 'process_seconds')}
+        print(f"{mode:<6} import {medians[mode]['import_seconds'] * 1000:8.1f} ms   "
+              f"first request {medians[mode]['first_request_seconds'] * 1000:7.1f} ms   "
+              f"ready {medians[mode]['ready_seconds'] * 1000:8.1f} ms   "
+              f"whole process {medians[mode]['process_seconds'] * 1000:8.1f} ms   "
+              f"(clients built: {runs[-1]['clients_built']})")
+
+    saved = medians['eager']['ready_seconds'] - medians['lazy']['ready_seconds']
+    print(f"\nLazy clients save {saved * 1000:.1f} ms per worker start (median of {args.runs} runs).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Local stand-ins for every upstream the backend talks to, used by the benchmarks.
+
+One threaded HTTP server answers as:
+  - Google Places  (/maps/api/place/findplacefromtext/json, /nearbysearch/json)
+  - Tavily         (POST /tavily/search)
+  - Gemini         (POST /gemini/generate)
+  - scraped blogs  (/scrape/<host>/<path>, served from benchmarks/fixtures)
+
+Each upstream has its own artificial latency and error rate, and the server
+counts how many calls each one received.
+"""
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Which saved page each scraped site returns
+SCRAPE_FIXTURES = {
+    'klfoodie.com': 'klfoodie_kl.html',
+    'ecentral.my': 'ecentral_perak.html',
+}
+
+STREAM_CHUNKS = 8 # How many pieces a streamed Gemini answer arrives in
+
+DEFAULT_LATENCY = {'places': 0.05, 'tavily': 0.2, 'gemini': 0.5, 'scrape': 0.2}
+
+FAKE_PLAN = {
+    "friendly_response": "Jom! Here's a **fake** plan from the benchmark server.",
+    "itinerary_days": [
+        {"day": f"Day {d}", "title": "Heritage & Food", "activities": [
+            {"name": f"Fake Spot {d}.{a}", "description": "A nice place to visit."} for a in range(4)
+        ]} for d in range(1, 4)
+    ],
+}
+
+
+class FakeUpstreams:
+    def __init__(self, latency=None, error_rate=None, port=0):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.error_rate = {name: 0.0 for name in DEFAULT_LATENCY}
+        self.error_rate.update(error_rate or {})
+        self.calls = {name: 0 for name in DEFAULT_LATENCY}
+        self._lock = threading.Lock()
+        self._fixtures = {}
+        for host, filename in SCRAPE_FIXTURES.items():
+            with open(os.path.join(FIXTURES_DIR, filename), 'rb') as f:
+                self._fixtures[host] = f.read()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.server.daemon_threads = True
+        host, port = self.server.server_address
+        self.base_url = f"http://{host}:{port}"
+        self.places_base = f"{self.base_url}/maps/api/place"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = {name: 0 for name in self.calls}
+
+    # --- What each upstream answers ---
+    def _upstream_for(self, path):
+        if path.startswith('/maps/api/place/'):
+            return 'places'
+        if path.startswith('/tavily/'):
+            return 'tavily'
+        if path.startswith('/gemini/'):
+            return 'gemini'
+        if path.startswith('/scrape/'):
+            return 'scrape'
+        return None
+
+    def _places(self, path, query):
+        name = query.get('input', ['Unknown'])[0]
+        if path.endswith('/findplacefromtext/json'):
+            return 200, 'application/json', {
+                "status": "OK",
+                "candidates": [{
+                    "place_id": f"fake_{abs(hash(name))}",
+                    "name": name,
+                    "rating": 4.5,
+                    "user_ratings_total": 120,
+                    "price_level": 2,
+                    "formatted_address": f"{name}, Malaysia",
+                    "geometry": {"location": {"lat": 3.1390, "lng": 101.6869}},
+                    "photos": [{"photo_reference": "fake_photo_ref"}],
+                }],
+            }
+        if path.endswith('/nearbysearch/json'):
+            # Pages 2 and 3 are reached with the token handed out by the page before
+            token = query.get('pagetoken', [None])[0]
+            if token:
+                location, page = token.rsplit(':', 1)
+                page = int(page)
+            else:
+                location, page = query.get('location', ['3.139,101.6869'])[0], 1
+            lat, lng = (float(v) for v in location.split(','))
+            rng = random.Random(f"{lat:.3f},{lng:.3f},{page}")
+            body = {
+                "status": "OK",
+                "results": [{
+                    "place_id": f"nearby_{page}_{i}_{lat:.4f}_{lng:.4f}",
+                    "name": f"Nearby Place {page}.{i}",
+                    "geometry": {"location": {"lat": lat + rng.uniform(-0.03, 0.03), "lng": lng + rng.uniform(-0.03, 0.03)}},
+                    "vicinity": "Somewhere, Malaysia",
+                    "rating": 4.2,
+                    "user_ratings_total": 80,
+                    "photos": [{"photo_reference": f"nearby_photo_{i}"}],
+                } for i in range(20)],
+            }
+            if page < 3:
+                body["next_page_token"] = f"{lat},{lng}:{page + 1}"
+            return 200, 'application/json', body
+        if path.endswith('/photo'):
+            # A tiny "image" whose bytes depend on the reference and width
+            ref = query.get('photo_reference', [''])[0]
+            width = int(query.get('maxwidth', ['400'])[0])
+            return 200, 'image/jpeg', b'\xff\xd8\xff\xe0' + f"{ref}:{width}".encode() * (width // 8)
+        return 404, 'application/json', {"status": "NOT_FOUND"}
+
+    def _tavily(self, body):
+        return 200, 'application/json', {"results": [{
+            "url": f"https://example.com/guide/{i}",
+            "title": f"Guide {i}",
+            "content": f"Result {i} for {body.get('query', '')}: visit the old town, eat nasi kandar and see the caves.",
+            "score": 0.9 - i * 0.1,
+        } for i in range(body.get('max_results', 5))]}
+
+    def _gemini(self, body):
+        return 200, 'application/json', {"text": json.dumps(FAKE_PLAN)}
+
+    def _scrape(self, path):
+        host = path.split('/')[2]
+        page = self._fixtures.get(host)
+        if page is None:
+            return 404, 'text/html', b'<html></html>'
+        return 200, 'text/html; charset=utf-8', page
+
+    def _make_handler(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Allow keep-alive like the real services
+            disable_nagle_algorithm = True
+
+            def _answer(self, method):
+                url = urlparse(self.path)
+                name = upstreams._upstream_for(url.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}') if method == 'POST' else {}
+
+                if name is None:
+                    return self._send(404, 'text/plain', b'not found')
+                with upstreams._lock:
+                    upstreams.calls[name] += 1
+
+                streaming = name == 'gemini' and 'stream=1' in url.query
+                time.sleep(upstreams.latency[name] / (STREAM_CHUNKS if streaming else 1))
+                if random.random() < upstreams.error_rate[name]:
+                    return self._send(500, 'application/json', {"status": "UNKNOWN_ERROR"})
+                if streaming:
+                    return self._stream_plan()
+
+                if name == 'places':
+                    status, content_type, payload = upstreams._places(url.path, parse_qs(url.query))
+                elif name == 'tavily':
+                    status, content_type, payload = upstreams._tavily(body)
+                elif name == 'gemini':
+                    status, content_type, payload = upstreams._gemini(body)
+                else:
+                    status, content_type, payload = upstreams._scrape(url.path)
+                self._send(status, content_type, payload)
+
+            def _send(self, status, content_type, payload):
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream_plan(self):
+                """Sends the fake plan as newline-delimited JSON chunks spread over the Gemini latency."""
+                text = json.dumps(FAKE_PLAN)
+                size = len(text) // STREAM_CHUNKS + 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for i in range(0, len(text), size):
+                    if i:
+                        time.sleep(upstreams.latency['gemini'] / STREAM_CHUNKS)
+                    line = (json.dumps({"text": text[i:i + size]}) + '\n').encode()
+                    self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                self._answer('GET')
+
+            def do_POST(self):
+                self._answer('POST')
+
+            def log_message(self, format, *args):
+                pass # Keep benchmark output clean
+
+        return Handler
+
+
+# --- Client-side shims that point the backend at the fake server ---
+class RewriteAdapter(HTTPAdapter):
+    """Sends https://<host>/<path> to <base_url>/scrape/<host>/<path> instead."""
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        request.url = f"{self.base_url}/scrape/{url.netloc}{url.path}"
+        return super().send(request, **kwargs)
+
+
+class FakeTavilyClient:
+    """Same `search()` shape as tavily.TavilyClient, backed by the fake server."""
+
+    def __init__(self, base_url):
+        self.url = f"{base_url}/tavily/search"
+        self.session = requests.Session()
+
+    def search(self, query, search_depth="basic", max_results=5, **kwargs):
+        response = self.session.post(self.url, json={"query": query, "search_depth": search_depth, "max_results": max_results})
+        response.raise_for_status()
+        return response.json()
+
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Same `generate_content()` shape as genai.GenerativeModel, backed by the fake server."""
+
+    def __init__(self, base_url):
+        self.url = f"{base_url}/gemini/generate"
+        self.session = requests.Session()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream:
+            return self._stream(prompt)
+        response = self.session.post(self.url, json={"prompt": prompt})
+        response.raise_for_status()
+        return FakeGeminiResponse(response.json()['text'])
+
+    def _stream(self, prompt):
+        response = self.session.post(self.url, params={"stream": 1}, json={"prompt": prompt}, stream=True)
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield FakeGeminiResponse(json.loads(line)['text'])
+
+
+def point_backend_at(upstreams, http_client, ai_planner=None):
+    """
+    Redirects an imported backend to `upstreams`. Places is redirected with the
+    PLACES_API_BASE env var, which must be set before `app` is imported.
+    """
+    for host in SCRAPE_FIXTURES:
+        http_client.sessions['scrape'].mount(f"https://{host}", RewriteAdapter(upstreams.base_url))
+    if ai_planner is not None:
+        ai_planner.set_clients(FakeGeminiModel(upstreams.base_url), FakeTavilyClient(upstreams.base_url))
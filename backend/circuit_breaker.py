@@ -0,0 +1,185 @@
+"""
+Circuit breakers for the upstreams we depend on.
+
+Each breaker watches the outcome of recent calls to one upstream (Google
+Places, Tavily, Gemini, or one scraped site). When the failure rate over
+the last BREAKER_WINDOW seconds crosses BREAKER_FAILURE_RATE, the breaker
+opens. Calls are then refused at once (CircuitOpen) and the caller uses its
+fallback, instead of every request waiting for its own timeout. After
+BREAKER_OPEN_SECONDS a single probe call is let through ("half-open"). If it
+succeeds the breaker closes again; if not it stays open for another round.
+
+Breakers are per worker process. Their state is in /api/stats and /metrics.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '10')) # Don't judge on fewer calls than this
+WINDOW = float(os.getenv('BREAKER_WINDOW', '60'))
+OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2} # For the /metrics gauge
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """The breaker refused the call; existing handlers treat it like a failed request."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=None, min_calls=None, window=None, open_seconds=None):
+        self.name = name
+        self.failure_rate = FAILURE_RATE if failure_rate is None else failure_rate
+        self.min_calls = MIN_CALLS if min_calls is None else min_calls
+        self.window = WINDOW if window is None else window
+        self.open_seconds = OPEN_SECONDS if open_seconds is None else open_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque() # (time, ok) within the window
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started = None # When the half-open probe went out
+        self._counters = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_started = None
+        self._counters['opened'] += 1
+        print(f"CircuitBreaker[{self.name}]: open for {self.open_seconds:.0f}s")
+
+    def blocked(self):
+        """
+        True while calls would be refused, for callers that skip the call
+        altogether. Unlike allow(), it doesn't use up the half-open probe.
+        """
+        with self._lock:
+            blocked = self._state == OPEN and time.time() - self._opened_at < self.open_seconds
+            if blocked:
+                self._counters['rejected'] += 1
+            return blocked
+
+    def allow(self):
+        """Whether a call may go out now. Every allowed call must end in success(), failure() or release()."""
+        now = time.time()
+        with self._lock:
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is given up on
+                if self._probe_started is None or now - self._probe_started >= self.open_seconds:
+                    self._probe_started = now
+                    return True
+            elif self._state == CLOSED:
+                return True
+            self._counters['rejected'] += 1
+            return False
+
+    def check(self):
+        """allow(), raising CircuitOpen when the call is refused."""
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+
+    def success(self):
+        now = time.time()
+        with self._lock:
+            self._counters['successes'] += 1
+            if self._state != CLOSED:
+                print(f"CircuitBreaker[{self.name}]: probe succeeded, closing")
+                self._state = CLOSED
+                self._outcomes.clear()
+                self._probe_started = None
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def failure(self):
+        now = time.time()
+        with self._lock:
+            self._counters['failures'] += 1
+            if self._state == HALF_OPEN:
+                self._open(now) # The probe failed: another full round open
+                return
+            if self._state == OPEN:
+                return
+            self._outcomes.append((now, False))
+            self._prune(now)
+            failed = sum(1 for _t, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failed / len(self._outcomes) >= self.failure_rate:
+                self._open(now)
+
+    def release(self):
+        """Ends an allowed call that never reached the upstream, without judging it."""
+        with self._lock:
+            self._probe_started = None
+
+    def guard(self):
+        """`with breaker.guard(): call()` checks first, then records an exception as a failure."""
+        return _Guard(self)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.time() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN # Next call will probe
+            return self._state
+
+    def stats(self):
+        state = self.state
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            counters = dict(self._counters)
+            calls = len(self._outcomes)
+            failed = sum(1 for _t, ok in self._outcomes if not ok)
+            retry_in = max(0.0, self.open_seconds - (now - self._opened_at)) if self._state == OPEN else 0.0
+        counters.update({
+            'state': state,
+            'window_calls': calls,
+            'window_failure_rate': round(failed / calls, 3) if calls else 0.0,
+            'retry_in_seconds': round(retry_in, 1),
+        })
+        return counters
+
+
+class _Guard:
+    def __init__(self, breaker):
+        self.breaker = breaker
+
+    def __enter__(self):
+        self.breaker.check()
+        return self.breaker
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or not issubclass(exc_type, Exception):
+            self.breaker.success() # Includes GeneratorExit: the client left, the upstream was fine
+        else:
+            self.breaker.failure()
+        return False
+
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get(name, **settings):
+    """The shared breaker called `name`, created with `settings` on first use."""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **settings)
+        return breaker
+
+
+def all_stats():
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -0,0 +1,163 @@
+"""
+Small persistent key/value cache backed by SQLite.
+
+Values are stored as JSON, so anything we get back from Google or the
+scraper can go straight in. The file lives on local disk, which means it
+survives restarts and is shared by every worker process on the machine.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DiskCache:
+    def __init__(self, path, table='cache', ttl=3600, max_entries=1000):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._local = threading.local() # One connection per thread
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table}_leases ("
+                "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get_entry(self, key):
+        """
+        Returns (value, stored_at) even if the entry is older than the TTL,
+        or None if the key is missing. Does not touch the hit/miss counters.
+        """
+        try:
+            row = self._connect().execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"DiskCache[{self.table}]: read failed: {e}")
+            self._count('errors')
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get(self, key):
+        """Returns the cached value, or None if it is missing or expired."""
+        entry = self.get_entry(key)
+        if entry is None:
+            self._count('misses')
+            return None
+
+        value, stored_at = entry
+        now = time.time()
+        if now - stored_at >= self.ttl:
+            self._count('expired')
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        try:
+            with self._connect() as conn:
+                conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            pass # Only affects eviction order
+        return value
+
+    def set(self, key, value, stored_at=None):
+        """`stored_at` backdates the entry, for a value that is partly as old as an earlier one."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now if stored_at is None else stored_at, now),
+                )
+                # Size bound: drop the least recently used rows past max_entries
+                evicted = conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._count('writes')
+            if evicted > 0:
+                self._count('evictions', evicted)
+        except sqlite3.Error as e:
+            print(f"DiskCache[{self.table}]: write failed: {e}")
+            self._count('errors')
+
+    def delete(self, key):
+        try:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"DiskCache[{self.table}]: delete failed: {e}")
+            self._count('errors')
+
+    # --- Leases: lets one process (of many) claim a piece of work for a while ---
+    def acquire_lease(self, name, seconds, owner):
+        """
+        Returns True if `owner` now holds the lease `name` for `seconds`.
+        Fails while another owner holds an unexpired lease.
+        """
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                claimed = conn.execute(
+                    f"INSERT INTO {self.table}_leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    f"WHERE {self.table}_leases.expires_at <= ? OR {self.table}_leases.owner = excluded.owner",
+                    (name, owner, now + seconds, now),
+                ).rowcount
+            return claimed > 0
+        except sqlite3.Error as e:
+            print(f"DiskCache[{self.table}]: lease failed: {e}")
+            self._count('errors')
+            return True # If the lock table is broken, doing the work twice is better than never
+
+    def release_lease(self, name, owner):
+        try:
+            with self._connect() as conn:
+                conn.execute(f"DELETE FROM {self.table}_leases WHERE name = ? AND owner = ?", (name, owner))
+        except sqlite3.Error:
+            pass # It will expire on its own
+
+    def __len__(self):
+        try:
+            return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else 0.0
+        counters['entries'] = len(self)
+        counters['max_entries'] = self.max_entries
+        counters['ttl'] = self.ttl
+        return counters
@@ -0,0 +1,73 @@
+"""
+Shared HTTP client for every outbound call the backend makes.
+
+Instead of a bare `requests.get` (new TCP+TLS handshake each time, no
+timeout), callers use one of the pooled sessions below. Each pool keeps
+connections alive per host, applies connect/read timeouts by default and
+retries idempotent requests with jittered exponential backoff.
+
+Google Places and the scraped blogs get separate pools so a slow scrape
+can't use up the connections that interactive searches need.
+"""
+import os
+import random
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Settings (all overridable from .env) ---
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.3'))
+BACKOFF_JITTER = float(os.getenv('HTTP_BACKOFF_JITTER', '0.3'))
+
+# pool_size = connections kept alive per host, hosts = how many hosts we keep pools for
+POOLS = {
+    'places': {'pool_size': int(os.getenv('PLACES_POOL_SIZE', '16')), 'hosts': 2},
+    'scrape': {'pool_size': int(os.getenv('SCRAPE_POOL_SIZE', '4')), 'hosts': 4},
+}
+# --------------------------------------------
+
+
+class JitteredRetry(Retry):
+    """Retry with a random extra delay so many workers don't retry in lockstep."""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff + random.uniform(0, BACKOFF_JITTER)
+
+
+def _make_session(pool_size, hosts):
+    retry = JitteredRetry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']), # Only idempotent calls are retried
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the last response back instead of raising
+    )
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+sessions = {name: _make_session(**config) for name, config in POOLS.items()}
+
+
+def get(url, pool='places', timeout=None, **kwargs):
+    """
+    `requests.get` through the named connection pool.
+    `timeout` defaults to (CONNECT_TIMEOUT, READ_TIMEOUT).
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return sessions[pool].get(url, timeout=timeout, **kwargs)
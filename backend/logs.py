@@ -0,0 +1,56 @@
+"""
+Leveled, structured logging: one JSON object per line on stderr.
+
+Use it for anything that runs on every request. Debug events about upstream
+answers are sampled (`sample=True`), so turning LOG_LEVEL=DEBUG on in
+production gives a representative trickle instead of every Google payload.
+
+    logs.debug('find_place', sample=True, query=query, status=data.get('status'))
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01')) # Share of sampled events that are written
+
+_logger = logging.getLogger('jomjalan')
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    _logger.addHandler(_handler)
+    _logger.propagate = False
+_logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+
+
+def log(level, event, sample=False, **fields):
+    """
+    Writes {"ts", "level", "event", **fields} if `level` is enabled. With
+    sample=True only LOG_SAMPLE_RATE of the calls are written.
+    """
+    if not _logger.isEnabledFor(level):
+        return # Skip building the record entirely
+    if sample and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = {'ts': round(time.time(), 3), 'level': logging.getLevelName(level).lower(), 'event': event}
+    record.update(fields)
+    _logger.log(level, json.dumps(record, default=str))
+
+
+def debug(event, sample=False, **fields):
+    log(logging.DEBUG, event, sample, **fields)
+
+
+def info(event, sample=False, **fields):
+    log(logging.INFO, event, sample, **fields)
+
+
+def warning(event, sample=False, **fields):
+    log(logging.WARNING, event, sample, **fields)
+
+
+def error(event, sample=False, **fields):
+    log(logging.ERROR, event, sample, **fields)
@@ -0,0 +1,81 @@
+"""
+In-process LRU cache with a per-entry TTL.
+
+For results that are cheap to keep in memory and only make sense inside one
+worker process. For data that should survive restarts or be shared between
+workers, use DiskCache instead.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """Returns the cached value, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            expires_at, value = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def peek(self, key):
+        """The unexpired value for `key` or None, without counting a lookup or refreshing its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None and time.time() < entry[0] else None
+
+    def __contains__(self, key):
+        """True if `key` has an unexpired entry. Doesn't count as a lookup or refresh its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() < entry[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['entries'] = len(self._entries)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else 0.0
+        counters['max_entries'] = self.max_entries
+        counters['ttl'] = self.ttl
+        return counters
@@ -0,0 +1,144 @@
+"""
+In-process metrics, exposed in Prometheus text format by /metrics.
+
+- `span(stage)` times one stage of the hot path (scrape fetch, parse, each
+  Places call, the Tavily survey, Gemini...) into a histogram. With
+  `upstream=` set, an exception inside it also counts as an upstream error.
+- `inc` and `upstream_error` are plain counters.
+- Collectors registered with `register_collector` are called at scrape time,
+  which is how cache hit ratios and queue depths get in without touching
+  the code that owns them.
+
+Numbers are per worker process; Prometheus adds them up across workers.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a cache hit (~1ms) up to a slow Gemini plan
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}   # (name, labels) -> value
+_histograms = {} # (name, labels) -> [bucket counts..., sum, count]
+_collectors = []
+_help = {
+    'jomjalan_span_seconds': ('histogram', 'Time spent in one stage of request handling.'),
+    'jomjalan_http_request_seconds': ('histogram', 'Time to produce a response, by endpoint and status.'),
+    'jomjalan_span_errors_total': ('counter', 'Stages that ended with an exception.'),
+    'jomjalan_upstream_errors_total': ('counter', 'Failed or refused calls to Google, Tavily, Gemini and scraped sites.'),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name, kind, help_text):
+    """Registers the TYPE and HELP lines for a metric."""
+    _help[name] = (kind, help_text)
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+
+def upstream_error(upstream, reason):
+    inc('jomjalan_upstream_errors_total', upstream=upstream, reason=reason)
+
+
+@contextmanager
+def span(stage, upstream=None, **labels):
+    """Times the block as `stage`. Exceptions are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        inc('jomjalan_span_errors_total', stage=stage, error=type(e).__name__)
+        if upstream:
+            upstream_error(upstream, type(e).__name__)
+        raise
+    finally:
+        observe('jomjalan_span_seconds', time.perf_counter() - started, stage=stage, **labels)
+
+
+def register_collector(collect):
+    """
+    `collect()` is called on every scrape and returns (name, kind, help, labels, value)
+    tuples for gauges or counters owned elsewhere.
+    """
+    _collectors.append(collect)
+
+
+# --- Prometheus text format ---
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render():
+    lines = []
+    families = {} # name -> list of sample lines, in first-seen order
+
+    with _lock:
+        counters = list(_counters.items())
+        histograms = [(key, list(values)) for key, values in _histograms.items()]
+
+    for (name, labels), value in counters:
+        families.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+    for (name, labels), values in histograms:
+        samples = families.setdefault(name, [])
+        for bound, count in zip(BUCKETS, values):
+            samples.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+        samples.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {values[-1]}")
+        samples.append(f"{name}_sum{_labels(labels)} {_number(values[-2])}")
+        samples.append(f"{name}_count{_labels(labels)} {values[-1]}")
+
+    for collect in _collectors:
+        try:
+            collected = list(collect())
+        except Exception as e:
+            print(f"Metrics: collector {getattr(collect, '__name__', collect)} failed: {e}")
+            continue
+        for name, kind, help_text, labels, value in collected:
+            if value is None:
+                continue
+            _help.setdefault(name, (kind, help_text))
+            families.setdefault(name, []).append(f"{name}{_labels(sorted(labels.items()))} {_number(value)}")
+
+    for name, samples in families.items():
+        kind, help_text = _help.get(name, ('untyped', ''))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+# ------------------------------
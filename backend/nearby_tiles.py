@@ -0,0 +1,256 @@
+"""
+Tile cache for /api/nearby_places.
+
+Instead of calling Nearby Search at the user's exact position, the map is cut
+into geohash tiles (precision 5 is roughly 5 x 5 km around Malaysia). Results
+are cached per (tile, category), so nearby users share them. A request is
+answered by merging the tile it falls in with its 8 neighbours and keeping
+the places within NEARBY_RADIUS_M of the user.
+
+Only the user's own tile is ever waited on. Missing neighbour tiles and the
+extra result pages (next_page_token) are fetched in the background, so the
+next request sees more markers without waiting on Google.
+"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+import places
+from disk_cache import DiskCache
+from rate_limiter import INTERACTIVE, WARMUP
+from singleflight import SingleFlight
+
+TILE_PRECISION = int(os.getenv('NEARBY_TILE_PRECISION', '5'))
+NEARBY_TILE_TTL = int(os.getenv('NEARBY_TILE_TTL', str(6 * 3600)))
+NEARBY_RADIUS_M = 5000 # Same 5km radius the endpoint always used
+NEARBY_MAX_RESULTS = int(os.getenv('NEARBY_MAX_RESULTS', '60'))
+MAX_PAGES = 3 # Google stops at 60 results (3 pages of 20)
+PAGE_TOKEN_DELAY = 2.0 # A next_page_token takes a moment to become valid
+NO_IMAGE = "https://placehold.co/400x400/0f2027/b2dfdb?text=No+Image"
+
+tile_cache = DiskCache(places.PLACE_CACHE_PATH, table='nearby_tiles', ttl=NEARBY_TILE_TTL,
+                       max_entries=int(os.getenv('NEARBY_TILE_MAX_ENTRIES', '2000')))
+_tile_flight = SingleFlight()
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='nearby-prefetch')
+_owner = f"{os.getpid()}:{id(tile_cache)}"
+_lock = threading.Lock()
+_counters = {'neighbour_prefetches': 0, 'pages_prefetched': 0, 'prefetch_errors': 0}
+
+
+# --- Geohash helpers ---
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash(lat, lng, precision=TILE_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+def tile_bounds(tile):
+    """(lat_min, lat_max, lng_min, lng_max) of a geohash tile."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in tile:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+def tiles_around(lat, lng, precision=TILE_PRECISION):
+    """The tile containing (lat, lng) first, then its 8 neighbours."""
+    center = geohash(lat, lng, precision)
+    lat_min, lat_max, lng_min, lng_max = tile_bounds(center)
+    mid_lat, mid_lng = (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+    height, width = lat_max - lat_min, lng_max - lng_min
+    tiles = [center]
+    for d_lat in (-1, 0, 1):
+        for d_lng in (-1, 0, 1):
+            tile = geohash(mid_lat + d_lat * height, mid_lng + d_lng * width, precision)
+            if tile not in tiles:
+                tiles.append(tile)
+    return tiles
+
+def distance_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+# -----------------------
+
+
+def _count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def _to_place(result):
+    """One Nearby Search result in the shape the app expects (plus place_id for de-duplication)."""
+    photo_ref = None
+    if result.get('photos'):
+        photo_ref = result.get('photos')[0].get('photo_reference')
+    location = result.get('geometry', {}).get('location', {})
+    return {
+        "place_id": result.get('place_id'),
+        "name": result.get('name'),
+        "lat": location.get('lat'),
+        "lng": location.get('lng'),
+        "vicinity": result.get('vicinity'), # The address
+        "rating": result.get('rating', 0),  # The star rating
+        "user_ratings_total": result.get('user_ratings_total', 0), # Total reviews
+        "imageUrl": places.photo_url(photo_ref) if photo_ref else NO_IMAGE,
+    }
+
+
+def _search(params, priority):
+    params = dict(params, key=places.GOOGLE_MAPS_API_KEY)
+    data = places.read_status(places.get(places.NEARBY_SEARCH_URL, priority, reports_status=True, params=params))
+    logs.debug('nearby_search', sample=True, status=data.get('status'), results=len(data.get('results', [])))
+    return data
+
+
+def _tile_key(tile, category):
+    return f"{tile}|{category}"
+
+
+def _load_tile(tile, category, priority=INTERACTIVE):
+    """Fetches the first page for a tile, caches it and queues the remaining pages."""
+    lat_min, lat_max, lng_min, lng_max = tile_bounds(tile)
+    lat, lng = (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+    radius = math.ceil(distance_m(lat, lng, lat_max, lng_max)) # Reach the tile's corners
+
+    data = _search({"location": f"{lat},{lng}", "radius": radius, "type": category}, priority)
+    if data.get('status') not in places.CACHEABLE_STATUSES:
+        print(f"Nearby Search failed for tile {tile}: {data.get('status')} {data.get('error_message', '')}")
+        return None # Not cached, so the next request tries again
+
+    entry = {'places': [_to_place(r) for r in data.get('results', [])], 'pages': 1, 'loaded_at': time.time()}
+    tile_cache.set(_tile_key(tile, category), entry)
+    if data.get('next_page_token'):
+        try:
+            _prefetch_executor.submit(_load_more_pages, tile, category, data['next_page_token'])
+        except RuntimeError as e: # Shutting down: the first page is still a good answer
+            print(f"Error queueing more nearby results for {tile}: {e}")
+            _count('prefetch_errors')
+    return entry
+
+
+def _load_more_pages(tile, category, token):
+    """Background: follows next_page_token and appends each page to the cached tile."""
+    key = _tile_key(tile, category)
+    try:
+        for page in range(2, MAX_PAGES + 1):
+            time.sleep(PAGE_TOKEN_DELAY)
+            data = _search({"pagetoken": token}, WARMUP)
+            if data.get('status') == 'INVALID_REQUEST': # Token not active yet: one more try
+                time.sleep(PAGE_TOKEN_DELAY)
+                data = _search({"pagetoken": token}, WARMUP)
+            if data.get('status') != 'OK':
+                return
+
+            cached = tile_cache.get_entry(key)
+            entry = cached[0] if cached else {'places': [], 'pages': 0}
+            entry['places'].extend(_to_place(r) for r in data.get('results', []))
+            entry['pages'] = page
+            tile_cache.set(key, entry)
+            _count('pages_prefetched')
+
+            token = data.get('next_page_token')
+            if not token:
+                return
+    except Exception as e:
+        print(f"Error prefetching more nearby results for {tile}: {e}")
+        _count('prefetch_errors')
+
+
+def _prefetch_tile(tile, category):
+    """Background: loads a neighbour tile unless another thread or worker already is."""
+    key = _tile_key(tile, category)
+    if not tile_cache.acquire_lease(key, 30, _owner):
+        return
+    _count('neighbour_prefetches')
+
+    def run():
+        try:
+            _tile_flight.do(key, _load_tile, tile, category, WARMUP)
+        except Exception as e:
+            print(f"Error prefetching nearby tile {tile}: {e}")
+            _count('prefetch_errors')
+        finally:
+            tile_cache.release_lease(key, _owner)
+    try:
+        _prefetch_executor.submit(run)
+    except RuntimeError as e: # Shutting down; the user's own tile doesn't depend on this one
+        print(f"Error prefetching nearby tile {tile}: {e}")
+        _count('prefetch_errors')
+        tile_cache.release_lease(key, _owner)
+
+
+def get_nearby(lat, lng, category):
+    """
+    (places, version): places of `category` within NEARBY_RADIUS_M of
+    (lat, lng), closest first. `version` changes whenever one of the tiles
+    used changes (None if a tile predates versioning). Raises a requests
+    exception if the user's own tile can't be loaded.
+    """
+    category = category.lower()
+    tiles = tiles_around(lat, lng)
+
+    merged = {}
+    version = []
+    for i, tile in enumerate(tiles):
+        key = _tile_key(tile, category)
+        entry = tile_cache.get(key)
+        if entry is None:
+            if i > 0:
+                _prefetch_tile(tile, category)
+                continue
+            # The user's own tile: everyone waiting on it shares one Google call
+            entry = _tile_flight.do(key, _load_tile, tile, category)
+            if entry is None:
+                continue
+        version.append((tile, entry.get('loaded_at'), entry['pages']))
+        for place in entry['places']:
+            merged.setdefault(place['place_id'] or place['name'], place)
+
+    nearby = []
+    for place in merged.values():
+        if place['lat'] is None or place['lng'] is None:
+            continue
+        distance = distance_m(lat, lng, place['lat'], place['lng'])
+        if distance <= NEARBY_RADIUS_M:
+            nearby.append((distance, place))
+    nearby.sort(key=lambda pair: pair[0])
+    result = [{k: v for k, v in place.items() if k != 'place_id'} for _d, place in nearby[:NEARBY_MAX_RESULTS]]
+    if any(loaded_at is None for _tile, loaded_at, _pages in version):
+        return result, None
+    return result, (category, tuple(version))
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+    counters['tiles'] = tile_cache.stats()
+    counters['single_flight'] = _tile_flight.stats()
+    return counters
@@ -0,0 +1,149 @@
+"""
+On-disk cache for Google Places photos, served by /api/photo/<photo_reference>.
+
+Each (photo_reference, width) is downloaded from Google once, written to
+PHOTO_CACHE_DIR next to a small JSON file with its content type and ETag,
+and served from disk afterwards. The folder is kept under
+PHOTO_CACHE_MAX_BYTES by deleting the least recently served photos.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import places
+from places import GOOGLE_MAPS_API_KEY, PHOTO_URL
+from singleflight import SingleFlight
+
+PHOTO_CACHE_DIR = os.getenv('PHOTO_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'photo_cache'))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv('PHOTO_CACHE_MAX_BYTES', str(200 * 1024 * 1024))) # 200 MB
+
+# Widths we ask Google for; any requested width is rounded up to one of these
+STANDARD_WIDTHS = (200, 400, 800)
+DEFAULT_WIDTH = 400
+
+_downloads = SingleFlight() # Many clients opening the same photo trigger one download
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'downloaded_bytes': 0, 'evictions': 0, 'errors': 0}
+
+
+class PhotoError(Exception):
+    """Google didn't give us an image for this reference."""
+
+
+def standard_width(width):
+    for candidate in STANDARD_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return STANDARD_WIDTHS[-1]
+
+
+def _paths(photo_ref, width):
+    name = hashlib.sha256(f"{photo_ref}:{width}".encode()).hexdigest()[:40]
+    base = os.path.join(PHOTO_CACHE_DIR, name)
+    return base + '.img', base + '.json'
+
+
+def _count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def _download(photo_ref, width, image_path, meta_path):
+    """Streams the photo from Google into the cache without holding it all in memory."""
+    params = {"maxwidth": width, "photo_reference": photo_ref, "key": GOOGLE_MAPS_API_KEY}
+    response = places.get(PHOTO_URL, params=params, stream=True)
+    with response:
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code != 200 or not content_type.startswith('image/'):
+            raise PhotoError(f"Google returned {response.status_code} ({content_type or 'no content type'})")
+
+        os.makedirs(PHOTO_CACHE_DIR, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=PHOTO_CACHE_DIR, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for block in response.iter_content(64 * 1024):
+                    digest.update(block)
+                    size += len(block)
+                    f.write(block)
+            os.replace(tmp_path, image_path) # Atomic: readers never see half a file
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    # The meta file goes last: once it exists, the photo counts as cached
+    meta = {'content_type': content_type, 'etag': digest.hexdigest()[:32], 'size': size}
+    tmp_meta = f"{meta_path}.{os.getpid()}.part"
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+
+    _count('misses')
+    _count('downloaded_bytes', size)
+    _evict()
+    return meta
+
+
+def get_photo(photo_ref, width=DEFAULT_WIDTH):
+    """
+    Returns (path_to_image, meta) for the photo, downloading it on first use.
+    meta has 'content_type', 'etag' and 'size'. Raises PhotoError or a
+    requests exception if Google can't provide it.
+    """
+    width = standard_width(width)
+    image_path, meta_path = _paths(photo_ref, width)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        os.utime(image_path) # Mark as recently used for eviction
+        _count('hits')
+        return image_path, meta
+    except (OSError, ValueError):
+        pass # Not cached yet (or half-written): download it
+
+    try:
+        meta = _downloads.do((photo_ref, width), _download, photo_ref, width, image_path, meta_path)
+    except Exception:
+        _count('errors')
+        raise
+    return image_path, meta
+
+
+def _evict():
+    """Deletes the least recently used photos until the folder fits PHOTO_CACHE_MAX_BYTES."""
+    entries = []
+    total = 0
+    for entry in os.scandir(PHOTO_CACHE_DIR):
+        if entry.name.endswith('.img'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= PHOTO_CACHE_MAX_BYTES:
+        return
+
+    entries.sort() # Oldest first
+    for _mtime, size, path in entries:
+        if total <= PHOTO_CACHE_MAX_BYTES:
+            break
+        for victim in (path, path[:-len('.img')] + '.json'):
+            try:
+                os.unlink(victim)
+            except OSError:
+                pass
+        total -= size
+        _count('evictions')
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+    files = [e for e in os.scandir(PHOTO_CACHE_DIR) if e.name.endswith('.img')] if os.path.isdir(PHOTO_CACHE_DIR) else []
+    counters['entries'] = len(files)
+    counters['bytes'] = sum(e.stat().st_size for e in files)
+    counters['max_bytes'] = PHOTO_CACHE_MAX_BYTES
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else 0.0
+    return counters
@@ -0,0 +1,216 @@
+"""
+Google Places helpers shared by every endpoint that looks up a place by name.
+
+All Find Place traffic goes through `find_place`, which checks the on-disk
+place cache first so the same landmark is only paid for once per TTL.
+Every call that does reach Google goes through `get`, which waits for the
+shared rate limiter (see rate_limiter.py) and slows down on quota errors.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from dotenv import load_dotenv
+
+import requests
+
+import circuit_breaker
+import http_client
+import metrics
+from circuit_breaker import CircuitOpen
+from disk_cache import DiskCache
+from rate_limiter import INTERACTIVE, QuotaExceeded, RateLimiter
+
+load_dotenv(dotenv_path='../.env')
+
+GOOGLE_MAPS_API_KEY = os.getenv('SERVER_MAPS_KEY')
+
+# Base URL for the Places web service (override to point at a local fake server)
+PLACES_API_BASE = os.getenv('PLACES_API_BASE', 'https://maps.googleapis.com/maps/api/place')
+FIND_PLACE_URL = f"{PLACES_API_BASE}/findplacefromtext/json"
+NEARBY_SEARCH_URL = f"{PLACES_API_BASE}/nearbysearch/json"
+PHOTO_URL = f"{PLACES_API_BASE}/photo"
+_ENDPOINTS = {FIND_PLACE_URL: 'find_place', NEARBY_SEARCH_URL: 'nearby_search', PHOTO_URL: 'photo'} # Metric labels
+
+# --- Place lookup cache ---
+PLACE_CACHE_PATH = os.getenv('PLACE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'place_cache.sqlite3'))
+PLACE_CACHE_TTL = int(os.getenv('PLACE_CACHE_TTL', str(7 * 24 * 3600))) # 7 days
+PLACE_CACHE_MAX_ENTRIES = int(os.getenv('PLACE_CACHE_MAX_ENTRIES', '5000'))
+
+# Only answers that are safe to replay; errors like OVER_QUERY_LIMIT are never cached
+CACHEABLE_STATUSES = ('OK', 'ZERO_RESULTS')
+
+place_cache = DiskCache(PLACE_CACHE_PATH, table='find_place', ttl=PLACE_CACHE_TTL, max_entries=PLACE_CACHE_MAX_ENTRIES)
+# --------------------------
+
+# --- Outbound rate limit, shared by every worker via the place cache file ---
+# PLACES_QPS=0 turns it off. The last PLACES_RESERVE tokens are kept for interactive calls.
+PLACES_QPS = float(os.getenv('PLACES_QPS', '20'))
+PLACES_BURST = int(os.getenv('PLACES_BURST', '40'))
+PLACES_RESERVE = int(os.getenv('PLACES_RESERVE', '10'))
+
+limiter = RateLimiter(PLACE_CACHE_PATH, 'places', rate=PLACES_QPS, burst=PLACES_BURST, reserve=PLACES_RESERVE)
+
+# Answers that mean Google itself is failing (OVER_QUERY_LIMIT is the limiter's job)
+BREAKER_FAILURE_STATUSES = ('UNKNOWN_ERROR', 'REQUEST_DENIED')
+breaker = circuit_breaker.get('places')
+# --------------------------
+
+# --- Batch resolution (AI itinerary activities) ---
+RESOLVE_FIELDS = "place_id,name,formatted_address,photos" # Same as /api/find_place, so they share cache entries
+RESOLVE_MAX_WORKERS = int(os.getenv('RESOLVE_MAX_WORKERS', '8'))
+RESOLVE_TIMEOUT = float(os.getenv('RESOLVE_TIMEOUT', '5'))
+NO_IMAGE = "https://placehold.co/400x400/0f2027/b2dfdb?text=No+Image"
+# --------------------------
+
+
+def normalize_query(query):
+    """'  Batu  Caves ' and 'batu caves' should share one cache entry."""
+    return re.sub(r'\s+', ' ', query).strip().casefold()
+
+
+def photo_url(photo_ref, width=400):
+    """
+    Our own proxy URL for a Places photo (see /api/photo). It is relative to
+    this server and never contains the API key.
+    """
+    return f"/api/photo/{quote(photo_ref, safe='')}?maxwidth={width}"
+
+
+def get(url, priority=INTERACTIVE, reports_status=False, **kwargs):
+    """
+    http_client.get on the places pool, once the circuit breaker and the rate
+    limiter let a call of `priority` through. Raises CircuitOpen while Google
+    is failing, or rate_limiter.QuotaExceeded if the wait is too long; both
+    are requests exceptions. With reports_status=True the caller passes the
+    JSON answer to `read_status` instead of the HTTP status counting as success.
+    """
+    endpoint = _ENDPOINTS.get(url, 'other')
+    if not breaker.allow():
+        metrics.upstream_error('places', 'circuit_open')
+        raise CircuitOpen("Google Places is unavailable (circuit open)")
+    try:
+        limiter.acquire(priority)
+    except QuotaExceeded:
+        metrics.upstream_error('places', 'rate_limited')
+        breaker.release() # Our own limit, not Google failing
+        raise
+    try:
+        with metrics.span('places_call', upstream='places', endpoint=endpoint):
+            response = http_client.get(url, pool='places', **kwargs)
+    except requests.exceptions.RequestException:
+        breaker.failure()
+        raise
+    if response.status_code >= 500:
+        breaker.failure()
+        if reports_status:
+            response.raise_for_status() # Already counted; record_status mustn't see it too
+    elif not reports_status:
+        breaker.success()
+    return response
+
+
+def record_status(data):
+    """
+    Feeds a Places JSON answer back: quota errors slow everyone down (rate
+    limiter), and server-side errors count against the circuit breaker.
+    """
+    status = data.get('status')
+    if status not in CACHEABLE_STATUSES:
+        metrics.upstream_error('places', str(status).lower())
+    if status in BREAKER_FAILURE_STATUSES:
+        breaker.failure()
+    else:
+        breaker.success()
+    if status == 'OVER_QUERY_LIMIT':
+        limiter.backoff()
+    else:
+        limiter.success()
+
+
+def read_status(response):
+    """
+    The JSON answer of a reports_status=True call, passed to `record_status`.
+    A body that can't be read counts as a failure too, so a half-open probe
+    always reports back before the error is raised.
+    """
+    try:
+        data = response.json()
+        record_status(data)
+    except Exception:
+        breaker.failure()
+        raise
+    return data
+
+
+def _cache_key(query, fields):
+    field_set = ','.join(sorted(f.strip() for f in fields.split(',') if f.strip()))
+    return f"{normalize_query(query)}|{field_set}"
+
+
+def find_place(query, fields, timeout=None, priority=INTERACTIVE):
+    """
+    Calls the Find Place API for `query` and returns Google's JSON response
+    (with 'status' and 'candidates'). Answers are served from the place
+    cache when possible. Network errors are raised to the caller.
+    `priority` is the rate limiter class the call waits in.
+    """
+    key = _cache_key(query, fields)
+    cached = place_cache.get(key)
+    if cached is not None:
+        return cached
+
+    params = {
+        "input": query,
+        "inputtype": "textquery",
+        "fields": fields,
+        "key": GOOGLE_MAPS_API_KEY
+    }
+    response = get(FIND_PLACE_URL, priority, reports_status=True, params=params, timeout=timeout)
+    data = read_status(response)
+
+    if data.get('status') in CACHEABLE_STATUSES:
+        place_cache.set(key, data)
+    return data
+
+
+def resolve_place(query):
+    """
+    Image and address for one place name, shaped like the /api/find_place
+    response. Never raises: failures come back with a non-OK status.
+    """
+    try:
+        data = find_place(query, RESOLVE_FIELDS, timeout=RESOLVE_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        print(f"Error resolving place {query!r}: {e}")
+        return {"status": "UNKNOWN_ERROR", "error_message": str(e)}
+
+    if data.get('status') == 'OK' and data.get('candidates'):
+        candidate = data['candidates'][0]
+        image_url = NO_IMAGE
+        if candidate.get('photos'):
+            image_url = photo_url(candidate['photos'][0]['photo_reference'])
+        return {
+            "status": "OK",
+            "imageUrl": image_url,
+            "location": candidate.get('formatted_address', 'No address found'),
+        }
+    return {"status": data.get('status'), "error_message": data.get('error_message')}
+
+
+def resolve_places(names, max_workers=None):
+    """
+    Resolves many place names at once. Names that only differ in case or
+    spacing are looked up once, and the lookups run in parallel.
+    Returns {name: result} for every name given, see `resolve_place`.
+    """
+    unique = {}
+    for name in names:
+        unique.setdefault(normalize_query(name), name)
+    if not unique:
+        return {}
+
+    workers = max(1, min(max_workers or RESOLVE_MAX_WORKERS, len(unique)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='places-resolve') as executor:
+        resolved = dict(zip(unique, executor.map(resolve_place, unique.values())))
+    return {name: resolved[normalize_query(name)] for name in names}
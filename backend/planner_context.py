@@ -0,0 +1,114 @@
+"""
+The research context we paste into the Gemini planner prompt.
+
+Tavily answers vary a lot in size and overlap (several sites quoting the
+same listicle). Before they reach the prompt, results are:
+  1. deduplicated: near-identical results are dropped, and so is any
+     sentence already included from another result;
+  2. ranked by Tavily's relevance score;
+  3. trimmed at sentence boundaries, to at most PLANNER_SNIPPET_TOKENS per
+     result and PLANNER_CONTEXT_TOKENS overall.
+
+Token counts here are estimates (about 4 characters per token for this
+kind of text). They don't need a round trip to the API, and they are close
+enough for budgeting.
+"""
+import math
+import os
+import re
+
+PLANNER_CONTEXT_TOKENS = int(os.getenv('PLANNER_CONTEXT_TOKENS', '1500'))
+PLANNER_SNIPPET_TOKENS = int(os.getenv('PLANNER_SNIPPET_TOKENS', '300')) # So one long page can't crowd out the rest
+NEAR_DUPLICATE = 0.7 # Share of shared word triples above which two results count as the same text
+CHARS_PER_TOKEN = 4
+NO_CONTEXT = "No search results found."
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\w+')
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def _shingles(text):
+    words = _WORD.findall(text.casefold())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def _sentence_key(sentence):
+    return ' '.join(_WORD.findall(sentence.casefold()))
+
+
+def _line(sentences, url):
+    return f"- {' '.join(sentences)} (Source: {url})"
+
+
+def _cut_words(sentence, url, allowed):
+    """As many leading words of `sentence` as fit in `allowed` tokens, with an ellipsis; [] if none do."""
+    words = sentence.split()
+    room = allowed * CHARS_PER_TOKEN - len(_line(['...'], url)) # Characters left for the words
+    kept = []
+    for word in words:
+        room -= len(word) + 1
+        if room < 0:
+            break
+        kept.append(word)
+    return [' '.join(kept) + '...'] if kept else []
+
+
+def build_context(search_results, budget=None, snippet_budget=None):
+    """
+    Returns (context string, info). `info` has how many results came in,
+    how many were near duplicates, how many made it in, how many had to be
+    cut, and the estimated token count of the context.
+    """
+    budget = PLANNER_CONTEXT_TOKENS if budget is None else budget
+    snippet_budget = PLANNER_SNIPPET_TOKENS if snippet_budget is None else snippet_budget
+    results = [r for r in (search_results or {}).get('results', []) if (r.get('content') or '').strip()]
+    info = {'results': len(results), 'duplicates': 0, 'snippets': 0, 'trimmed': 0, 'context_tokens': 0}
+
+    # Highest score first; Tavily's own order breaks ties
+    ranked = sorted(enumerate(results), key=lambda item: (-(item[1].get('score') or 0), item[0]))
+
+    lines = []
+    seen_shingles = []
+    seen_sentences = set()
+    used = 0
+    for _position, result in ranked:
+        content = ' '.join(result['content'].split())
+        shingles = _shingles(content)
+        if any(len(shingles & other) / len(shingles | other) >= NEAR_DUPLICATE for other in seen_shingles):
+            info['duplicates'] += 1
+            continue
+        seen_shingles.append(shingles)
+
+        url = result.get('url', '')
+        allowed = min(snippet_budget, budget - used)
+        kept = []
+        cut = False
+        for sentence in _SENTENCE_END.split(content):
+            key = _sentence_key(sentence)
+            if not key or key in seen_sentences:
+                continue
+            if estimate_tokens(_line(kept + [sentence], url)) > allowed:
+                cut = True
+                if not kept:
+                    kept = _cut_words(sentence, url, allowed) # One huge run-on "sentence"
+                break
+            kept.append(sentence)
+            seen_sentences.add(key)
+        if not kept:
+            if cut:
+                break # Out of budget altogether
+            continue # Nothing new in this one
+
+        line = _line(kept, url)
+        lines.append(line)
+        used += estimate_tokens(line) + 1 # +1 for the newline
+        info['snippets'] += 1
+        info['trimmed'] += cut
+
+    context = '\n'.join(lines) if lines else NO_CONTEXT
+    info['context_tokens'] = estimate_tokens(context)
+    return context, info
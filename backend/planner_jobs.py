@@ -0,0 +1,215 @@
+"""
+Background jobs for the AI planner.
+
+A Tavily + Gemini run takes 10-30s. Instead of holding a Flask worker for
+all of it, POST /api/ai_planner/jobs queues the work here and returns a job
+id at once; the client polls GET /api/ai_planner/jobs/<id>. A poll waits
+at most MAX_WAIT seconds, so it never ties up a request worker for long.
+
+Jobs run on a small thread pool in the process that accepted them. Their
+state lives in SQLite, so any worker process on the machine can answer a
+poll and the queue limit holds across all of them. Each process also takes
+no more jobs than it has pool slots (PLANNER_JOB_LOCAL_MAX, running plus
+waiting), counted until the job's function actually returns. A hung job
+therefore keeps its slot, and new jobs can't pile up behind it unseen.
+
+Jobs not finished within PLANNER_JOB_TIMEOUT of being queued are reported as
+failed. Their function is called with that deadline, so it can bound its
+own upstream calls and free the worker. Finished jobs are deleted
+PLANNER_JOB_TTL seconds after they finish.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PLANNER_JOBS_PATH = os.getenv('PLANNER_JOBS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'planner_jobs.sqlite3'))
+PLANNER_JOB_WORKERS = int(os.getenv('PLANNER_JOB_WORKERS', '4'))
+PLANNER_JOB_QUEUE_MAX = int(os.getenv('PLANNER_JOB_QUEUE_MAX', '32')) # Queued + running, machine-wide
+PLANNER_JOB_TIMEOUT = int(os.getenv('PLANNER_JOB_TIMEOUT', '90'))
+PLANNER_JOB_TTL = int(os.getenv('PLANNER_JOB_TTL', '600'))
+PLANNER_JOB_LOCAL_MAX = int(os.getenv('PLANNER_JOB_LOCAL_MAX', str(PLANNER_JOB_WORKERS * 2))) # Per process
+MAX_WAIT = 2 # Longest a poll blocks; clients poll again (with backoff) rather than wait longer
+POLL_INTERVAL = 0.25 # How often a waiting poll re-reads a job owned by another process
+
+_executor = ThreadPoolExecutor(max_workers=PLANNER_JOB_WORKERS, thread_name_prefix='planner-job')
+_slots = threading.BoundedSemaphore(PLANNER_JOB_LOCAL_MAX) # Held from submit until fn returns
+_local = threading.local()
+_lock = threading.Lock()
+_finished = {} # job id -> Event, for jobs running in this process
+_counters = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'timed_out': 0}
+
+
+class QueueFull(Exception):
+    """Too many planner jobs are queued or running already."""
+
+
+def _connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(PLANNER_JOBS_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+
+def _init():
+    os.makedirs(os.path.dirname(os.path.abspath(PLANNER_JOBS_PATH)), exist_ok=True)
+    _connect().execute(
+        "CREATE TABLE IF NOT EXISTS planner_jobs ("
+        "id TEXT PRIMARY KEY, status TEXT NOT NULL, prompt TEXT, result TEXT, error TEXT, "
+        "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+    )
+    _connect().execute("CREATE INDEX IF NOT EXISTS planner_jobs_status ON planner_jobs (status)")
+
+_init()
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def _expire(conn, now):
+    """Fails jobs past their timeout and deletes finished ones past their TTL."""
+    conn.execute(
+        "UPDATE planner_jobs SET status = 'failed', error = 'timeout', finished_at = ? "
+        "WHERE status IN ('queued', 'running') AND created_at < ?",
+        (now, now - PLANNER_JOB_TIMEOUT),
+    )
+    conn.execute(
+        "DELETE FROM planner_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+        (now - PLANNER_JOB_TTL,),
+    )
+
+
+def submit(fn, *args, prompt=None):
+    """
+    Queues fn(*args, deadline=...) and returns the new job id. `deadline`
+    is the time.time() by which the job counts as timed out. fn's return
+    value must be JSON-serialisable. Raises QueueFull when
+    PLANNER_JOB_QUEUE_MAX jobs are already queued or running, or this
+    process's pool has no free slot.
+    """
+    if not _slots.acquire(blocking=False):
+        _count('rejected')
+        raise QueueFull(f"all {PLANNER_JOB_LOCAL_MAX} planner job slots in this process are taken")
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    try:
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE") # Count and insert atomically across processes
+        try:
+            _expire(conn, now)
+            active = conn.execute("SELECT COUNT(*) FROM planner_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if active >= PLANNER_JOB_QUEUE_MAX:
+                conn.execute("COMMIT")
+                _count('rejected')
+                raise QueueFull(f"{active} planner jobs already queued or running")
+            conn.execute(
+                "INSERT INTO planner_jobs (id, status, prompt, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, prompt, now),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        with _lock:
+            _counters['submitted'] += 1
+            _finished[job_id] = threading.Event()
+        _executor.submit(_run, job_id, fn, args, now + PLANNER_JOB_TIMEOUT)
+    except BaseException:
+        with _lock:
+            _finished.pop(job_id, None)
+        _slots.release() # The job never reached the pool
+        raise
+    return job_id
+
+
+def _run(job_id, fn, args, deadline):
+    conn = _connect()
+    try:
+        started = conn.execute(
+            "UPDATE planner_jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        ).rowcount
+        if not started:
+            return # Timed out while waiting in the queue
+        try:
+            result, error = json.dumps(fn(*args, deadline=deadline)), None
+        except Exception as e:
+            print(f"Planner job {job_id} failed: {e}")
+            result, error = None, str(e)
+        # A job that already timed out stays failed
+        updated = conn.execute(
+            "UPDATE planner_jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+            ('done' if error is None else 'failed', result, error, time.time(), job_id),
+        ).rowcount
+        _count(('succeeded' if error is None else 'failed') if updated else 'timed_out')
+    except sqlite3.Error as e:
+        print(f"Planner job {job_id}: could not record the result: {e}")
+    finally:
+        _slots.release()
+        with _lock:
+            event = _finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+
+def _read(job_id):
+    row = _connect().execute(
+        "SELECT status, result, error, created_at, started_at, finished_at FROM planner_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    status, result, error, created_at, started_at, finished_at = row
+    now = time.time()
+    if status in ('queued', 'running') and now - created_at > PLANNER_JOB_TIMEOUT:
+        status, error = 'failed', 'timeout' # Recorded for real by the next _expire
+    elif status in ('done', 'failed') and finished_at and now - finished_at > PLANNER_JOB_TTL:
+        return None
+    job = {'job_id': job_id, 'status': status, 'queued_seconds': round((started_at or now) - created_at, 2)}
+    if result is not None:
+        job['result'] = json.loads(result)
+    if error is not None:
+        job['error'] = error
+    return job
+
+
+def get(job_id, wait=0):
+    """
+    The job as {'job_id', 'status', 'result'?, 'error'?}, or None if it is
+    unknown or expired. With `wait` > 0, blocks up to that many seconds
+    (capped at MAX_WAIT) for the job to finish.
+    """
+    deadline = time.monotonic() + max(0, min(wait, MAX_WAIT))
+    while True:
+        job = _read(job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job['status'] in ('done', 'failed') or remaining <= 0:
+            return job
+        with _lock:
+            event = _finished.get(job_id)
+        if event is not None:
+            event.wait(remaining) # Ours: woken the moment it finishes
+        else:
+            time.sleep(min(POLL_INTERVAL, remaining)) # Another process's job
+
+
+def stats():
+    with _lock:
+        counters = dict(_counters)
+        counters['running_here'] = len(_finished)
+    try:
+        rows = _connect().execute("SELECT status, COUNT(*) FROM planner_jobs GROUP BY status").fetchall()
+        counters['jobs'] = dict(rows)
+    except sqlite3.Error:
+        counters['jobs'] = {}
+    counters['queue_max'] = PLANNER_JOB_QUEUE_MAX
+    counters['workers'] = PLANNER_JOB_WORKERS
+    counters['local_max'] = PLANNER_JOB_LOCAL_MAX
+    return counters
@@ -0,0 +1,241 @@
+"""
+Outbound rate limiter with priority classes, for Google Places traffic.
+
+A token bucket refills at `rate` calls per second up to `burst`. Its state
+lives in SQLite, so every thread and worker process on the machine draws
+from the same quota. Inside one process, waiting callers are served in
+priority order: an interactive search never queues behind a batch of
+enrichment lookups. Across processes, the lower classes may not take the
+last `reserve` tokens, which keeps some headroom for interactive calls.
+
+When Google answers OVER_QUERY_LIMIT, `backoff()` halves the rate and
+pauses everyone briefly. Each success after that wins some of it back.
+"""
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+# Priority classes, most urgent first
+INTERACTIVE = 'interactive' # A user is waiting on this exact call (search bar, map)
+ENRICHMENT = 'enrichment'   # Filling in ratings/photos for a list
+WARMUP = 'warmup'           # Prefetching and snapshot building nobody is waiting on
+PRIORITIES = {INTERACTIVE: 0, ENRICHMENT: 1, WARMUP: 2}
+
+MIN_RATE_FACTOR = 0.1 # Backoff never slows us below 10% of the configured rate
+MAX_PAUSE = 30.0      # Longest pause after repeated quota errors (seconds)
+RECOVERY_STEP = 0.05  # Rate factor regained per successful call
+
+
+class QuotaExceeded(requests.exceptions.RequestException):
+    """No token became available within the caller's wait budget."""
+
+
+class RateLimiter:
+    def __init__(self, path, name, rate, burst, reserve=0, max_wait=None):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve # Tokens only INTERACTIVE callers may take
+        self.max_wait = max_wait or {INTERACTIVE: 5.0, ENRICHMENT: 10.0, WARMUP: 60.0}
+
+        self._local = threading.local() # One connection per thread
+        self._cond = threading.Condition()
+        self._queue = [] # heap of (priority, seq) for callers waiting in this process
+        self._seq = itertools.count()
+        self._degraded = False # Last seen bucket state had a reduced rate or strikes
+        self._counters = {
+            priority: {'acquired': 0, 'timeouts': 0, 'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+            for priority in PRIORITIES
+        }
+        self._counters_extra = {'quota_errors': 0, 'max_queue_depth': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, "
+            "rate_factor REAL NOT NULL, paused_until REAL NOT NULL, strikes INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO rate_limits VALUES (?, ?, ?, 1.0, 0, 0)", (name, burst, time.time())
+        )
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode: every bucket update is its own BEGIN IMMEDIATE transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Shared bucket ---
+    def _update(self, change):
+        """
+        Runs change(now, tokens, rate_factor, paused_until, strikes) -> (new_row, result)
+        on the refilled bucket inside one transaction and returns `result`.
+        Returns None if the database is unusable, which callers treat as "go ahead".
+        """
+        try:
+            return self._transaction(change)
+        except sqlite3.Error as e:
+            print(f"RateLimiter[{self.name}]: bucket update failed: {e}")
+            return None # Better to risk Google's limit than to stop all lookups
+
+    def _transaction(self, change):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated_at, factor, paused_until, strikes = conn.execute(
+                "SELECT tokens, updated_at, rate_factor, paused_until, strikes FROM rate_limits WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = time.time()
+            tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate * factor)
+            (tokens, factor, paused_until, strikes), result = change(now, tokens, factor, paused_until, strikes)
+            conn.execute(
+                "UPDATE rate_limits SET tokens = ?, updated_at = ?, rate_factor = ?, paused_until = ?, strikes = ? "
+                "WHERE name = ?",
+                (tokens, now, factor, paused_until, strikes, self.name),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._degraded = factor < 1.0 or strikes > 0
+        return result
+
+    def _take(self, priority):
+        """Takes one token if allowed. Returns 0, or the seconds until one should be available."""
+        floor = 0 if priority == INTERACTIVE else self.reserve
+
+        def change(now, tokens, factor, paused_until, strikes):
+            row = (tokens, factor, paused_until, strikes)
+            if now < paused_until:
+                return row, paused_until - now
+            if tokens - 1 >= floor:
+                return (tokens - 1, factor, paused_until, strikes), 0
+            return row, (floor + 1 - tokens) / (self.rate * factor)
+        return self._update(change)
+
+    def backoff(self):
+        """Google said OVER_QUERY_LIMIT: halve the rate and pause everyone for a moment."""
+        with self._cond:
+            self._counters_extra['quota_errors'] += 1
+        if not self.enabled:
+            return
+
+        def change(now, tokens, factor, paused_until, strikes):
+            if now < paused_until:
+                # Calls already in flight when we paused: don't count the same overload twice
+                return (tokens, factor, paused_until, strikes), None
+            strikes += 1
+            pause = min(MAX_PAUSE, 2.0 ** strikes)
+            print(f"RateLimiter[{self.name}]: quota error, slowing to {max(MIN_RATE_FACTOR, factor / 2):.0%} "
+                  f"and pausing {pause:.0f}s")
+            return (0.0, max(MIN_RATE_FACTOR, factor / 2), max(paused_until, now + pause), strikes), None
+        self._update(change)
+
+    def success(self):
+        """A call went through: win back some of the rate lost to earlier backoffs."""
+        if not self.enabled or not self._degraded:
+            return # Nothing to recover, skip the write
+
+        def change(now, tokens, factor, paused_until, strikes):
+            return (tokens, min(1.0, factor + RECOVERY_STEP), paused_until, 0), None
+        self._update(change)
+    # -----------------
+
+    def acquire(self, priority=INTERACTIVE, max_wait=None):
+        """
+        Blocks until a call of `priority` may go out, and returns the seconds waited.
+        Raises QuotaExceeded if that takes longer than the class's max wait.
+        """
+        if not self.enabled:
+            return 0.0
+        if max_wait is None:
+            max_wait = self.max_wait[priority]
+        started = time.monotonic()
+        deadline = started + max_wait
+        ticket = (PRIORITIES[priority], next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            self._counters_extra['max_queue_depth'] = max(self._counters_extra['max_queue_depth'], len(self._queue))
+            if self._queue[0] == ticket:
+                self._cond.notify_all() # The waiter we overtook may be sleeping until its token
+        try:
+            while True:
+                with self._cond:
+                    # Only the most urgent waiter in this process draws from the bucket
+                    while self._queue[0] != ticket:
+                        if not self._cond.wait(deadline - time.monotonic()):
+                            if time.monotonic() >= deadline:
+                                raise self._timed_out(priority, started)
+                wait = self._take(priority)
+                if not wait:
+                    return self._acquired(priority, started)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining + 1:
+                    raise self._timed_out(priority, started)
+                with self._cond:
+                    # Woken early if a more urgent caller arrives (see the push above)
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def _acquired(self, priority, started):
+        waited = time.monotonic() - started
+        with self._cond:
+            counters = self._counters[priority]
+            counters['acquired'] += 1
+            if waited >= 0.001:
+                counters['waited'] += 1
+                counters['wait_seconds'] += waited
+                counters['max_wait_seconds'] = max(counters['max_wait_seconds'], waited)
+        return waited
+
+    def _timed_out(self, priority, started):
+        with self._cond:
+            self._counters[priority]['timeouts'] += 1
+        return QuotaExceeded(f"{self.name}: no {priority} quota within {time.monotonic() - started:.1f}s")
+
+    def stats(self):
+        with self._cond:
+            by_priority = {priority: dict(counters) for priority, counters in self._counters.items()}
+            depth = {priority: 0 for priority in PRIORITIES}
+            for rank, _seq in self._queue:
+                depth[next(p for p, r in PRIORITIES.items() if r == rank)] += 1
+            extra = dict(self._counters_extra)
+        for priority, counters in by_priority.items():
+            counters['queue_depth'] = depth[priority]
+            counters['avg_wait_seconds'] = round(counters['wait_seconds'] / counters['acquired'], 4) if counters['acquired'] else 0.0
+            counters['wait_seconds'] = round(counters['wait_seconds'], 3)
+            counters['max_wait_seconds'] = round(counters['max_wait_seconds'], 3)
+
+        bucket = {}
+        if self.enabled:
+            try:
+                tokens, factor, paused_until = self._connect().execute(
+                    "SELECT tokens, rate_factor, paused_until FROM rate_limits WHERE name = ?", (self.name,)
+                ).fetchone()
+                bucket = {'tokens': round(tokens, 2), 'rate_factor': round(factor, 2),
+                          'paused_for': round(max(0.0, paused_until - time.time()), 1)}
+            except sqlite3.Error:
+                pass
+        return {'enabled': self.enabled, 'rate': self.rate, 'burst': self.burst, 'reserve': self.reserve,
+                'queue_depth': sum(depth.values()), **extra, **bucket, 'priorities': by_priority}
@@ -1,31 +1,129 @@
 import requests
-from bs4 import BeautifulSoup
+import http_client
+from bs4 import BeautifulSoup, Tag
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
 import time
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import urlparse # Used to check the domain
 
-# --- NEW: URL mapping for different states ---
+import circuit_breaker
+import logs
+import metrics
+from disk_cache import DiskCache
+
+# --- Article sources per state ---
+# Every state can list several articles. They are fetched concurrently and
+# merged, first source first, dropping spots whose names match one already in.
 STATE_URLS = {
-    'Kuala Lumpur': "https://klfoodie.com/date-spots-kl-wallet-friendly-free/",
-    'Selangor': "https://ecentral.my/tempat-menarik-di-kl/",
-    'Perak': "https://ecentral.my/tempat-menarik-di-ipoh/",
-    'Penang': "https://ecentral.my/tempat-menarik-di-penang/",
-    'Johor': "https://ecentral.my/tempat-menarik-di-johor-bahru/",
-    'Sabah': "https://ecentral.my/tempat-menarik-di-kudat/",
-    'Sarawak': "https://ecentral.my/aktiviti-menarik-di-kuching/",
-    'Melaka': "https://ecentral.my/tempat-menarik-di-melaka/",
-    'Negeri Sembilan': "https://ecentral.my/tempat-menarik-di-negeri-sembilan/",
-    'Kedah': "https://ecentral.my/aktiviti-menarik-di-kedah/",
-    'Pahang': "https://ecentral.my/tempat-menarik-di-pahang/",
-    'Terengganu': "https://ecentral.my/tempat-menarik-terengganu/",
-    'Kelantan': "https://ecentral.my/tempat-menarik-di-kota-bharu/",
-    'Perlis': "https://ecentral.my/tempat-menarik-di-perlis/",
+    'Kuala Lumpur': ["https://klfoodie.com/date-spots-kl-wallet-friendly-free/"],
+    'Selangor': ["https://ecentral.my/tempat-menarik-di-kl/"],
+    'Perak': ["https://ecentral.my/tempat-menarik-di-ipoh/"],
+    'Penang': ["https://ecentral.my/tempat-menarik-di-penang/"],
+    'Johor': ["https://ecentral.my/tempat-menarik-di-johor-bahru/"],
+    'Sabah': ["https://ecentral.my/tempat-menarik-di-kudat/"],
+    'Sarawak': ["https://ecentral.my/aktiviti-menarik-di-kuching/"],
+    'Melaka': ["https://ecentral.my/tempat-menarik-di-melaka/"],
+    'Negeri Sembilan': ["https://ecentral.my/tempat-menarik-di-negeri-sembilan/"],
+    'Kedah': ["https://ecentral.my/aktiviti-menarik-di-kedah/"],
+    'Pahang': ["https://ecentral.my/tempat-menarik-di-pahang/"],
+    'Terengganu': ["https://ecentral.my/tempat-menarik-terengganu/"],
+    'Kelantan': ["https://ecentral.my/tempat-menarik-di-kota-bharu/"],
+    'Perlis': ["https://ecentral.my/tempat-menarik-di-perlis/"],
 }
 
-cache_data = {}
-CACHE_DURATION = 3600  # 1 hour (in seconds)
+def _extra_sources():
+    """SCRAPE_EXTRA_SOURCES='{"Perak": ["https://..."]}' adds articles without a code change."""
+    try:
+        extra = json.loads(os.getenv('SCRAPE_EXTRA_SOURCES') or '{}')
+    except ValueError as e:
+        print(f"Scraper: ignoring SCRAPE_EXTRA_SOURCES ({e})")
+        return {}
+    return extra if isinstance(extra, dict) else {}
+
+for _state, _urls in _extra_sources().items():
+    if _state not in STATE_URLS:
+        print(f"Scraper: SCRAPE_EXTRA_SOURCES names unknown state {_state!r}, skipping.")
+        continue
+    STATE_URLS[_state] += [url for url in _urls if url not in STATE_URLS[_state]]
+
+# --- Stale-while-revalidate cache (shared by all worker processes via SQLite) ---
+CACHE_DURATION = int(os.getenv('SCRAPE_CACHE_DURATION', '3600'))  # Fresh for 1 hour (in seconds)
+STALE_DURATION = int(os.getenv('SCRAPE_STALE_DURATION', str(24 * 3600)))  # Served stale for up to a day
+REFRESH_LEASE_SECONDS = 60  # How long one process may own a state's refresh
+# Sites are fetched rarely, so their breakers judge on fewer calls over a longer window
+SCRAPE_BREAKER_MIN_CALLS = 3
+SCRAPE_BREAKER_WINDOW = 600
+SCRAPE_CACHE_PATH = os.getenv('SCRAPE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scrape_cache.sqlite3'))
+
+scrape_cache = DiskCache(SCRAPE_CACHE_PATH, table='scraped_spots', ttl=CACHE_DURATION, max_entries=len(STATE_URLS) * 4)
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='scrape-refresh')
+_refresh_owner = f"{socket.gethostname()}:{os.getpid()}"
+
+_inflight = {}  # state -> Future of the refresh currently running in this process
+_inflight_lock = threading.Lock()
+refresh_stats = {}  # state -> timings and counters, see cache_status()
+# -------------------------------------------------
+
+# --- Politeness: how hard we hit any one site ---
+SCRAPE_SOURCE_WORKERS = int(os.getenv('SCRAPE_SOURCE_WORKERS', '8')) # Articles fetched at once, all sites together
+SCRAPE_DOMAIN_CONCURRENCY = int(os.getenv('SCRAPE_DOMAIN_CONCURRENCY', '2')) # Requests in flight per site
+SCRAPE_DOMAIN_INTERVAL = float(os.getenv('SCRAPE_DOMAIN_INTERVAL', '0.25')) # Seconds between request starts per site
+
+_source_executor = ThreadPoolExecutor(max_workers=SCRAPE_SOURCE_WORKERS, thread_name_prefix='scrape-source')
+_gates = {} # domain -> _DomainGate
+_gates_lock = threading.Lock()
+
+class _DomainGate:
+    def __init__(self):
+        self.slots = threading.BoundedSemaphore(SCRAPE_DOMAIN_CONCURRENCY)
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+@contextmanager
+def _polite(domain):
+    """Holds one of the site's request slots, spaced SCRAPE_DOMAIN_INTERVAL apart. Yields the seconds waited."""
+    with _gates_lock:
+        gate = _gates.get(domain)
+        if gate is None:
+            gate = _gates[domain] = _DomainGate()
+    started = time.monotonic()
+    with gate.slots:
+        with gate.lock:
+            now = time.monotonic()
+            start = max(now, gate.next_start)
+            gate.next_start = start + SCRAPE_DOMAIN_INTERVAL
+        if start > now:
+            time.sleep(start - now)
+        yield time.monotonic() - started
 # -------------------------------------------------
 
+PLACEHOLDER_IMAGE = "https://placehold.co/600x400/21a18e/white?text={}"
+
 # --- NEW: Parser function for klfoodie.com ---
+def _klfoodie_spot(i, name, description_tag, figure_tag, location_tag, state):
+    """Builds one klfoodie spot from the tags found around its heading."""
+    description = description_tag.text.strip() if description_tag else "No description."
+
+    img_tag = figure_tag.find('img') if figure_tag else None
+    image_url = img_tag['src'] if (img_tag and 'src' in img_tag.attrs) else PLACEHOLDER_IMAGE.format(name.replace(' ', '+'))
+
+    location = state
+    if location_tag and 'Address:' in location_tag.text:
+        location = location_tag.text.replace("Address:", "").strip()
+
+    return {
+        'id': f'klfoodie_{state}_{i+1}', 'name': name, 'location': location,
+        'description': description, 'imageUrl': image_url
+    }
+
 def _parse_klfoodie(content, state):
     """Blueprint for scraping klfoodie.com articles"""
     print("Using klfoodie parser...")
@@ -37,42 +135,40 @@ def _parse_klfoodie(content, state):
         parts = full_text.split('.', 1)
         
         if len(parts) > 1 and parts[0].isdigit():
-            name = parts[1].strip()
-            
             description_tag = name_tag.find_next_sibling('p')
-            description = description_tag.text.strip() if description_tag else "No description."
-
-            img_tag = None
             figure_tag = name_tag.find_next_sibling('figure')
-            if figure_tag:
-                img_tag = figure_tag.find('img')
-                
-            image_url = img_tag['src'] if (img_tag and 'src' in img_tag.attrs) else f"https://placehold.co/600x400/21a18e/white?text={name.replace(' ', '+')}"
-            
-            location = state
-            if description_tag:
-                location_tag = description_tag.find_next_sibling('p')
-                if location_tag and 'Address:' in location_tag.text:
-                    location = location_tag.text.replace("Address:", "").strip()
-
-            spot = {
-                'id': f'klfoodie_{state}_{i+1}', 'name': name, 'location': location,
-                'description': description, 'imageUrl': image_url
-            }
-            spots.append(spot)
+            location_tag = description_tag.find_next_sibling('p') if description_tag else None
+            spots.append(_klfoodie_spot(i, parts[1].strip(), description_tag, figure_tag, location_tag, state))
         else:
             print(f"Skipping junk/unformatted tag: {full_text}")
     return spots
 # -----------------------------------------
 
 # --- NEW: Parser function for ecentral.my (NOW FIXED) ---
+def _is_lokasi(text):
+    return text and 'Lokasi:' in text
+
+def _ecentral_spot(i, name, description_tag, img_tag, location_tag, state):
+    """Builds one ecentral.my spot from the tags found around its heading."""
+    description = description_tag.text.strip() if description_tag else "No description."
+    image_url = img_tag['src'] if (img_tag and 'src' in img_tag.attrs) else PLACEHOLDER_IMAGE.format(name.replace(' ', '+'))
+
+    location = state
+    # The location data is in a <p> tag that contains 'Lokasi:'
+    if location_tag:
+        location = location_tag.text.replace("Lokasi:", "").strip()
+
+    return {
+        'id': f'ecentral_{state}_{i+1}', 'name': name, 'location': location,
+        'description': description, 'imageUrl': image_url
+    }
+
 def _parse_ecentral(content, state):
     """Blueprint for scraping ecentral.my articles"""
     print("Using ecentral.my parser...")
     spots = []
     
-    # --- THIS IS YOUR FIX ---
-    # Find all <h3> tags that have the class 'wp-block-heading'
+    # Find all <h3>/<h4> tags that have the class 'wp-block-heading'
     all_name_tags = content.find_all(['h3', 'h4'], class_='wp-block-heading')   
     
     for i, name_tag in enumerate(all_name_tags):
@@ -80,94 +176,567 @@ def _parse_ecentral(content, state):
         parts = full_text.split('.', 1)
         
         if len(parts) > 1 and parts[0].isdigit():
-            name = parts[1].strip()
-            
             description_tag = name_tag.find_next_sibling('p')
-            description = description_tag.text.strip() if description_tag else "No description."
-
-            img_tag = None      
             img_tag = name_tag.find_previous('img')                
-            image_url = img_tag['src'] if (img_tag and 'src' in img_tag.attrs) else f"https://placehold.co/600x400/21a18e/white?text={name.replace(' ', '+')}"
-            
-            location = state
-            # The location data is in a <p> tag that contains 'Lokasi:'
-            location_tag = name_tag.find_next_sibling('p', string=lambda t: t and 'Lokasi:' in t)
-            if location_tag:
-                location = location_tag.text.replace("Lokasi:", "").strip()
-
-            spot = {
-                'id': f'ecentral_{state}_{i+1}', 'name': name, 'location': location,
-                'description': description, 'imageUrl': image_url
-            }
-            spots.append(spot)
+            location_tag = name_tag.find_next_sibling('p', string=_is_lokasi)
+            spots.append(_ecentral_spot(i, parts[1].strip(), description_tag, img_tag, location_tag, state))
         else:
             print(f"Skipping junk/unformatted tag: {full_text}")
     return spots
 # -----------------------------------------
 
-# --- MASTER SCRAPER FUNCTION (Updated) ---
-def scrape_trending_spots(state="Kuala Lumpur"):
+# --- Change detection ---
+# Comments, scripts and styles are skipped whole, so a "<div" or "</div>" inside
+# them isn't counted; quoted attribute values are matched whole for the same reason.
+_BLOCK_TOKENS = re.compile(
+    r'<!--.*?(?:-->|$)'
+    r'|<(script|style)\b.*?(?:</\1\s*>|$)'
+    r'|<(/?)div\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+    re.IGNORECASE | re.DOTALL,
+)
+_ATTRIBUTE = re.compile(r'([^\s=/>]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+))?')
+
+def _has_class(attributes, class_name):
+    for name, value in _ATTRIBUTE.findall(attributes):
+        if name.lower() == 'class':
+            return class_name in value.strip('"\'').split()
+    return False
+
+def _extract_block(html, class_name):
     """
-    Master scraper function. Selects the correct URL and parser based on the state.
+    Cheaply finds the raw HTML of the first <div class="...class_name..."> in
+    the page by counting nested divs, without building a parse tree.
+    Returns its (start, end) offsets, or None if the container isn't there.
     """
-    current_time = time.time()
-    
-    URL = STATE_URLS.get(state, STATE_URLS['Kuala Lumpur'])
-    if not URL:
-        print(f"No URL defined for {state}. Skipping.")
+    start = None
+    depth = 0
+    for token in _BLOCK_TOKENS.finditer(html):
+        if token.group(1) or token.group(0).startswith('<!--'):
+            continue # A comment, script or style
+        if start is None:
+            if not token.group(2) and _has_class(token.group(3), class_name):
+                start, depth = token.start(), 1
+            continue
+        depth += -1 if token.group(2) else 1
+        if depth == 0:
+            return start, token.end()
+    return (start, len(html)) if start is not None else None
+# ------------------------------------
+
+# --- Fast path: parse only the content block, in one forward pass ---
+# Off by default: set SCRAPER_FAST_PARSE=1 to use it. Whenever it finds nothing,
+# the full parse runs instead. html.parser keeps the output identical to the full
+# parse; set SCRAPER_PARSER=lxml to trade that guarantee for a faster C tokenizer
+# when lxml is installed.
+FAST_PARSE = os.getenv('SCRAPER_FAST_PARSE', '0') == '1'
+SCRAPER_PARSER = os.getenv('SCRAPER_PARSER', 'html.parser')
+
+def _scan_headings(content, is_heading):
+    """
+    Walks `content` once, in document order, and collects for every heading:
+      p1/p2   - the first two <p> siblings after it
+      figure  - the first <figure> sibling after it
+      lokasi  - the first <p> sibling after it whose string contains 'Lokasi:'
+      img     - the closest <img> before it in `content` (None if there is none)
+    This is what the find_next_sibling/find_previous calls above look up,
+    without walking the tree again for every heading.
+    """
+    found = []
+    waiting = {} # id(parent) -> headings under that parent still missing a sibling
+    last_img = None
+    for node in content.descendants:
+        if not isinstance(node, Tag):
+            continue
+
+        pending = waiting.get(id(node.parent))
+        if pending:
+            for heading in pending:
+                if node.name == 'p':
+                    if heading['p1'] is None:
+                        heading['p1'] = node
+                    elif heading['p2'] is None:
+                        heading['p2'] = node
+                    if heading['lokasi'] is None and _is_lokasi(node.string):
+                        heading['lokasi'] = node
+                elif node.name == 'figure' and heading['figure'] is None:
+                    heading['figure'] = node
+            waiting[id(node.parent)] = [
+                h for h in pending if h['p2'] is None or h['figure'] is None or h['lokasi'] is None
+            ]
+
+        if node.name == 'img':
+            last_img = node
+        elif is_heading(node):
+            heading = {'tag': node, 'p1': None, 'p2': None, 'figure': None, 'lokasi': None, 'img': last_img}
+            found.append(heading)
+            waiting.setdefault(id(node.parent), []).append(heading)
+    return found
+
+def _parse_klfoodie_fast(content, state):
+    print("Using klfoodie parser (fast)...")
+    spots = []
+    for i, heading in enumerate(_scan_headings(content, lambda tag: tag.name == 'h2')):
+        full_text = heading['tag'].text.strip()
+        parts = full_text.split('.', 1)
+        if len(parts) > 1 and parts[0].isdigit():
+            spots.append(_klfoodie_spot(i, parts[1].strip(), heading['p1'], heading['figure'], heading['p2'], state))
+        else:
+            print(f"Skipping junk/unformatted tag: {full_text}")
+    return spots
+
+def _is_ecentral_heading(tag):
+    return tag.name in ('h3', 'h4') and 'wp-block-heading' in (tag.get('class') or [])
+
+def _parse_ecentral_fast(content, state, img_before=lambda: None):
+    """`img_before()` is the last <img> before the content div, looked up only if a heading needs it."""
+    print("Using ecentral.my parser (fast)...")
+    spots = []
+    fallback = []
+    for i, heading in enumerate(_scan_headings(content, _is_ecentral_heading)):
+        full_text = heading['tag'].text.strip()
+        parts = full_text.split('.', 1)
+        if len(parts) > 1 and parts[0].isdigit():
+            img_tag = heading['img']
+            if img_tag is None:
+                if not fallback:
+                    fallback.append(img_before())
+                img_tag = fallback[0]
+            spots.append(_ecentral_spot(i, parts[1].strip(), heading['p1'], img_tag, heading['lokasi'], state))
+        else:
+            print(f"Skipping junk/unformatted tag: {full_text}")
+    return spots
+
+def _last_img_before(html, end):
+    """The last <img> in html[:end] (ecentral falls back to it), as the full parse sees it: not in comments or scripts."""
+    images = BeautifulSoup(html[:end], SCRAPER_PARSER).find_all('img')
+    return images[-1] if images else None
+
+# --- Parser registry ---
+# One entry per site: the class of the div that holds the article body, the
+# parser for the full page tree and (optionally) the single-pass fast parser.
+# Both parsers get that div. Supporting a new site is one register_parser() call.
+SiteParser = namedtuple('SiteParser', ['content_class', 'parse', 'parse_fast'])
+PARSERS = {}
+
+def register_parser(domain, content_class, parse, parse_fast=None):
+    """
+    parse(content, state) and parse_fast(content, state, html, start) return
+    spot dicts; `html` and `start` are the whole page and where the content
+    div begins in it, for parsers that look outside the div.
+    """
+    PARSERS[domain] = SiteParser(content_class, parse, parse_fast)
+
+def parser_for(domain):
+    """The parser for `domain` or the nearest parent domain it has ('www.klfoodie.com' -> 'klfoodie.com')."""
+    domain = domain.lower().split(':')[0]
+    while domain:
+        parser = PARSERS.get(domain)
+        if parser is not None:
+            return parser
+        domain = domain.partition('.')[2]
+    return None
+
+register_parser(
+    'klfoodie.com', 'entry-content', _parse_klfoodie,
+    lambda content, state, html, start: _parse_klfoodie_fast(content, state),
+)
+register_parser(
+    'ecentral.my', 'brxe-post-content', _parse_ecentral,
+    lambda content, state, html, start: _parse_ecentral_fast(content, state, lambda: _last_img_before(html, start)),
+)
+
+def _parse_fast(parser, html, span, state):
+    """
+    Parses only html[span] (the content container found by _extract_block).
+    None if that isn't the container or no spots were found in it, so the
+    caller can fall back to the full parse.
+    """
+    start, end = span
+    content = BeautifulSoup(html[start:end], SCRAPER_PARSER).find('div')
+    if content is None or parser.content_class not in (content.get('class') or []):
+        return None
+    return parser.parse_fast(content, state, html, start) or None
+
+def parse_page(domain, html, state, span=None, fast=None):
+    """
+    Turns a downloaded article into spot dicts using the site's registered parser.
+    `span` is the content container's position if the caller already found it.
+    """
+    parser = parser_for(domain)
+    if parser is None:
+        print(f"Scraper: no parser registered for {domain}.")
         return []
-        
-    print(f"Scraper: Fetching URL: {URL}")
 
-    # Check cache
-    if state in cache_data and (current_time - cache_data[state]['last_updated'] < CACHE_DURATION):
-        print(f"Returning data from cache for {state}...")
-        return cache_data[state]['spots']
+    fast = FAST_PARSE if fast is None else fast
+    if fast and parser.parse_fast:
+        span = span or _extract_block(html, parser.content_class)
+        spots = _parse_fast(parser, html, span, state) if span else None
+        if spots is not None:
+            return spots
+        print(f"Scraper: fast parse found nothing on {domain}, parsing the whole page.")
 
-    print(f"Cache expired or empty for {state}. Scraping new data...")
-    
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    soup = BeautifulSoup(html, 'html.parser')
+    content = soup.find('div', class_=parser.content_class)
+    if content is None:
+        print(f"Could not find '{parser.content_class}' on {domain}.")
+        return []
+    return parser.parse(content, state)
+# -----------------------------------------
+
+# --- Fetch + parse one article (no caching) ---
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+def _fetch_source(state, url, previous=None):
+    """
+    Downloads and parses one article for `state`.
+
+    `previous` is this article's last result. Its ETag/Last-Modified are sent
+    as a conditional request, and if the server answers 304 or the content
+    block hashes the same, the old spots are reused without parsing.
+
+    Returns {'spots', 'etag', 'last_modified', 'content_hash', 'changed',
+    'timings'}, or None if the fetch or parse failed. `timings` holds the
+    seconds spent waiting for the site's turn, fetching and parsing.
+    """
+    print(f"Scraper: Fetching URL: {url}")
+    headers = dict(HEADERS)
+    if previous:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+    stats = _stats_for(state)
+    domain = urlparse(url).netloc # Get domain (e.g., 'klfoodie.com')
+    timings = {'wait_seconds': 0.0, 'fetch_seconds': None, 'parse_seconds': None}
+    _source_stats(state, url).update(timings, outcome='fetching')
+
+    # While a site keeps failing, don't wait on it: callers keep the last good scrape
+    breaker = circuit_breaker.get(f"scrape:{domain}", min_calls=SCRAPE_BREAKER_MIN_CALLS, window=SCRAPE_BREAKER_WINDOW)
+    if not breaker.allow():
+        stats['circuit_open'] += 1
+        _source_stats(state, url)['outcome'] = 'circuit_open'
+        metrics.upstream_error('scrape', 'circuit_open')
+        print(f"Scraper: {domain} is failing (circuit open), keeping the last good scrape for {state}.")
+        return None
     
+    outcome = 'failed'
     try:
-        response = requests.get(URL, headers=headers, timeout=10)
+        with _polite(domain) as waited:
+            timings['wait_seconds'] = round(waited, 3)
+            started = time.perf_counter()
+            try:
+                with metrics.span('scrape_fetch', upstream='scrape', domain=domain):
+                    response = http_client.get(url, pool='scrape', headers=headers, timeout=(http_client.CONNECT_TIMEOUT, 10))
+                    html = response.text # Read the body while we hold the site's slot
+            except requests.exceptions.RequestException:
+                breaker.failure()
+                raise
+            finally:
+                timings['fetch_seconds'] = round(time.perf_counter() - started, 3)
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.failure()
+        else:
+            breaker.success() # Even a 404 means the site is up
+        stats['fetches'] += 1
+
+        if response.status_code == 304 and previous:
+            stats['not_modified'] += 1
+            outcome = 'not_modified'
+            print(f"Scraper: {url} not modified (304), keeping {len(previous['spots'])} spots.")
+            return dict(previous, changed=False, timings=timings)
+
+        if response.status_code >= 400:
+            metrics.upstream_error('scrape', f"http_{response.status_code}")
         response.raise_for_status() 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        spots = []
-        domain = urlparse(URL).netloc # Get domain (e.g., 'klfoodie.com')
-        
-        # --- NEW: Select the correct blueprint ---
-        if 'klfoodie.com' in domain:
-            content = soup.find('div', class_='entry-content')
-            if content:
-                spots = _parse_klfoodie(content, state)
-            else:
-                print("Could not find 'entry-content' on klfoodie.")
-        
-        elif 'ecentral.my' in domain:
-            # --- THIS IS THE FIX (Thanks to your screenshot!) ---
-            # The correct class for ecentral.my is 'brxe-post-content'
-            content = soup.find('div', class_='brxe-post-content')
-            # ----------------------------------------------------
-            if content:
-                spots = _parse_ecentral(content, state)
-            else:
-                # Update the error message to be correct
-                print("Could not find 'brxe-post-content' on ecentral.")                
-            
-        # Update cache
-        cache_data[state] = {'spots': spots, 'last_updated': current_time}
-        print(f"Successfully scraped {len(spots)} spots for {state}.")
-        return spots
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+        parser = parser_for(domain)
+        span = _extract_block(html, parser.content_class) if parser else None
+        content_hash = hashlib.sha256(html[span[0]:span[1]].encode('utf-8')).hexdigest() if span else None
+
+        if content_hash and previous and previous.get('content_hash') == content_hash:
+            stats['unchanged'] += 1
+            outcome = 'unchanged'
+            print(f"Scraper: {url} content unchanged, skipping parse.")
+            return dict(previous, changed=False, timings=timings, **validators)
+
+        started = time.perf_counter()
+        with metrics.span('scrape_parse', domain=domain):
+            spots = parse_page(domain, html, state, span)
+        timings['parse_seconds'] = round(time.perf_counter() - started, 3)
+        stats['changed'] += 1
+        outcome = 'changed'
+        print(f"Successfully scraped {len(spots)} spots for {state} from {domain}.")
+        return {'spots': spots, 'content_hash': content_hash, 'changed': True, 'timings': timings, **validators}
 
     except requests.exceptions.RequestException as e:
         print(f"Error scraping website: {e}")
-        return []
+        return None
     except Exception as e:
         print(f"An error occurred during parsing: {e}")
-        return []
+        return None
+    finally:
+        _source_stats(state, url).update(timings, outcome=outcome)
+
+def normalize_name(name):
+    """'Kek Lok Si Temple!' and 'kek lok si  temple' are the same spot."""
+    text = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text.casefold()).split())
+
+def _merge(spot_lists, state):
+    """
+    One list from several articles' spots, in source order. A spot whose
+    normalized name was already seen is dropped, after lending the kept one
+    its address or photo if the kept one only had placeholders.
+    """
+    placeholder = PLACEHOLDER_IMAGE.split('{}')[0]
+    merged = []
+    by_name = {}
+    ids = set()
+    for position, spots in enumerate(spot_lists):
+        for spot in spots:
+            key = normalize_name(spot.get('name'))
+            kept = by_name.get(key)
+            if kept is not None:
+                if kept.get('location') == state and spot.get('location') not in (None, state):
+                    kept['location'] = spot['location']
+                if kept.get('imageUrl', '').startswith(placeholder) and not spot.get('imageUrl', placeholder).startswith(placeholder):
+                    kept['imageUrl'] = spot['imageUrl']
+                continue
+            spot = dict(spot)
+            if spot.get('id') in ids:
+                spot['id'] = f"{spot['id']}_s{position + 1}" # Two articles on the same site number spots alike
+            ids.add(spot.get('id'))
+            by_name[key] = spot
+            merged.append(spot)
+    return merged
+
+SOURCE_KEYS = ('spots', 'etag', 'last_modified', 'content_hash') # What the cache keeps per article
+
+def _fetch_spots(state, previous=None, carry_forward=True):
+    """
+    Fetches every article for `state` concurrently and merges their spots.
+
+    `previous` is the last cached result; each article's part of it drives
+    that article's conditional request. If `carry_forward` is set, an
+    article that fails this time contributes its previous spots, if it has
+    any; those articles are listed in 'carried_sources'.
+
+    Returns {'spots', 'sources', 'content_hash', 'changed', 'carried_sources'},
+    or None if every article failed.
+    """
+    urls = STATE_URLS.get(state, STATE_URLS['Kuala Lumpur'])
+    if not urls:
+        print(f"No URL defined for {state}. Skipping.")
+        return {'spots': [], 'sources': {}, 'content_hash': None, 'changed': False, 'carried_sources': []}
+
+    previous_sources = (previous or {}).get('sources')
+    if previous_sources is None and previous:
+        previous_sources = {urls[0]: previous} # Cached before states had several sources
+    previous_sources = previous_sources or {}
+
+    if len(urls) == 1:
+        results = [_fetch_source(state, urls[0], previous_sources.get(urls[0]))]
+    else:
+        results = list(_source_executor.map(lambda url: _fetch_source(state, url, previous_sources.get(url)), urls))
+
+    if all(result is None for result in results):
+        return None
+    sources = {}
+    carried = []
+    for url, result in zip(urls, results):
+        if result is not None:
+            result.pop('timings', None)
+            sources[url] = result
+        elif carry_forward and url in previous_sources:
+            sources[url] = dict(previous_sources[url], changed=False) # Keep its last good spots
+            carried.append(url)
+
+    used = [url for url in urls if url in sources]
+    hashes = [sources[url].get('content_hash') for url in used]
+    if len(used) == 1:
+        content_hash = hashes[0] # Same version as before sources were merged
+    elif all(hashes):
+        content_hash = hashlib.sha256('\n'.join(f"{url} {h}" for url, h in zip(used, hashes)).encode('utf-8')).hexdigest()
+    else:
+        content_hash = None
+    return {
+        'spots': _merge([sources[url]['spots'] for url in used], state),
+        'sources': {url: {key: source.get(key) for key in SOURCE_KEYS} for url, source in sources.items()},
+        'content_hash': content_hash,
+        'changed': any(source.get('changed') for source in sources.values()),
+        'carried_sources': carried,
+    }
+# ------------------------------------
+
+# --- Refresh bookkeeping ---
+def _stats_for(state):
+    return refresh_stats.setdefault(state, {
+        'fresh_served': 0, 'stale_served': 0, 'misses': 0,
+        'refreshes': 0, 'refresh_failures': 0, 'partial_refreshes': 0, 'refreshes_skipped': 0,
+        'fetches': 0, 'not_modified': 0, 'unchanged': 0, 'changed': 0, 'circuit_open': 0,
+        'last_refresh_started': None, 'last_refresh_seconds': None,
+        'sources': {},
+    })
+
+def _source_stats(state, url):
+    """Timings and outcome of the last fetch of one article, see cache_status()."""
+    return _stats_for(state)['sources'].setdefault(url, {})
+
+def _refresh(state):
+    """
+    Scrapes `state` and stores the result. Returns the stored entry, or None
+    if every article failed.
+
+    When only some articles fail, their previous spots are carried forward,
+    but the entry keeps its old stored_at, so it goes stale and stops being
+    served on the old schedule. Spots older than STALE_DURATION are never
+    carried forward.
+    """
+    stats = _stats_for(state)
+    started = time.time()
+    stats['last_refresh_started'] = started
+
+    entry = scrape_cache.get_entry(state)
+    previous, previous_stored_at = entry if entry is not None else (None, None)
+    carry_forward = previous_stored_at is not None and started - previous_stored_at < STALE_DURATION
+    result = _fetch_spots(state, previous, carry_forward)
+
+    stats['last_refresh_seconds'] = round(time.time() - started, 3)
+    if result is None:
+        stats['refresh_failures'] += 1
+        return None
+    stats['refreshes'] += 1
+    if result['carried_sources']:
+        stats['partial_refreshes'] += 1
+        print(f"Scraper: {len(result['carried_sources'])} article(s) for {state} failed, keeping their last spots.")
+
+    # 'changes' survives restarts, so it shows how often each article really changes
+    changes = (previous or {}).get('changes', 0) + (1 if result.pop('changed') else 0)
+    value = dict(result, changes=changes, scrape_seconds=stats['last_refresh_seconds'])
+    scrape_cache.set(state, value, stored_at=previous_stored_at if result['carried_sources'] else None)
+    return value
+
+def _refresh_once(state):
+    """
+    Runs a refresh for `state`, collapsing concurrent callers in this process
+    onto the same Future so a state is only ever scraped once at a time.
+    """
+    with _inflight_lock:
+        future = _inflight.get(state)
+        if future is None:
+            future = _refresh_executor.submit(_refresh, state)
+            _inflight[state] = future
+            future.add_done_callback(lambda _f: _forget_inflight(state, _f))
+    return future
+
+def _forget_inflight(state, future):
+    with _inflight_lock:
+        if _inflight.get(state) is future:
+            del _inflight[state]
+
+def _background_refresh(state):
+    """Starts a refresh unless this or another worker process is already doing it."""
+    with _inflight_lock:
+        if state in _inflight:
+            return
+    if not scrape_cache.acquire_lease(state, REFRESH_LEASE_SECONDS, _refresh_owner):
+        _stats_for(state)['refreshes_skipped'] += 1
+        return
+    future = _refresh_once(state)
+    # On (partial) failure we keep the lease until it expires, so a broken site isn't retried on every request
+    future.add_done_callback(lambda f: f.result() is not None and not f.result()['carried_sources']
+                             and scrape_cache.release_lease(state, _refresh_owner))
 # ------------------------------------
 
+def _version(value):
+    """
+    Identifies what was scraped: the content hash, which stays the same while
+    the article is unchanged (even across 304s and re-fetches).
+    """
+    return value.get('content_hash') or f"spots:{len(value['spots'])}"
+
+# --- MASTER SCRAPER FUNCTION (Updated) ---
+def get_trending_spots(state="Kuala Lumpur"):
+    """
+    Returns (spots, version) for `state`. `version` changes only when the
+    scraped list does, so callers can key their own caches on it.
+
+    Fresh cache entries are returned as-is. Stale ones are returned straight
+    away while a background refresh runs. Only a missing (or very old) entry
+    makes the caller wait for a scrape. Every call gets its own copy of the
+    spots, so callers are free to modify them.
+    """
+    stats = _stats_for(state)
+    entry = scrape_cache.get_entry(state)
+
+    if entry is not None:
+        value, stored_at = entry
+        age = time.time() - stored_at
+        if age < CACHE_DURATION:
+            stats['fresh_served'] += 1
+            logs.debug('scrape_cache_hit', sample=True, state=state)
+            return value['spots'], _version(value)
+        if age < STALE_DURATION:
+            stats['stale_served'] += 1
+            print(f"Returning stale data for {state} ({int(age)}s old), refreshing in background...")
+            _background_refresh(state)
+            return value['spots'], _version(value)
+
+    stats['misses'] += 1
+    print(f"Cache expired or empty for {state}. Scraping new data...")
+    value = _refresh_once(state).result()
+    if value is None:
+        # Scrape failed: an over-age copy is still better than nothing
+        if entry is not None:
+            return entry[0]['spots'], _version(entry[0])
+        return [], None
+    # Concurrent callers share this Future's result, so hand out copies
+    return [dict(spot) for spot in value['spots']], _version(value)
+
+def cached_spots(state):
+    """
+    (spots, version) from the scrape cache however old it is, or None if
+    `state` was never scraped. Never scrapes and isn't counted in the stats.
+    """
+    entry = scrape_cache.get_entry(state)
+    if entry is None:
+        return None
+    return entry[0]['spots'], _version(entry[0])
+
+def scrape_trending_spots(state="Kuala Lumpur"):
+    """
+    Master scraper function. Selects the correct URL and parser based on the state.
+    """
+    spots, _version = get_trending_spots(state)
+    return spots
+# ------------------------------------
+
+def cache_status():
+    """Per-state freshness and refresh timings, for /api/stats."""
+    now = time.time()
+    status = {}
+    for state in STATE_URLS:
+        entry = scrape_cache.get_entry(state)
+        info = dict(_stats_for(state))
+        info['sources'] = {url: dict(source) for url, source in info['sources'].items()}
+        info['cached'] = entry is not None
+        info['refreshing'] = state in _inflight
+        if entry is not None:
+            value, stored_at = entry
+            info['age_seconds'] = round(now - stored_at, 1)
+            info['fresh'] = now - stored_at < CACHE_DURATION
+            info['spots'] = len(value['spots'])
+            info['scrape_seconds'] = value.get('scrape_seconds')
+            info['content_hash'] = value.get('content_hash')
+            info['changes'] = value.get('changes', 0)
+            info['carried_sources'] = value.get('carried_sources', [])
+        status[state] = info
+    return status
+
 # Test the function
 if __name__ == "__main__":
     print("--- Testing KL ---")
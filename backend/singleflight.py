@@ -0,0 +1,66 @@
+"""
+Request coalescing ("single-flight") for expensive upstream work.
+
+When several threads ask for the same key at the same time, only the first
+one runs the function. The others wait for it and get the same result, or
+the same exception if it failed. Nothing is cached: once the call finishes,
+the next caller with that key starts a new one.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {} # key -> _Call in progress
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'executions': 0, 'shared': 0, 'errors': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs), unless a call for `key` is already running, and returns its result."""
+        with self._lock:
+            self._counters['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters['executions'] += 1
+            else:
+                self._counters['shared'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['in_flight'] = len(self._calls)
+        # Share of calls that didn't have to go upstream themselves
+        counters['dedup_ratio'] = round(counters['shared'] / counters['calls'], 3) if counters['calls'] else 0.0
+        return counters
@@ -0,0 +1,204 @@
+"""
+Prebuilt snapshot of every state's enriched trending list.
+
+After a deploy or restart the live caches are empty, so the first request
+for each state would wait on a scrape plus ~20 Find Place calls. The warm-up
+job builds all states concurrently and writes them to one compact JSON file.
+Server processes load that file lazily and answer from it until they have built
+each state's list themselves in the background.
+
+Build it from the command line:
+
+    python snapshot.py [--output PATH] [--workers N]
+
+or let the server rebuild it on boot when it is missing or old
+(WARMUP_ON_BOOT, on by default).
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import places
+import scraper
+import trending
+from rate_limiter import WARMUP
+from scraper import STATE_URLS
+
+SNAPSHOT_FORMAT = 1 # Bump when the file layout changes; other versions are ignored
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trending_snapshot.json'))
+SNAPSHOT_WORKERS = int(os.getenv('SNAPSHOT_WORKERS', '4')) # States built at once
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', str(scraper.STALE_DURATION))) # Never served when older
+SNAPSHOT_REFRESH_AGE = int(os.getenv('SNAPSHOT_REFRESH_AGE', str(scraper.CACHE_DURATION))) # Rebuilt on boot when older
+WARMUP_ON_BOOT = os.getenv('WARMUP_ON_BOOT', '1') == '1'
+WARMUP_LEASE_SECONDS = 600 # Only one worker process rebuilds it
+
+_lock = threading.Lock()
+_loaded = {'mtime': None, 'data': None}
+_catch_up_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='snapshot-catch-up')
+_catching_up = set() # States whose live list is being built in the background
+_owner = f"{socket.gethostname()}:{os.getpid()}"
+_counters = {'served': 0, 'catch_ups': 0, 'builds': 0, 'load_errors': 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+# --- Building ---
+def _build_state(state):
+    started = time.time()
+    try:
+        spots, version, complete = trending.build_now(state, WARMUP)
+    except Exception as e:
+        print(f"Snapshot: failed to build {state}: {e}")
+        return state, None
+    print(f"Snapshot: {state}: {len(spots)} spots in {time.time() - started:.1f}s{'' if complete else ' (incomplete)'}")
+    return state, {'version': version, 'complete': complete, 'spots': spots}
+
+def build(path=SNAPSHOT_PATH, max_workers=SNAPSHOT_WORKERS):
+    """Scrapes and enriches every state concurrently and writes the snapshot. Returns it."""
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='snapshot-build') as executor:
+        results = list(executor.map(_build_state, STATE_URLS))
+    states = {state: entry for state, entry in results if entry and entry['spots']}
+    snapshot = {'format': SNAPSHOT_FORMAT, 'created_at': time.time(), 'states': states}
+
+    # Written next to the target and renamed, so readers never see half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _count('builds')
+    return snapshot
+
+def age(path=SNAPSHOT_PATH):
+    """Seconds since the snapshot file was written, or None if there isn't one."""
+    try:
+        return time.time() - os.stat(path).st_mtime
+    except OSError:
+        return None
+# -----------------
+
+
+# --- Serving ---
+def load(path=SNAPSHOT_PATH):
+    """The snapshot as a dict, read once and re-read only when the file changes. None if unusable."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _lock:
+        if _loaded['mtime'] == mtime:
+            return _loaded['data']
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('format') != SNAPSHOT_FORMAT:
+                print(f"Snapshot: ignoring {path} (format {data.get('format')}, expected {SNAPSHOT_FORMAT})")
+                data = None
+        except (OSError, ValueError) as e:
+            print(f"Snapshot: could not read {path}: {e}")
+            data = None
+            _counters['load_errors'] += 1
+        _loaded['mtime'], _loaded['data'] = mtime, data
+        return data
+
+def _catch_up(state):
+    try:
+        trending.build_now(state, WARMUP)
+    except Exception as e:
+        print(f"Snapshot: background build of {state} failed: {e}")
+    finally:
+        with _lock:
+            _catching_up.discard(state)
+
+def serve(state):
+    """
+    (spots, version) for `state` from the snapshot until this process has
+    finished its first live build of the state, queueing that build in the
+    background. None after that (even when the enriched cache expires later),
+    or if the snapshot has nothing (recent) for the state. `version` tells this snapshot's entry apart from any other
+    (its scrape version and when the snapshot was written).
+    """
+    if trending.has_live_list(state):
+        return None
+    data = load()
+    if data is None or time.time() - data['created_at'] > SNAPSHOT_MAX_AGE:
+        return None
+    entry = data['states'].get(state)
+    if entry is None:
+        return None
+
+    with _lock:
+        _counters['served'] += 1
+        start = state not in _catching_up
+        if start:
+            _catching_up.add(state)
+            _counters['catch_ups'] += 1
+    if start:
+        _catch_up_executor.submit(_catch_up, state)
+    return [dict(spot) for spot in entry['spots']], (entry['version'], data['created_at'])
+# -----------------
+
+
+# --- Warm-up on boot ---
+def _warm_up():
+    if not scraper.scrape_cache.acquire_lease('snapshot', WARMUP_LEASE_SECONDS, _owner):
+        return # Another worker is already building it
+    try:
+        print("Snapshot: warming up all states...")
+        started = time.time()
+        snapshot = build()
+        print(f"Snapshot: wrote {len(snapshot['states'])} states in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"Snapshot: warm-up failed: {e}")
+    finally:
+        scraper.scrape_cache.release_lease('snapshot', _owner)
+
+def start_warm_up():
+    """Rebuilds the snapshot in a background thread if it is missing or older than SNAPSHOT_REFRESH_AGE."""
+    if not WARMUP_ON_BOOT or not places.GOOGLE_MAPS_API_KEY:
+        return None
+    snapshot_age = age()
+    if snapshot_age is not None and snapshot_age < SNAPSHOT_REFRESH_AGE:
+        return None
+    thread = threading.Thread(target=_warm_up, name='snapshot-warm-up', daemon=True)
+    thread.start()
+    return thread
+# -----------------
+
+
+def stats():
+    data = load()
+    with _lock:
+        counters = dict(_counters)
+        counters['catching_up'] = sorted(_catching_up)
+    snapshot_age = age()
+    counters['age_seconds'] = round(snapshot_age, 1) if snapshot_age is not None else None
+    counters['states'] = len(data['states']) if data else 0
+    return counters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the trending spots startup snapshot.")
+    parser.add_argument('--output', default=SNAPSHOT_PATH, help="where to write the snapshot")
+    parser.add_argument('--workers', type=int, default=SNAPSHOT_WORKERS, help="states built at once")
+    args = parser.parse_args()
+
+    if not places.GOOGLE_MAPS_API_KEY:
+        print("Warning: SERVER_MAPS_KEY not set, the snapshot will contain unenriched spots.")
+    started = time.time()
+    snapshot = build(args.output, args.workers)
+    spots = sum(len(entry['spots']) for entry in snapshot['states'].values())
+    print(f"Wrote {len(snapshot['states'])}/{len(STATE_URLS)} states ({spots} spots) "
+          f"to {args.output} in {time.time() - started:.1f}s")
@@ -0,0 +1,292 @@
+"""
+In-memory search over every scraped (and, where available, enriched) spot.
+
+Names, locations and descriptions are split into tokens. Each distinct token
+is also indexed by its character trigrams, so a misspelt query word still
+finds the right token ("petronaz" -> "petronas"), and the last word of the
+query matches as a prefix, for search-as-you-type. A spot's score is the
+average, over the query words, of its best match for each word. A name
+match counts more than a location match, and a location match more than
+a description match.
+
+The index is filled from the scrape cache, the enriched cache and the
+startup snapshot, without scraping anything. `sync()` re-reads them and
+re-indexes only the states whose spots changed. Searches call it at most
+every SPOT_INDEX_SYNC_SECONDS, in the background, so a refresh done by
+any worker shows up here within that time.
+"""
+import heapq
+import os
+import re
+import threading
+import time
+import unicodedata
+
+import metrics
+import snapshot
+import trending
+from scraper import STATE_URLS, cached_spots
+
+SPOT_INDEX_SYNC_SECONDS = int(os.getenv('SPOT_INDEX_SYNC_SECONDS', '30'))
+SPOT_SEARCH_MIN_SCORE = float(os.getenv('SPOT_SEARCH_MIN_SCORE', '0.6')) # Below this we ask Google instead
+FUZZY_MIN_SIMILARITY = 0.4 # Trigram similarity a query word needs to count as a match
+PREFIX_SIMILARITY = 0.9 # "bat" typed so far, "batu" in the index
+PHRASE_BONUS = 0.1 # Added when the query appears as-is in the name
+MAX_QUERY_TOKENS = 8
+
+# How much a word found in each field counts
+FIELD_WEIGHTS = (('name', 1.0), ('location', 0.6), ('description', 0.4))
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def tokenize(text):
+    """'Kek Lok Si, Air Itam' -> ['kek', 'lok', 'si', 'air', 'itam'] (accents and punctuation dropped)."""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return [token for token in _NON_WORD.split(text.casefold()) if token]
+
+
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SpotIndex:
+    """Token and trigram postings for all states, replaceable one state at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}      # (state, i) -> spot
+        self._postings = {}  # token -> {state: {i: field weight}}, so a state filter skips the rest
+        self._names = {}     # (state, i) -> the spot's name tokens joined, for phrase matches
+        self._ratings = {}   # (state, i) -> Google rating, to break ties
+        self._trigrams = {}  # trigram -> set of tokens
+        self._token_trigrams = {} # token -> number of trigrams
+        self._state_tokens = {}   # state -> tokens its spots use
+        self._versions = {}  # state -> version its spots came from
+
+    def version(self, state):
+        with self._lock:
+            return self._versions.get(state)
+
+    def update_state(self, state, spots, version):
+        """Replaces everything indexed for `state` with `spots`."""
+        postings = {} # token -> {i: weight}, built outside the lock
+        docs = {}
+        names = {}
+        ratings = {}
+        for i, spot in enumerate(spots):
+            docs[(state, i)] = dict(spot)
+            names[(state, i)] = ' '.join(tokenize(spot.get('name')))
+            ratings[(state, i)] = spot.get('rating') or 0
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(spot.get(field)):
+                    token_docs = postings.setdefault(token, {})
+                    if token_docs.get(i, 0) < weight:
+                        token_docs[i] = weight
+
+        with self._lock:
+            self._remove_state(state)
+            self._docs.update(docs)
+            self._names.update(names)
+            self._ratings.update(ratings)
+            for token, token_docs in postings.items():
+                if token not in self._postings:
+                    self._postings[token] = {}
+                    grams = trigrams(token)
+                    self._token_trigrams[token] = len(grams)
+                    for gram in grams:
+                        self._trigrams.setdefault(gram, set()).add(token)
+                self._postings[token][state] = token_docs
+            self._state_tokens[state] = set(postings)
+            self._versions[state] = version
+
+    def _remove_state(self, state):
+        for token in self._state_tokens.pop(state, ()):
+            by_state = self._postings[token]
+            by_state.pop(state, None)
+            if not by_state:
+                del self._postings[token]
+                for gram in trigrams(token):
+                    tokens = self._trigrams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[gram]
+                del self._token_trigrams[token]
+        for doc_id in [doc_id for doc_id in self._docs if doc_id[0] == state]:
+            del self._docs[doc_id]
+            del self._names[doc_id]
+            del self._ratings[doc_id]
+        self._versions.pop(state, None)
+
+    def _similar_tokens(self, word, prefix):
+        """{indexed token: similarity} for one query word."""
+        known = word in self._postings
+        if len(word) < 2 or (known and not prefix):
+            return {word: 1.0} if known else {} # Only unknown words are treated as typos
+        grams = trigrams(word)
+        shared = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        similar = {}
+        for token, count in shared.items():
+            similarity = 2 * count / (len(grams) + self._token_trigrams[token]) # Dice coefficient
+            if token == word:
+                similarity = 1.0
+            elif prefix and token.startswith(word):
+                similarity = max(similarity, PREFIX_SIMILARITY)
+            elif known:
+                continue # A real word being typed: extend it, don't respell it
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                similar[token] = similarity
+        return similar
+
+    def search(self, query, state=None, limit=10):
+        """Best matches as [(score, state, spot)], highest score first."""
+        words = tokenize(query)[:MAX_QUERY_TOKENS]
+        if not words:
+            return []
+        phrase = ' '.join(words) if len(words) > 1 else None
+        with self._lock:
+            scores = {} # state -> {i: summed best match per query word}
+            for position, word in enumerate(words):
+                best = {} # state -> {i: best match for this word}
+                borrowed = set() # States whose `best` is still a postings dict itself
+                for token, similarity in self._similar_tokens(word, prefix=position == len(words) - 1).items():
+                    by_state = self._postings[token]
+                    for doc_state in ((state,) if state is not None else by_state):
+                        postings = by_state.get(doc_state)
+                        if not postings:
+                            continue
+                        state_best = best.get(doc_state)
+                        if state_best is None and similarity == 1.0:
+                            best[doc_state] = postings # Only read from here on, no need to copy
+                            borrowed.add(doc_state)
+                            continue
+                        if state_best is None or doc_state in borrowed:
+                            state_best = best[doc_state] = dict(state_best or {})
+                            borrowed.discard(doc_state)
+                        for i, weight in postings.items():
+                            score = similarity * weight
+                            if score > state_best.get(i, 0):
+                                state_best[i] = score
+                for doc_state, state_best in best.items():
+                    state_scores = scores.get(doc_state)
+                    if state_scores is None:
+                        scores[doc_state] = dict(state_best)
+                        continue
+                    for i, score in state_best.items():
+                        state_scores[i] = state_scores.get(i, 0) + score
+
+            ranked = []
+            for doc_state, state_scores in scores.items():
+                for i, score in state_scores.items():
+                    if phrase and phrase in self._names[(doc_state, i)]:
+                        score += PHRASE_BONUS * len(words) # Words in the order typed
+                    ranked.append((score, self._ratings[(doc_state, i)], doc_state, i))
+            # Ties go to the better rated spot
+            top = heapq.nlargest(limit, ranked, key=lambda item: (item[0], item[1]))
+            return [(round(min(1.0, score / len(words)), 3), doc_state, dict(self._docs[(doc_state, i)]))
+                    for score, _rating, doc_state, i in top]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'states': len(self._versions),
+                'spots': len(self._docs),
+                'tokens': len(self._postings),
+                'trigrams': len(self._trigrams),
+            }
+
+
+index = SpotIndex()
+
+_sync_lock = threading.Lock()
+_synced_at = 0.0
+_syncing = False
+_first_synced = threading.Event()
+_counters = {'searches': 0, 'good_matches': 0, 'syncs': 0, 'states_reindexed': 0, 'search_seconds': 0.0}
+
+
+def _current(state):
+    """(spots, version) to index for `state`: enriched if that's cached for the latest scrape, else scraped, else the snapshot."""
+    scraped = cached_spots(state)
+    if scraped is not None:
+        spots, version = scraped
+        enriched = trending.enriched_cache.peek(state)
+        if enriched is not None and enriched[0] == version:
+            return [dict(spot) for spot in enriched[1]], ('enriched', version)
+        return spots, ('scraped', version)
+    data = snapshot.load()
+    entry = data['states'].get(state) if data else None
+    if entry is not None:
+        return entry['spots'], ('snapshot', entry['version'])
+    return [], None
+
+
+def sync():
+    """Re-indexes every state whose spots changed since the last sync. Returns how many did."""
+    global _synced_at, _syncing
+    reindexed = 0
+    try:
+        for state in STATE_URLS:
+            spots, version = _current(state)
+            if version != index.version(state):
+                index.update_state(state, spots, version)
+                reindexed += 1
+    finally:
+        with _sync_lock:
+            _synced_at = time.time()
+            _syncing = False
+            _counters['syncs'] += 1
+            _counters['states_reindexed'] += reindexed
+        _first_synced.set()
+    if reindexed:
+        print(f"SpotIndex: re-indexed {reindexed} state(s)")
+    return reindexed
+
+
+def _maybe_sync():
+    """Syncs in the foreground the first time, then in the background when the index is older than SPOT_INDEX_SYNC_SECONDS."""
+    global _syncing
+    with _sync_lock:
+        due = not _syncing and time.time() - _synced_at >= SPOT_INDEX_SYNC_SECONDS
+        if due:
+            _syncing = True
+        first = _synced_at == 0
+    if due and first:
+        sync()
+    elif due:
+        threading.Thread(target=sync, name='spot-index-sync', daemon=True).start()
+    elif first:
+        _first_synced.wait(5) # Someone else is filling the empty index
+
+
+def search(query, state=None, limit=10):
+    """
+    Spots matching `query`, best first, each a copy of the spot with its
+    'state' and 'score' (0..1) added. Returns (results, good): `good` is
+    True if the best score reaches SPOT_SEARCH_MIN_SCORE.
+    """
+    _maybe_sync()
+    started = time.perf_counter()
+    with metrics.span('spot_search'):
+        matches = index.search(query, state, limit)
+    results = [dict(spot, state=spot_state, score=score) for score, spot_state, spot in matches]
+    good = bool(matches) and matches[0][0] >= SPOT_SEARCH_MIN_SCORE
+    with _sync_lock:
+        _counters['searches'] += 1
+        _counters['good_matches'] += good
+        _counters['search_seconds'] += time.perf_counter() - started
+    return results, good
+
+
+def stats():
+    with _sync_lock:
+        counters = dict(_counters)
+        counters['synced_seconds_ago'] = round(time.time() - _synced_at, 1) if _synced_at else None
+    searches = counters['searches']
+    counters['avg_search_ms'] = round(counters.pop('search_seconds') / searches * 1000, 3) if searches else 0.0
+    counters.update(index.stats())
+    return counters
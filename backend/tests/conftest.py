@@ -0,0 +1,17 @@
+"""
+Shared setup: the backend modules import from the backend folder, and every
+cache the tests touch lives in a throwaway directory, not next to the code.
+"""
+import os
+import sys
+import tempfile
+
+_cache_dir = tempfile.mkdtemp(prefix='jomjalan-tests-')
+os.environ.setdefault('SCRAPE_CACHE_PATH', os.path.join(_cache_dir, 'scrape.sqlite3'))
+os.environ.setdefault('PLACE_CACHE_PATH', os.path.join(_cache_dir, 'places.sqlite3'))
+os.environ.setdefault('PLANNER_JOBS_PATH', os.path.join(_cache_dir, 'planner_jobs.sqlite3'))
+os.environ.setdefault('PHOTO_CACHE_DIR', os.path.join(_cache_dir, 'photos'))
+os.environ.setdefault('SNAPSHOT_PATH', os.path.join(_cache_dir, 'trending_snapshot.json'))
+os.environ.setdefault('SCRAPE_DOMAIN_INTERVAL', '0')
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
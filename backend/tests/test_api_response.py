@@ -0,0 +1,78 @@
+"""List responses: cursor pages and ETag revalidation."""
+import pytest
+from flask import Flask
+
+import api_response
+
+ITEMS = [{'name': f'Spot {i}', 'lat': 3.0 + i, 'lng': 101.0, 'location': 'Ipoh'} for i in range(5)]
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    data = {'items': list(ITEMS), 'version': 'v1'}
+
+    @app.route('/spots')
+    def spots():
+        return api_response.list_response(data['items'], version=data['version'])
+
+    api_response.encoded_cache.clear()
+    client = app.test_client()
+    client.data = data
+    return client
+
+
+def _names(response):
+    return [item['name'] for item in response.get_json()]
+
+
+def test_cursor_pages_through_the_list(client):
+    first = client.get('/spots?limit=2')
+    assert _names(first) == ['Spot 0', 'Spot 1']
+    cursor = first.headers['X-Next-Cursor']
+    assert f'cursor={cursor}' in first.headers['Link']
+
+    second = client.get(f'/spots?limit=2&cursor={cursor}')
+    assert _names(second) == ['Spot 2', 'Spot 3']
+    last = client.get(f"/spots?limit=2&cursor={second.headers['X-Next-Cursor']}")
+    assert _names(last) == ['Spot 4']
+    assert 'X-Next-Cursor' not in last.headers
+
+
+def test_cursor_follows_the_last_item_when_the_list_changes(client):
+    cursor = client.get('/spots?limit=2').headers['X-Next-Cursor']
+    client.data['items'] = [{'name': 'New spot', 'lat': 0, 'lng': 0, 'location': 'Ipoh'}] + ITEMS
+    client.data['version'] = 'v2'
+    assert _names(client.get(f'/spots?limit=2&cursor={cursor}')) == ['Spot 2', 'Spot 3']
+
+
+def test_bad_cursor_and_limit_are_rejected(client):
+    assert client.get('/spots?cursor=not-a-cursor').status_code == 400
+    assert client.get('/spots?limit=0').status_code == 400
+
+
+def test_matching_etag_gets_a_304(client):
+    first = client.get('/spots')
+    etag = first.headers['ETag']
+    again = client.get('/spots', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert again.get_data() == b''
+
+    # A new version with the same content keeps the tag; different content doesn't
+    client.data['version'] = 'v2'
+    assert client.get('/spots', headers={'If-None-Match': etag}).status_code == 304
+    client.data['items'] = ITEMS[:3]
+    client.data['version'] = 'v3'
+    changed = client.get('/spots', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and _names(changed) == ['Spot 0', 'Spot 1', 'Spot 2']
+
+
+def test_compressed_copy_revalidates_with_its_own_tag(client, monkeypatch):
+    monkeypatch.setattr(api_response, 'COMPRESS_MIN_BYTES', 0)
+    first = client.get('/spots', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    etag = first.headers['ETag']
+    assert etag != client.get('/spots').headers['ETag']
+    again = client.get('/spots', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
@@ -0,0 +1,107 @@
+"""Circuit breaker transitions, and a half-open Places probe that gets a bad answer."""
+import time
+
+import pytest
+import requests
+
+import circuit_breaker
+import places
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+def _breaker(**settings):
+    return CircuitBreaker('test', **dict({'failure_rate': 0.5, 'min_calls': 4, 'window': 60, 'open_seconds': 0.1}, **settings))
+
+
+def _trip(breaker):
+    for _ in range(breaker.min_calls):
+        assert breaker.allow()
+        breaker.failure()
+
+
+def test_opens_on_the_failure_rate_only_after_min_calls():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.failure()
+    assert breaker.state == CLOSED # 3 calls: too few to judge
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == OPEN # 4 of 5 failed
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = _breaker()
+    _trip(breaker)
+    time.sleep(0.15)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.blocked()
+    assert breaker.allow()
+    assert not breaker.allow() # The probe is out
+
+
+def test_probe_success_closes():
+    breaker = _breaker()
+    _trip(breaker)
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.stats()['window_calls'] == 1 # The old failures are forgotten
+
+
+def test_probe_failure_opens_for_another_round():
+    breaker = _breaker()
+    _trip(breaker)
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN
+    assert breaker.stats()['opened'] == 2
+
+
+def test_released_probe_frees_the_slot():
+    breaker = _breaker()
+    _trip(breaker)
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_guard_records_the_outcome():
+    breaker = _breaker()
+    with breaker.guard():
+        pass
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad answer")
+    assert (breaker.stats()['successes'], breaker.stats()['failures']) == (1, 1)
+
+
+def test_registry_shares_breakers_by_name():
+    assert circuit_breaker.get('test-shared') is circuit_breaker.get('test-shared', min_calls=1)
+
+
+class UnreadableResponse:
+    status_code = 200
+
+    def json(self):
+        raise requests.exceptions.JSONDecodeError("Expecting value", "<html>", 0)
+
+
+def test_unreadable_places_probe_reports_a_failure(monkeypatch):
+    breaker = _breaker()
+    monkeypatch.setattr(places, 'breaker', breaker)
+    monkeypatch.setattr(places, 'GOOGLE_MAPS_API_KEY', 'test-key')
+    monkeypatch.setattr(places.http_client, 'get', lambda url, pool=None, **kwargs: UnreadableResponse())
+    _trip(breaker)
+    time.sleep(0.15)
+
+    with pytest.raises(requests.exceptions.RequestException):
+        places.find_place('Probe Kopitiam', 'name')
+    # The probe reported back: open for another round, rather than stuck waiting on it
+    assert breaker.state == OPEN
+    assert breaker.stats()['opened'] == 2
@@ -0,0 +1,31 @@
+"""Background prefetches must never fail the request that queued them."""
+import pytest
+
+import nearby_tiles
+import places
+
+
+class ClosedExecutor:
+    def submit(self, *args, **kwargs):
+        raise RuntimeError("cannot schedule new futures after interpreter shutdown")
+
+
+@pytest.fixture
+def shut_down(monkeypatch):
+    monkeypatch.setattr(nearby_tiles, '_prefetch_executor', ClosedExecutor())
+    monkeypatch.setattr(nearby_tiles, '_search', lambda params, priority: {
+        'status': 'OK',
+        'next_page_token': 'more',
+        'results': [{'place_id': 'p1', 'name': 'Kopitiam', 'geometry': {'location': {'lat': 3.139, 'lng': 101.6869}}}],
+    })
+    monkeypatch.setattr(places, 'GOOGLE_MAPS_API_KEY', 'test-key')
+
+
+def test_load_tile_survives_a_shut_down_executor(shut_down):
+    entry = nearby_tiles._load_tile(nearby_tiles.geohash(3.139, 101.6869), 'cafe_shutdown')
+    assert [place['name'] for place in entry['places']] == ['Kopitiam']
+
+
+def test_get_nearby_survives_a_shut_down_executor(shut_down):
+    result, _version = nearby_tiles.get_nearby(3.139, 101.6869, 'restaurant_shutdown')
+    assert [place['name'] for place in result] == ['Kopitiam']
@@ -0,0 +1,113 @@
+"""Planner jobs: the queue limits, the timeout and the expiry of finished jobs."""
+import threading
+import time
+
+import pytest
+
+import planner_jobs
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(monkeypatch):
+    planner_jobs._connect().execute("DELETE FROM planner_jobs")
+    monkeypatch.setattr(planner_jobs, '_slots', threading.BoundedSemaphore(2))
+    yield
+    planner_jobs._connect().execute("DELETE FROM planner_jobs")
+
+
+def _blocked_job():
+    """A job function that runs until the returned event is set."""
+    release = threading.Event()
+
+    def job(deadline):
+        release.wait(5)
+        return 'late'
+    return job, release
+
+
+def _wait_until_finished(job_id):
+    for _ in range(100):
+        with planner_jobs._lock:
+            if job_id not in planner_jobs._finished:
+                return
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} never returned")
+
+
+def test_job_gets_its_deadline_and_result():
+    seen = {}
+
+    def job(name, deadline):
+        seen['deadline'] = deadline
+        return {'plan': name}
+
+    before = time.time()
+    job_id = planner_jobs.submit(job, 'Ipoh', prompt='Ipoh')
+    result = planner_jobs.get(job_id, wait=planner_jobs.MAX_WAIT)
+    assert result['status'] == 'done'
+    assert result['result'] == {'plan': 'Ipoh'}
+    assert before + planner_jobs.PLANNER_JOB_TIMEOUT <= seen['deadline'] <= time.time() + planner_jobs.PLANNER_JOB_TIMEOUT
+
+
+def test_waits_are_capped():
+    job, release = _blocked_job()
+    job_id = planner_jobs.submit(job)
+    try:
+        start = time.monotonic()
+        assert planner_jobs.get(job_id, wait=20)['status'] in ('queued', 'running')
+        assert time.monotonic() - start < planner_jobs.MAX_WAIT + 1
+    finally:
+        release.set()
+        _wait_until_finished(job_id)
+
+
+def test_local_slots_are_held_until_the_job_returns():
+    job, release = _blocked_job()
+    ids = [planner_jobs.submit(job), planner_jobs.submit(job)]
+    try:
+        with pytest.raises(planner_jobs.QueueFull):
+            planner_jobs.submit(job)
+    finally:
+        release.set()
+        for job_id in ids:
+            _wait_until_finished(job_id)
+    assert planner_jobs.get(planner_jobs.submit(lambda deadline: 'ok'), wait=planner_jobs.MAX_WAIT)['status'] == 'done'
+
+
+def test_queue_limit_counts_other_processes_jobs(monkeypatch):
+    monkeypatch.setattr(planner_jobs, 'PLANNER_JOB_QUEUE_MAX', 2)
+    conn = planner_jobs._connect()
+    for job_id in ('other-1', 'other-2'):
+        conn.execute("INSERT INTO planner_jobs (id, status, created_at) VALUES (?, 'running', ?)", (job_id, time.time()))
+    with pytest.raises(planner_jobs.QueueFull):
+        planner_jobs.submit(lambda deadline: 'ok')
+    # The refused job gave its local slot back
+    assert planner_jobs._slots.acquire(blocking=False) and planner_jobs._slots.acquire(blocking=False)
+
+
+def test_timed_out_job_stays_failed(monkeypatch):
+    monkeypatch.setattr(planner_jobs, 'PLANNER_JOB_TIMEOUT', 0.2)
+    job, release = _blocked_job()
+    job_id = planner_jobs.submit(job)
+    time.sleep(0.3)
+    job = planner_jobs.get(job_id)
+    assert (job['status'], job['error']) == ('failed', 'timeout')
+    planner_jobs._expire(planner_jobs._connect(), time.time())
+    release.set()
+    _wait_until_finished(job_id)
+    job = planner_jobs.get(job_id)
+    assert job['status'] == 'failed' and 'result' not in job
+
+
+def test_finished_jobs_expire(monkeypatch):
+    monkeypatch.setattr(planner_jobs, 'PLANNER_JOB_TTL', 60)
+    conn = planner_jobs._connect()
+    now = time.time()
+    conn.execute("INSERT INTO planner_jobs (id, status, result, created_at, finished_at) VALUES ('old', 'done', '1', ?, ?)",
+                 (now - 120, now - 100))
+    conn.execute("INSERT INTO planner_jobs (id, status, result, created_at, finished_at) VALUES ('new', 'done', '2', ?, ?)",
+                 (now - 20, now - 10))
+    assert planner_jobs.get('old') is None
+    assert planner_jobs.get('new')['result'] == 2
+    planner_jobs._expire(conn, now)
+    assert [row[0] for row in conn.execute("SELECT id FROM planner_jobs")] == ['new']
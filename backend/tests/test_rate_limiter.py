@@ -0,0 +1,72 @@
+"""Rate limiter priority classes: who gets the next token."""
+import threading
+import time
+
+import pytest
+
+from rate_limiter import ENRICHMENT, INTERACTIVE, WARMUP, QuotaExceeded, RateLimiter
+
+
+@pytest.fixture
+def make_limiter(tmp_path):
+    def make(rate, burst, reserve=0):
+        return RateLimiter(str(tmp_path / 'limits.sqlite3'), 'test', rate, burst, reserve=reserve)
+    return make
+
+
+def _acquire_in_thread(limiter, priority, order):
+    def run():
+        limiter.acquire(priority)
+        order.append(priority)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_urgent_caller_overtakes_a_sleeping_waiter(make_limiter):
+    limiter = make_limiter(rate=4, burst=1)
+    limiter.acquire(INTERACTIVE) # Empty the bucket: the next token is 0.25s away
+    order = []
+    threads = [_acquire_in_thread(limiter, WARMUP, order)]
+    time.sleep(0.2) # The warm-up call is now sleeping until that token
+    threads.append(_acquire_in_thread(limiter, INTERACTIVE, order))
+    for thread in threads:
+        thread.join(5)
+    assert order == [INTERACTIVE, WARMUP]
+
+
+def test_waiters_are_served_in_priority_order(make_limiter):
+    limiter = make_limiter(rate=5, burst=1)
+    limiter.acquire(INTERACTIVE)
+    order = []
+    threads = []
+    for priority in (WARMUP, ENRICHMENT, INTERACTIVE): # Least urgent first
+        threads.append(_acquire_in_thread(limiter, priority, order))
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(5)
+    assert order == [INTERACTIVE, ENRICHMENT, WARMUP]
+
+
+def test_reserve_is_kept_for_interactive_calls(make_limiter):
+    limiter = make_limiter(rate=0.01, burst=2, reserve=1)
+    limiter.acquire(ENRICHMENT)
+    with pytest.raises(QuotaExceeded):
+        limiter.acquire(ENRICHMENT, max_wait=0.1)
+    assert limiter.acquire(INTERACTIVE) < 0.1
+    assert limiter.stats()['priorities'][ENRICHMENT]['timeouts'] == 1
+
+
+def test_backoff_pauses_and_slows_everyone(make_limiter):
+    limiter = make_limiter(rate=100, burst=5)
+    limiter.backoff()
+    with pytest.raises(QuotaExceeded):
+        limiter.acquire(INTERACTIVE, max_wait=0.1)
+    assert limiter.stats()['rate_factor'] == 0.5
+    limiter.success()
+    assert limiter.stats()['rate_factor'] == 0.55
+
+
+def test_zero_rate_disables_the_limiter(make_limiter):
+    limiter = make_limiter(rate=0, burst=0)
+    assert [limiter.acquire(WARMUP, max_wait=0) for _ in range(3)] == [0.0, 0.0, 0.0]
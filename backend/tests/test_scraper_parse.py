@@ -0,0 +1,69 @@
+"""The fast content-block parse must give the same spots as the full page parse."""
+import os
+
+import pytest
+
+import scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures')
+FIXTURES = {
+    'klfoodie_kl.html': ('klfoodie.com', 'Kuala Lumpur'),
+    'ecentral_perak.html': ('ecentral.my', 'Perak'),
+}
+HERO = "https://ecentral.my/hero.jpg"
+
+
+def _both(domain, html, state='Perak'):
+    return (scraper.parse_page(domain, html, state, fast=True),
+            scraper.parse_page(domain, html, state, fast=False))
+
+
+def _ecentral_page(before='', inside=''):
+    """An ecentral.my-style article: a hero image, `before`, then the content div with one spot."""
+    return f"""<html><body>
+<img src="{HERO}">
+{before}
+<div class="brxe-post-content">
+{inside}
+<h3 class="wp-block-heading">1. Kek Lok Tong</h3>
+<p>A cave temple with a lake behind it.</p>
+<p>Lokasi: Gunung Rapat, Ipoh</p>
+</div>
+</body></html>"""
+
+
+@pytest.mark.parametrize('filename', FIXTURES)
+def test_fast_parse_matches_full_parse_on_fixtures(filename):
+    domain, state = FIXTURES[filename]
+    with open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+        html = f.read()
+    fast, full = _both(domain, html, state)
+    assert full
+    assert fast == full
+
+
+@pytest.mark.parametrize('before, inside', [
+    pytest.param('<script>var banner = \'<img src="https://ads.example.com/script.jpg">\';</script>', '',
+                 id='img-in-script'),
+    pytest.param('<!-- <img src="https://ecentral.my/commented-out.jpg"> -->', '', id='img-in-comment'),
+    pytest.param('<div data-x=\'class="brxe-post-content"\'><p>Not the article</p></div>', '',
+                 id='class-in-attribute-value'),
+    pytest.param('', '<script>document.write("</div>");</script>', id='closing-div-in-script'),
+])
+def test_fast_parse_matches_full_parse_on_edge_cases(before, inside):
+    fast, full = _both('ecentral.my', _ecentral_page(before, inside))
+    assert [spot['name'] for spot in full] == ['Kek Lok Tong']
+    assert full[0]['imageUrl'] == HERO
+    assert fast == full
+
+
+def test_fast_parse_falls_back_to_full_parse_when_it_finds_nothing():
+    html = _ecentral_page()
+    # A span that isn't the content div at all
+    spots = scraper.parse_page('ecentral.my', html, 'Perak', span=(0, html.index('<div')), fast=True)
+    assert spots == scraper.parse_page('ecentral.my', html, 'Perak', fast=False)
+    assert spots
+
+
+def test_fast_parse_is_off_by_default():
+    assert scraper.FAST_PARSE is False
@@ -0,0 +1,84 @@
+"""A refresh where some or all of a state's articles fail must not make old spots look fresh."""
+import os
+import time
+
+import pytest
+import requests
+
+import circuit_breaker
+import http_client
+import scraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'fixtures')
+GOOD_URL = "https://ecentral.my/tempat-menarik-di-ipoh/"
+FAILING_URL = "https://klfoodie.com/best-things-to-do-in-ipoh/"
+OLD_SPOT = {'id': 'klfoodie_Perak_1', 'name': 'Old Spot', 'location': 'Perak', 'description': '', 'imageUrl': ''}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.status_code = 200
+        self.text = text
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, '_breakers', {})
+    monkeypatch.setattr(scraper, 'refresh_stats', {})
+    monkeypatch.setitem(scraper.STATE_URLS, 'Perak', [GOOD_URL, FAILING_URL])
+    with open(os.path.join(FIXTURES_DIR, 'ecentral_perak.html'), encoding='utf-8') as f:
+        good_html = f.read()
+
+    def get(url, **kwargs):
+        if url == FAILING_URL:
+            raise requests.exceptions.ConnectionError("site is down")
+        return FakeResponse(good_html)
+    monkeypatch.setattr(http_client, 'get', get)
+    yield
+    scraper.scrape_cache.delete('Perak')
+
+
+def _seed(age_seconds):
+    """A cached Perak entry `age_seconds` old, with spots from the article that is about to fail."""
+    sources = {FAILING_URL: {'spots': [OLD_SPOT], 'etag': None, 'last_modified': None, 'content_hash': 'old'}}
+    value = {'spots': [spot for source in sources.values() for spot in source['spots']], 'sources': sources,
+             'content_hash': 'old', 'changes': 0}
+    scraper.scrape_cache.set('Perak', value, stored_at=time.time() - age_seconds)
+
+
+def test_refresh_fails_when_every_article_fails(monkeypatch):
+    monkeypatch.setitem(scraper.STATE_URLS, 'Perak', [FAILING_URL])
+    _seed(7200)
+
+    assert scraper._refresh('Perak') is None
+    status = scraper.cache_status()['Perak']
+    assert status['fresh'] is False
+    assert status['age_seconds'] >= 7200
+    assert status['refresh_failures'] == 1
+    assert status['refreshes'] == 0
+
+
+def test_partial_refresh_carries_old_spots_but_not_their_age():
+    _seed(7200)
+
+    value = scraper._refresh('Perak')
+    assert value['carried_sources'] == [FAILING_URL]
+    assert 'Old Spot' in [spot['name'] for spot in value['spots']]
+    assert len(value['spots']) > 1 # The working article's spots too
+    status = scraper.cache_status()['Perak']
+    assert status['fresh'] is False
+    assert status['age_seconds'] >= 7200
+    assert status['partial_refreshes'] == 1
+
+
+def test_spots_past_stale_duration_are_not_carried_forward():
+    _seed(scraper.STALE_DURATION + 60)
+
+    value = scraper._refresh('Perak')
+    assert value['carried_sources'] == []
+    assert 'Old Spot' not in [spot['name'] for spot in value['spots']]
+    assert scraper.cache_status()['Perak']['fresh'] is True
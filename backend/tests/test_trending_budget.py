@@ -0,0 +1,62 @@
+"""The trending latency budget: what a request gets back from a slow or failed build."""
+import threading
+import time
+
+import pytest
+
+import trending
+
+SCRAPED = [{'name': 'Kedai Kopi', 'location': 'Ipoh'}, {'name': 'Taman Tasik', 'location': 'Taiping'}]
+
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    """Slow scrape and enrichment; returns an event that lets the enrichment finish."""
+    release = threading.Event()
+
+    def scrape(state):
+        time.sleep(0.2)
+        return list(SCRAPED), 'v1'
+
+    def enrich(spots, state, max_workers=None, priority=None, progress=None):
+        release.wait(5)
+        return [dict(spot, rating=4.5) for spot in spots], True
+
+    monkeypatch.setattr(trending, 'get_trending_spots', scrape)
+    monkeypatch.setattr(trending, '_enrich_all', enrich)
+    trending.enriched_cache.clear()
+    yield release
+    release.set()
+
+
+def _wait_for_build(state):
+    for _ in range(100):
+        with trending._builds_lock:
+            if state not in trending._builds:
+                return
+        time.sleep(0.05)
+
+
+def test_slow_scrape_still_returns_the_scraped_spots(upstreams):
+    # The budget is shorter than the scrape, but only counts from its end
+    spots, complete, version = trending.get_spots_within('Budget Slow Scrape', budget_ms=50)
+    assert [spot['name'] for spot in spots] == ['Kedai Kopi', 'Taman Tasik']
+    assert all(spot['incomplete'] for spot in spots)
+    assert (complete, version) == (False, None)
+
+    upstreams.set()
+    _wait_for_build('Budget Slow Scrape')
+    spots, complete, version = trending.get_spots_within('Budget Slow Scrape', budget_ms=1000)
+    assert (complete, version) == (True, 'v1')
+    assert [spot['rating'] for spot in spots] == [4.5, 4.5]
+
+
+def test_failed_build_is_never_complete(upstreams, monkeypatch):
+    def enrich(spots, state, max_workers=None, priority=None, progress=None):
+        progress.enriched = {i: (dict(spot, rating=4.0), True) for i, spot in enumerate(spots)}
+        raise RuntimeError("lost the connection to Google")
+
+    monkeypatch.setattr(trending, '_enrich_all', enrich)
+    spots, complete, version = trending.get_spots_within('Budget Failed Build', budget_ms=1000)
+    assert len(spots) == 2
+    assert (complete, version) == (False, None)
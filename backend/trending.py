@@ -0,0 +1,264 @@
+"""
+Trending spots: scraped lists enriched with Google Places data.
+
+Each scraped spot gets its rating, address and photo from Find Place, with
+the lookups for one state running in parallel. Finished lists are cached per
+state and tagged with the scrape version they were built from.
+
+Builds run in the background, one per state at a time. A request waits for
+the build only as long as its latency budget allows; if time runs out it
+gets the spots enriched so far plus plain scraped ones for the rest, while
+the build carries on and fills the cache for the next request.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import logs
+import metrics
+import places
+from memory_cache import TTLCache
+from rate_limiter import ENRICHMENT
+from scraper import STATE_URLS, get_trending_spots
+
+# --- Concurrent enrichment settings ---
+# How many Find Place calls a single trending_spots request may have in flight,
+# and how long (seconds) we wait for Google before falling back to the raw spot.
+PLACES_MAX_WORKERS = int(os.getenv('PLACES_MAX_WORKERS', '8'))
+PLACES_TIMEOUT = float(os.getenv('PLACES_TIMEOUT', '5'))
+
+def _enrich_spot(spot, state, priority=ENRICHMENT):
+    """
+    Adds Google rating, address and photo to a copy of one scraped spot.
+    Returns (spot, ok); ok is False if Google couldn't give us an answer.
+    """
+    with metrics.span('enrich_spot'):
+        spot = dict(spot) # Never modify the caller's (possibly shared) dict
+        try:
+            data = places.find_place(
+                # Use a more specific query for better matches
+                f"{spot['name']} {state}",
+                # 'vicinity' is not a valid field. Use 'formatted_address' instead.
+                "place_id,rating,user_ratings_total,price_level,photos,formatted_address",
+                timeout=PLACES_TIMEOUT,
+                priority=priority,
+            )
+
+            logs.debug('places_enrich', sample=True, spot=spot['name'], state=state,
+                       status=data.get('status'), candidates=len(data.get('candidates') or []))
+
+            if data.get('status') == 'OK' and data.get('candidates'):
+                candidate = data['candidates'][0]
+                spot['rating'] = candidate.get('rating', 0.0)
+                spot['user_ratings_total'] = candidate.get('user_ratings_total', 0)
+                spot['priceLevel'] = candidate.get('price_level') # Can be null
+                spot['location'] = candidate.get('formatted_address', spot['location'])
+
+                # Get a photo URL
+                if candidate.get('photos'):
+                    photo_ref = candidate['photos'][0]['photo_reference']
+                    spot['imageUrl'] = places.photo_url(photo_ref)
+            return spot, data.get('status') in places.CACHEABLE_STATUSES
+        except Exception as e:
+            print(f"Error enriching spot {spot['name']}: {e}")
+            return spot, False # Add the original spot if enrichment fails
+
+def enrich_spot(spot, state):
+    """
+    Adds Google rating, address and photo to one scraped spot.
+    Returns the original spot unchanged if the lookup fails.
+    """
+    return _enrich_spot(spot, state)[0]
+
+def _enrich_all(spots, state, max_workers=None, priority=ENRICHMENT, progress=None):
+    """
+    Enriches `spots` in parallel. Returns (spots, all_ok), in the original order.
+    Each finished (spot, ok) is also stored in `progress.enriched[index]` as it lands.
+    """
+    if not spots:
+        return [], True
+
+    def one(indexed):
+        index, spot = indexed
+        result = _enrich_spot(spot, state, priority)
+        if progress is not None:
+            progress.enriched[index] = result
+        return result
+
+    workers = max(1, min(max_workers or PLACES_MAX_WORKERS, len(spots)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='places-enrich') as executor:
+        results = list(executor.map(one, enumerate(spots)))
+    return [spot for spot, _ok in results], all(ok for _spot, ok in results)
+
+def enrich_spots(spots, state, max_workers=None):
+    """
+    Enriches all spots in parallel with at most `max_workers` Google calls in flight.
+    The returned list keeps the same order as `spots`.
+    """
+    return _enrich_all(spots, state, max_workers)[0]
+# ----------------------------
+
+# --- Enriched trending list cache ---
+# The finished response per state, tagged with the scrape version it was built
+# from. A new scrape version invalidates it; spots are stored read-only.
+ENRICHED_CACHE_TTL = int(os.getenv('ENRICHED_CACHE_TTL', str(6 * 3600)))
+enriched_cache = TTLCache(max_entries=len(STATE_URLS) * 2, ttl=ENRICHED_CACHE_TTL)
+
+# --- Background builds with per-request latency budgets ---
+TRENDING_BUDGET_MS = int(os.getenv('TRENDING_BUDGET_MS', '2500')) # Default when the request doesn't say
+TRENDING_MAX_BUDGET_MS = 30000
+TRENDING_SCRAPE_WAIT_MS = int(os.getenv('TRENDING_SCRAPE_WAIT_MS', '15000')) # Longest a request waits for a cold scrape
+
+_build_executor = ThreadPoolExecutor(max_workers=len(STATE_URLS), thread_name_prefix='trending-build')
+_builds = {} # state -> _Build currently running
+_live_states = set() # States this process has built a complete list for at least once
+_builds_lock = threading.Lock()
+_counters = {'calls': 0, 'executions': 0, 'shared': 0, 'errors': 0, 'complete': 0, 'partial': 0}
+metrics.describe('jomjalan_trending_responses_total', 'counter', 'trending_spots answers, complete or cut short by the latency budget.')
+
+
+class _Build:
+    """One state's scrape + enrichment, readable while it is still running."""
+    def __init__(self):
+        self.spots = None   # Scraped spots, once the scrape stage is done
+        self.scraped = threading.Event() # Set with `spots`, or when the build ends without them
+        self.enriched = {}  # index -> (spot, ok) as each lookup finishes
+        self.done = threading.Event()
+        self.result = None  # (spots, version, complete)
+        self.error = None
+
+
+def _count(name):
+    with _builds_lock:
+        _counters[name] += 1
+
+
+def build_enriched(state, priority=ENRICHMENT, progress=None):
+    """
+    Returns (spots, version, complete) for `state`. `complete` is False when
+    some Google lookups failed; such lists are not cached. `priority` is the
+    rate limiter class for the Google calls. `progress` (a _Build) is filled
+    in as the stages finish.
+    """
+    spots, version = get_trending_spots(state)
+
+    cached = enriched_cache.get(state)
+    if cached is not None:
+        cached_version, frozen_spots = cached
+        if cached_version == version:
+            _mark_live(state)
+            return [dict(spot) for spot in frozen_spots], version, True
+        if places.breaker.blocked():
+            # Google is failing: last scrape's enriched list beats a fresh but bare one
+            _mark_live(state)
+            return [dict(spot) for spot in frozen_spots], cached_version, True
+        enriched_cache.delete(state) # The scrape changed underneath it
+
+    if progress is not None:
+        progress.spots = spots
+        progress.scraped.set()
+    enriched, all_ok = _enrich_all(spots, state, priority=priority, progress=progress)
+    if all_ok and version is not None:
+        # Only complete lists are cached, so a Google outage isn't remembered for hours
+        enriched_cache.set(state, (version, tuple(MappingProxyType(dict(spot)) for spot in enriched)))
+    if all_ok:
+        _mark_live(state)
+    return enriched, version, all_ok
+
+def _mark_live(state):
+    with _builds_lock:
+        _live_states.add(state)
+
+def has_live_list(state):
+    """
+    True once this process has built a complete list for `state`. Stays True
+    when the enriched cache later expires or is invalidated, so callers don't
+    fall back to older data while the next build runs.
+    """
+    with _builds_lock:
+        return state in _live_states
+
+def _run(state, build, priority):
+    try:
+        build.result = build_enriched(state, priority, progress=build)
+    except Exception as e:
+        print(f"Error building trending spots for {state}: {e}")
+        build.error = e
+        _count('errors')
+    finally:
+        with _builds_lock:
+            _builds.pop(state, None)
+        build.scraped.set()
+        build.done.set()
+
+def start_build(state, priority=ENRICHMENT):
+    """The running build for `state`, or a new one. Concurrent callers share it."""
+    with _builds_lock:
+        _counters['calls'] += 1
+        build = _builds.get(state)
+        if build is not None:
+            _counters['shared'] += 1
+            return build
+        build = _builds[state] = _Build()
+        _counters['executions'] += 1
+    _build_executor.submit(_run, state, build, priority)
+    return build
+
+def build_now(state, priority=ENRICHMENT):
+    """Waits for a full build of `state` and returns (spots, version, complete)."""
+    build = start_build(state, priority)
+    build.done.wait()
+    if build.error is not None:
+        raise build.error
+    return build.result
+
+def _partial(build):
+    """What a build has so far: enriched spots where done, scraped ones marked incomplete elsewhere."""
+    if build.spots is None:
+        return [] # Still scraping
+    spots = []
+    for index, raw in enumerate(build.spots):
+        spot, ok = build.enriched.get(index, (raw, False))
+        spots.append(dict(spot) if ok else dict(spot, incomplete=True))
+    return spots
+
+def get_spots_within(state, budget_ms=None):
+    """
+    Enriched spots for `state`. Waits for the scrape (up to
+    TRENDING_SCRAPE_WAIT_MS), then at most `budget_ms` for the enrichment.
+    Returns (spots, complete, version). Spots that weren't enriched in time
+    are returned as scraped, with 'incomplete': True; the list is only empty
+    if the scrape itself didn't finish. `version` is the scrape version of a
+    complete list, None for a partial one. The build keeps running in the
+    background either way.
+    """
+    budget_ms = TRENDING_BUDGET_MS if budget_ms is None else max(1, min(budget_ms, TRENDING_MAX_BUDGET_MS))
+    build = start_build(state)
+    # The budget is for enrichment: before the scrape there is nothing worth returning
+    build.scraped.wait(TRENDING_SCRAPE_WAIT_MS / 1000)
+    finished = build.done.wait(budget_ms / 1000)
+
+    version = None
+    if finished and build.error is None and build.result[2]:
+        spots, version = build.result[0], build.result[1]
+    else:
+        spots = _partial(build)
+    complete = finished and build.error is None and not any(spot.get('incomplete') for spot in spots)
+    outcome = 'complete' if complete else 'partial'
+    _count(outcome)
+    metrics.inc('jomjalan_trending_responses_total', outcome=outcome)
+    return spots, complete, version if complete else None
+
+def get_enriched_spots(state):
+    """Scraped + Google-enriched spots for `state`, served from the enriched cache when possible."""
+    return build_now(state)[0]
+
+def build_stats():
+    with _builds_lock:
+        counters = dict(_counters)
+        counters['in_flight'] = len(_builds)
+    counters['dedup_ratio'] = round(counters['shared'] / counters['calls'], 3) if counters['calls'] else 0.0
+    counters['budget_ms'] = TRENDING_BUDGET_MS
+    return counters
+# ----------------------------
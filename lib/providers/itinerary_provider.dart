@@ -14,67 +14,68 @@ class ItineraryProvider with ChangeNotifier {
     }
   }
 
-  /// Clears existing itinerary and adds all new spots from the AI plan
+  /// Clears existing itinerary and adds all new spots from the AI plan.
+  /// [resolvedPlaces] is the plan's 'places' map, if the backend embedded it;
+  /// otherwise all activities are looked up with one resolvePlaces call.
   Future<void> addSpotsFromAi(
     List<dynamic> itineraryDays,
-    MockApiService apiService,
-  ) async {
+    MockApiService apiService, {
+    Map<String, dynamic>? resolvedPlaces,
+  }) async {
     // 1. Clear the old list
     _itinerarySpots.clear();
 
-    // 2. Loop through the JSON from the AI
-    for (var day in itineraryDays) {
-      if (day['activities'] == null) continue;
+    // 2. Collect every activity from the AI's JSON
+    final activities = [
+      for (var day in itineraryDays)
+        if (day['activities'] != null)
+          for (var activity in day['activities'])
+            if (activity['name'] != null) activity,
+    ];
 
-      for (var activity in day['activities']) {
-        final name = activity['name'];
-        final description = activity['description'];
+    // 3. Get REAL data from Google for all of them in one request
+    Map<String, dynamic> places = resolvedPlaces ?? {};
+    if (resolvedPlaces == null && activities.isNotEmpty) {
+      try {
+        places = await apiService.resolvePlaces(
+          activities.map<String>((a) => a['name'] as String).toList(),
+        );
+      } catch (e) {
+        print("Error enriching AI spots: $e");
+        // Every spot falls back to placeholder data below
+      }
+    }
 
-        try {
-          // 3. Get REAL data from Google using the 'findPlace' API
-          final result = await apiService.findPlace(name);
+    for (var activity in activities) {
+      final name = activity['name'];
+      final description = activity['description'];
+      final result = places[name];
 
-          String imageUrl =
-              'https://placehold.co/400x400/00bd6c/white?text=${Uri.encodeComponent(name)}';
-          String location = description; // Fallback
+      String imageUrl =
+          'https://placehold.co/400x400/00bd6c/white?text=${Uri.encodeComponent(name)}';
+      String location = description; // Fallback
 
-          // --- THIS IS THE FIX ---
-          // Your backend now returns 'imageUrl' and 'location'
-          if (result['status'] == 'OK') {
-            imageUrl = result['imageUrl'];
-            location = result['location'];
-          }
-          // -----------------------
+      // Your backend returns 'imageUrl' and 'location' for each resolved name
+      if (result != null && result['status'] == 'OK') {
+        imageUrl = result['imageUrl'];
+        location = result['location'];
+      }
 
-          // 4. Create a new Spot object with REAL data
-          final newSpot = Spot(
-            id: 'ai_${DateTime.now().millisecondsSinceEpoch}_$name',
-            name: name,
-            location: location,
-            description: description,
-            imageUrl: imageUrl, // The REAL image URL
-            rating: null,
-            userRatingsTotal: null,
-            priceLevel: null,
-          );
+      // 4. Create a new Spot object with REAL data
+      final newSpot = Spot(
+        id: 'ai_${DateTime.now().millisecondsSinceEpoch}_$name',
+        name: name,
+        location: location,
+        description: description,
+        imageUrl: imageUrl, // The REAL image URL
+        rating: null,
+        userRatingsTotal: null,
+        priceLevel: null,
+      );
 
-          // 5. Add the new spot to the list (if not already added)
-          if (!_itinerarySpots.any((s) => s.name == newSpot.name)) {
-            _itinerarySpots.add(newSpot);
-          }
-        } catch (e) {
-          print("Error enriching AI spot '$name': $e");
-          // If enrichment fails, add with placeholder data
-          _itinerarySpots.add(
-            Spot(
-              id: 'ai_${DateTime.now().millisecondsSinceEpoch}_$name',
-              name: name,
-              location: description,
-              description: description,
-              imageUrl: 'https://placehold.co/400x400/00bd6c/white?text=Error',
-            ),
-          );
-        }
+      // 5. Add the new spot to the list (if not already added)
+      if (!_itinerarySpots.any((s) => s.name == newSpot.name)) {
+        _itinerarySpots.add(newSpot);
       }
     }
 
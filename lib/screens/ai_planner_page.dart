@@ -42,12 +42,17 @@ class _AiPlannerPageState extends State<AiPlannerPage> {
     Map<String, dynamic> aiData;
     String friendlyText;
     List<dynamic> itineraryDays = [];
+    Map<String, dynamic>? resolvedPlaces;
 
     try {
       aiData = jsonDecode(jsonResponse);
       friendlyText =
           aiData['friendly_response'] ?? "Sorry, I had trouble planning.";
       itineraryDays = aiData['itinerary_days'] ?? [];
+      // Images and addresses for the activities, if the backend embedded them
+      if (aiData['places'] is Map) {
+        resolvedPlaces = Map<String, dynamic>.from(aiData['places']);
+      }
     } catch (e) {
       print("Error decoding AI JSON: $e");
       // This is a fallback if the AI sends plain text (or an error)
@@ -63,7 +68,11 @@ class _AiPlannerPageState extends State<AiPlannerPage> {
 
     // 4. Automatically add the new spots to your itinerary page
     if (itineraryDays.isNotEmpty) {
-      await itineraryProvider.addSpotsFromAi(itineraryDays, _apiService);
+      await itineraryProvider.addSpotsFromAi(
+        itineraryDays,
+        _apiService,
+        resolvedPlaces: resolvedPlaces,
+      );
       ScaffoldMessenger.of(context).showSnackBar(
         const SnackBar(
           content: Text('Added to "My Itinerary"!'),
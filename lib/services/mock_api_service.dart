@@ -54,6 +54,27 @@ class MockApiService {
     }
   }
 
+  /// Resolves many place names in one call (e.g. all AI itinerary activities).
+  /// Returns a map from each name to a findPlace-style result.
+  Future<Map<String, dynamic>> resolvePlaces(List<String> names) async {
+    final uri = Uri.parse('$API_BASE_URL/api/resolve_places');
+    try {
+      final response = await http.post(
+        uri,
+        headers: {'Content-Type': 'application/json'},
+        body: json.encode({'names': names}),
+      );
+      if (response.statusCode == 200) {
+        return Map<String, dynamic>.from(json.decode(response.body)['places']);
+      } else {
+        throw Exception("Failed to resolve places: ${response.body}");
+      }
+    } catch (e) {
+      print("Error in resolvePlaces: $e");
+      rethrow;
+    }
+  }
+
   // --- NEW FUNCTION: SEARCH PLACE (For Map Navigation) ---
   // This calls the new /api/search_place endpoint which returns Geometry (Lat/Lng)
   Future<Map<String, dynamic>> searchPlace(String query) async {
@@ -124,26 +145,52 @@ class MockApiService {
     ];
   }
 
-  // Simulates a call to your AI Planner
+  // Calls your AI Planner as a background job: the POST returns a job id at
+  // once and we poll for the finished plan. Each poll waits at most 2s on the
+  // server (so it doesn't hold a server worker), with a growing pause between
+  // polls.
   Future<String> getAiPlan(String userPrompt) async {
-    final uri = Uri.parse('$API_BASE_URL/api/ai_planner');
+    final uri = Uri.parse('$API_BASE_URL/api/ai_planner/jobs');
 
     try {
       final response = await http.post(
         uri,
         headers: {'Content-Type': 'application/json'},
-        body: json.encode({'prompt': userPrompt}),
+        // Ask for the activities' images and addresses in the same response
+        body: json.encode({'prompt': userPrompt, 'resolve_places': true}),
       );
 
-      if (response.statusCode == 200) {
-        // --- THIS IS THE FIX ---
-        // Return the raw JSON string directly.
-        // The AI Planner page will decode it.
-        return response.body;
-        // -----------------------
-      } else {
+      if (response.statusCode == 429) {
+        return "{\"friendly_response\": \"The AI planner is busy right now. Try again in a moment!\" }";
+      }
+      if (response.statusCode != 202) {
         return "{\"friendly_response\": \"Sorry, the AI planner seems to be offline.\" }";
       }
+
+      final jobId = json.decode(response.body)['job_id'];
+      // Give up after ~2 minutes
+      final deadline = DateTime.now().add(const Duration(minutes: 2));
+      var pause = const Duration(milliseconds: 500);
+      while (DateTime.now().isBefore(deadline)) {
+        final poll = await http.get(
+          Uri.parse('$API_BASE_URL/api/ai_planner/jobs/$jobId?wait=2'),
+        );
+        if (poll.statusCode != 200) break;
+
+        final job = json.decode(poll.body);
+        if (job['status'] == 'done') {
+          // --- THIS IS THE FIX ---
+          // Return the plan as a JSON string.
+          // The AI Planner page will decode it.
+          return json.encode(job['result']);
+          // -----------------------
+        }
+        if (job['status'] != 'queued' && job['status'] != 'running') break;
+
+        await Future.delayed(pause);
+        if (pause < const Duration(seconds: 4)) pause *= 2;
+      }
+      return "{\"friendly_response\": \"Sorry, the AI planner took too long. Please try again.\" }";
     } catch (e) {
       print("Error in getAiPlan: $e");
       return "{\"friendly_response\": \"Error connecting to the AI planner. Is the server running?\" }";